@@ -1,5 +1,11 @@
 from flask import Flask, request, jsonify, render_template
+from collections import OrderedDict, deque
+from itertools import islice
+import numpy as np
+import atexit
+import os
 import random
+import threading
 import time
 
 app = Flask(__name__)
@@ -7,7 +13,8 @@ app = Flask(__name__)
 # =====================================================
 # GLOBAL DATA STATE
 # =====================================================
-latest_data = {
+# Starting readings for every device, before its first IoT payload
+DEFAULT_READINGS = {
     "ph_value": 7.0,
     "ph_voltage": 2.5,
     "mq137_raw": 150,
@@ -20,12 +27,250 @@ latest_data = {
     "soil_percent": 45
 }
 
+latest_data = dict(DEFAULT_READINGS)
+
 last_iot_time = 0
 last_auto_update_time = 0
 
 IOT_TIMEOUT = 10
 AUTO_UPDATE_INTERVAL = 10   # 🔁 CHANGE EVERY 10 SECONDS
 
+# =====================================================
+# PER-DEVICE STATE
+# =====================================================
+DEFAULT_DEVICE_ID = "default"
+MAX_DEVICES = 50000         # least recently seen nodes are evicted past this
+MAX_DEVICE_LIST = 1000      # most devices one /api/devices call returns
+
+
+class DeviceState:
+    """Latest readings and timing for one ESP32 node"""
+    __slots__ = ("data", "last_iot_time", "last_auto_update_time", "history")
+
+    def __init__(self, data=None):
+        self.data = data if data is not None else dict(DEFAULT_READINGS)
+        self.last_iot_time = 0
+        self.last_auto_update_time = 0
+        self.history = None     # ReadingHistory, allocated on the first IoT reading
+
+
+# The default device shares latest_data so single-node setups behave as before
+default_device = DeviceState(latest_data)
+devices = OrderedDict({DEFAULT_DEVICE_ID: default_device})
+# Guards every read and reordering of `devices` (threaded=True serves
+# requests concurrently and move_to_end/del are not safe against iteration)
+devices_lock = threading.Lock()
+
+
+def get_device(device_id, create=False):
+    with devices_lock:
+        device = devices.get(device_id)
+        if device is not None:
+            devices.move_to_end(device_id)
+            return device
+        if not create:
+            return None
+
+        device = DeviceState()
+        devices[device_id] = device
+        while len(devices) > MAX_DEVICES:
+            oldest = next(iter(devices))
+            if oldest == DEFAULT_DEVICE_ID:
+                devices.move_to_end(oldest)
+                oldest = next(iter(devices))
+            del devices[oldest]
+        return device
+
+
+def recent_devices(limit):
+    """(total, [(device_id, device), ...]) for the `limit` most recently seen"""
+    with devices_lock:
+        return len(devices), list(islice(reversed(devices.items()), limit))
+
+
+def request_device_id(data=None):
+    """Device id from the payload, X-Device-Id header or ?device_id="""
+    device_id = (data or {}).get("device_id") \
+        or request.headers.get("X-Device-Id") \
+        or request.args.get("device_id")
+    return str(device_id) if device_id else DEFAULT_DEVICE_ID
+
+# =====================================================
+# READING HISTORY (RING BUFFER + WRITE-BEHIND LOG)
+# =====================================================
+HISTORY_FIELDS = ["ph_value", "ph_voltage", "mq137_raw", "rain_analog",
+                  "temperature", "humidity", "soil_raw", "soil_percent"]
+READING_DTYPE = np.dtype([("timestamp", "f8")] + [(f, "f4") for f in HISTORY_FIELDS])
+# On-disk record: np.fromfile(HISTORY_PATH, dtype=LOG_DTYPE) reads it back
+LOG_DTYPE = np.dtype([("device_id", "S64")] + READING_DTYPE.descr)
+
+# Each device's ring holds 2 * HISTORY_SIZE rows of READING_DTYPE.itemsize
+# (40) bytes: 20 KB at the default 256, so ~1 GB if all MAX_DEVICES nodes
+# report. Rings are allocated on a device's first reading; lower
+# HISTORY_SIZE on small hosts with many nodes.
+HISTORY_SIZE = int(os.environ.get("HISTORY_SIZE", 256))      # readings kept per device
+HISTORY_PATH = os.environ.get("HISTORY_PATH", "sensor_history.bin")
+FLUSH_EVERY = int(os.environ.get("FLUSH_EVERY", 500))        # readings per write
+FLUSH_INTERVAL = float(os.environ.get("FLUSH_INTERVAL", 5))  # seconds between writes
+MAX_PENDING = int(os.environ.get("MAX_PENDING", 100000))      # unwritten readings kept
+
+history_lock = threading.Lock()
+
+
+class ReadingHistory:
+    """Last `capacity` raw readings of one device in a preallocated array.
+
+    Every reading is written twice, at i and i + capacity, so the newest n
+    readings are always the contiguous slice ending at head + capacity and
+    can be returned as a view instead of being reassembled.
+    """
+    __slots__ = ("rows", "capacity", "head", "count")
+
+    def __init__(self, capacity=HISTORY_SIZE):
+        self.rows = np.full(2 * capacity, np.nan, dtype=READING_DTYPE)
+        self.capacity = capacity
+        self.head = 0
+        self.count = 0
+
+    def append(self, reading):
+        self.rows[self.head] = reading
+        self.rows[self.head + self.capacity] = reading
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def latest(self, n=None):
+        """View of the newest n readings, oldest first"""
+        n = self.count if n is None else max(0, min(n, self.count))
+        end = self.head + self.capacity
+        return self.rows[end - n:end]
+
+
+class WriteBehindLog:
+    """Appends readings to an append-only file in batches on a background thread.
+
+    A batch is written once FLUSH_EVERY readings are pending or
+    FLUSH_INTERVAL seconds have passed, so bursts from many nodes cost one
+    write instead of one per request. A failed write is kept for the next
+    attempt; while writes keep failing at most `max_pending` readings are
+    held and the oldest are dropped (counted in `dropped`).
+    """
+
+    def __init__(self, path=HISTORY_PATH, every=FLUSH_EVERY, interval=FLUSH_INTERVAL,
+                 max_pending=MAX_PENDING):
+        self.path = path
+        self.every = every
+        self.interval = interval
+        self.max_pending = max_pending
+        self.pending = deque(maxlen=max_pending)
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+        self.errors = 0
+        self.cond = threading.Condition()
+        # Serializes writers so batches reach the file in the order taken
+        self.flush_lock = threading.Lock()
+        self.thread = None
+        self.stopping = False
+
+    def add(self, device_id, reading):
+        with self.cond:
+            if len(self.pending) == self.max_pending:
+                self.dropped += 1
+            self.pending.append((device_id.encode("utf-8")[:64],) + reading)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="history-flusher", daemon=True)
+                self.thread.start()
+            if len(self.pending) >= self.every:
+                self.cond.notify()
+
+    def _run(self):
+        failed = False
+        while True:
+            with self.cond:
+                # After a failed write, wait a full interval before retrying
+                self.cond.wait_for(lambda: self.stopping or (not failed and len(self.pending) >= self.every),
+                                   timeout=self.interval)
+                if self.stopping:
+                    return
+            try:
+                self.flush()
+                failed = False
+            except Exception as e:
+                failed = True
+                self.errors += 1
+                print(f"⚠️ History write to {self.path} failed, will retry: {e}")
+
+    def flush(self):
+        with self.flush_lock:
+            with self.cond:
+                batch, self.pending = self.pending, deque(maxlen=self.max_pending)
+            if not batch:
+                return
+            records = self._records(batch)
+            try:
+                with open(self.path, "ab") as f:
+                    start = f.tell()
+                    try:
+                        records.tofile(f)
+                    except BaseException:
+                        f.truncate(start)   # no torn record at the end of the file
+                        raise
+            except BaseException:
+                self._requeue(records.tolist())
+                raise
+            self.written += len(records)
+            self.batches += 1
+
+    def _records(self, batch):
+        try:
+            return np.array(list(batch), dtype=LOG_DTYPE)
+        except (ValueError, TypeError):
+            # Skip malformed rows instead of failing every retry on them
+            rows = []
+            for row in batch:
+                try:
+                    rows.append(np.array([row], dtype=LOG_DTYPE))
+                except (ValueError, TypeError):
+                    self.dropped += 1
+            return np.concatenate(rows) if rows else np.empty(0, dtype=LOG_DTYPE)
+
+    def _requeue(self, batch):
+        """Put a batch that could not be written back ahead of newer readings"""
+        with self.cond:
+            restored = list(batch) + list(self.pending)
+            self.dropped += max(0, len(restored) - self.max_pending)
+            self.pending = deque(restored[-self.max_pending:], maxlen=self.max_pending)
+
+    def close(self):
+        """Stop the flusher thread, then write whatever is still pending"""
+        with self.cond:
+            self.stopping = True
+            thread = self.thread
+            self.cond.notify()
+        if thread is not None:
+            thread.join()
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"⚠️ Lost {len(self.pending)} unwritten history readings: {e}")
+
+
+history_log = WriteBehindLog()
+atexit.register(history_log.close)
+
+
+def record_reading(device_id, device, data):
+    """Store the raw numeric payload values (NaN where missing)"""
+    reading = (device.last_iot_time,) + tuple(
+        float(data[key]) if isinstance(data.get(key), (int, float)) else np.nan
+        for key in HISTORY_FIELDS
+    )
+    with history_lock:
+        if device.history is None:
+            device.history = ReadingHistory()
+        device.history.append(reading)
+    history_log.add(device_id, reading)
+
 # =====================================================
 # SAFE REALISTIC RANGES
 # =====================================================
@@ -43,14 +288,19 @@ SAFE_RANGES = {
 # =====================================================
 # AUTO-FIX & AUTO-UPDATE FUNCTION (CORE LOGIC)
 # =====================================================
-def auto_fix_and_update_data():
-    global latest_data, last_auto_update_time
+def auto_fix_and_update_data(device=None):
+    global last_auto_update_time
+
+    device = device or default_device
+    latest_data = device.data
 
     now = time.time()
-    if now - last_auto_update_time < AUTO_UPDATE_INTERVAL:
+    if now - device.last_auto_update_time < AUTO_UPDATE_INTERVAL:
         return   # ⏸ wait until 10 seconds pass
 
-    last_auto_update_time = now
+    device.last_auto_update_time = now
+    if device is default_device:
+        last_auto_update_time = now
 
     for key, (min_v, max_v) in SAFE_RANGES.items():
         val = latest_data.get(key)
@@ -83,34 +333,100 @@ def auto_fix_and_update_data():
 # =====================================================
 @app.route('/sensor', methods=['POST'])
 def sensor():
-    global latest_data, last_iot_time
+    global last_iot_time
 
     data = request.get_json(force=True, silent=True)
     if not data:
         return jsonify({"status": "NO_DATA"}), 400
 
-    for key in latest_data:
+    device_id = request_device_id(data)
+    device = get_device(device_id, create=True)
+
+    for key in device.data:
         val = data.get(key)
         if isinstance(val, (int, float)) and val > 0:
-            latest_data[key] = val
+            device.data[key] = val
 
-    last_iot_time = time.time()
-    print("✅ IOT DATA RECEIVED:", latest_data)
+    device.last_iot_time = time.time()
+    if device_id == DEFAULT_DEVICE_ID:
+        last_iot_time = device.last_iot_time
+    record_reading(device_id, device, data)
 
-    return jsonify({"status": "OK"}), 200
+    return jsonify({"status": "OK", "device_id": device_id}), 200
 
 # =====================================================
 # API FOR FRONTEND
 # =====================================================
 @app.route('/api/data')
 def api_data():
-    auto_fix_and_update_data()   # ✅ always heal data
+    device_id = request_device_id()
+    device = get_device(device_id)
+    if device is None:
+        return jsonify({"status": "UNKNOWN_DEVICE", "device_id": device_id}), 404
+
+    auto_fix_and_update_data(device)   # ✅ always heal data
 
-    iot_connected = (time.time() - last_iot_time) < IOT_TIMEOUT
+    iot_connected = (time.time() - device.last_iot_time) < IOT_TIMEOUT
 
     return jsonify({
+        "device_id": device_id,
         "iot_connected": iot_connected,
-        "data": latest_data
+        "data": device.data
+    })
+
+
+@app.route('/api/devices')
+def api_devices():
+    limit = max(0, min(request.args.get("limit", 100, type=int), MAX_DEVICE_LIST))
+    total, recent = recent_devices(limit)
+    now = time.time()
+    return jsonify({
+        "total": total,
+        "devices": [
+            {
+                "device_id": device_id,
+                "iot_connected": (now - device.last_iot_time) < IOT_TIMEOUT,
+                "last_seen": device.last_iot_time or None
+            }
+            for device_id, device in recent
+        ]
+    })
+
+def column_values(column):
+    """JSON-ready list: float32 noise rounded off, missing readings as null"""
+    values = column.astype("f8").round(4)
+    if np.isnan(values).any():
+        return [None if v != v else v for v in values.tolist()]
+    return values.tolist()
+
+
+@app.route('/api/history')
+def api_history():
+    """Recent raw readings of one device, one list per field"""
+    device_id = request_device_id()
+    device = get_device(device_id)
+    if device is None:
+        return jsonify({"status": "UNKNOWN_DEVICE", "device_id": device_id}), 404
+
+    fields = request.args.get("fields")
+    fields = ["timestamp"] + (fields.split(",") if fields else HISTORY_FIELDS)
+    unknown = [f for f in fields if f not in READING_DTYPE.names]
+    if unknown:
+        return jsonify({"status": "UNKNOWN_FIELDS", "fields": unknown}), 400
+
+    with history_lock:
+        if device.history is None:
+            columns, count = {f: [] for f in fields}, 0
+        else:
+            rows = device.history.latest(request.args.get("limit", type=int))
+            # rows[f] is a view into the ring; only the JSON conversion copies
+            columns, count = {f: column_values(rows[f]) for f in fields}, len(rows)
+
+    return jsonify({
+        "device_id": device_id,
+        "count": count,
+        "capacity": HISTORY_SIZE,
+        "history": columns
     })
 
 # =====================================================
@@ -1,8 +1,8 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import HTMLResponse, JSONResponse
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 import json
 import numpy as np
 from datetime import datetime, timedelta
@@ -11,9 +11,16 @@ import aiohttp
 from typing import Dict, Any, Optional
 import pandas as pd
 import os
+import re
+import time
+import random
 
 from models.predict import FarmPredictor
 from utils.data_processor import DataProcessor
+from utils.device_registry import DeviceRegistry, DEFAULT_DEVICE_ID
+from utils.broadcaster import BroadcastHub
+from utils.prediction_cache import PredictionCache
+from utils.worker_pools import WorkerPools, Overloaded
 
 # Initialize FastAPI app
 app = FastAPI(title="Smart Farming AI Analytics", version="1.0")
@@ -30,13 +37,32 @@ app.add_middleware(
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    """Shed load instead of queueing without bound"""
+    return JSONResponse(status_code=503, content={"detail": str(exc)},
+                        headers={"Retry-After": "1"})
+
 # Initialize components
 predictor = FarmPredictor()
+prediction_cache = PredictionCache(predictor)
 data_processor = DataProcessor()
 
+# Inference runs in worker processes (0 = a thread beside `predictor`) and
+# history writes on I/O threads, so neither blocks the event loop
+worker_pools = WorkerPools(
+    predictor,
+    inference_processes=int(os.getenv('INFERENCE_PROCESSES', '2')),
+    io_threads=int(os.getenv('IO_THREADS', '4')),
+    max_pending=int(os.getenv('MAX_PENDING_JOBS', '64'))
+)
+
 # IoT Server Configuration
 IOT_SERVER_URL = "http://10.161.12.188:5000"
 
+# Upper bound on readings accepted by /api/update/batch in one request
+MAX_BATCH_SIZE = 5000
+
 # Pydantic models
 class SensorData(BaseModel):
     ph_value: Optional[float] = None
@@ -50,6 +76,7 @@ class SensorData(BaseModel):
     flame_status: Optional[str] = None
     rain_analog: Optional[float] = None
     timestamp: Optional[str] = None
+    device_id: Optional[str] = None
 
 # In-memory storage for real-time data
 current_sensor_data = {
@@ -63,53 +90,160 @@ current_sensor_data = {
 }
 historical_predictions = []
 
+# Per-device state; the default device shares current_sensor_data so the
+# single-farm endpoints keep reading the same dict
+device_registry = DeviceRegistry()
+device_registry.get_or_create(DEFAULT_DEVICE_ID, current_sensor_data)
+
+# Pushes each new reading and its predictions to WebSocket subscribers
+broadcast_hub = BroadcastHub()
+
+def record_device_update(device_id: str, sensor_data: dict, processed_data: dict,
+                         predictions: dict, ts: float = None):
+    """Remember a processed reading for its device and broadcast it once"""
+    device_registry.get_or_create(device_id).record(
+        processed_data, predictions, build_alerts(sensor_data), ts=ts)
+    broadcast_hub.publish(device_id, sensor_data, predictions)
+
 # IoT Data Fetcher
+class GatewayState:
+    """Polling bookkeeping for one IoT gateway"""
+    __slots__ = ('url', 'device_id', 'failures', 'next_attempt', 'last_success', 'last_error')
+    
+    def __init__(self, url: str, device_id: str):
+        self.url = url.rstrip('/')
+        self.device_id = device_id
+        self.failures = 0
+        self.next_attempt = 0.0
+        self.last_success = None
+        self.last_error = None
+    
+    def to_dict(self) -> dict:
+        return {
+            "url": self.url,
+            "device_id": self.device_id,
+            "failures": self.failures,
+            "backing_off": self.next_attempt > time.monotonic(),
+            "last_success": self.last_success,
+            "last_error": self.last_error
+        }
+
+def parse_gateways(spec: str) -> list:
+    """Parse "url" or "device_id=url" entries separated by commas"""
+    gateways = []
+    for index, entry in enumerate(e.strip() for e in spec.split(',') if e.strip()):
+        if '=' in entry and not entry.startswith('http'):
+            device_id, url = entry.split('=', 1)
+        else:
+            device_id, url = (DEFAULT_DEVICE_ID if index == 0 else entry), entry
+        gateways.append(GatewayState(url.strip(), device_id.strip()))
+    return gateways
+
 class IoTDataFetcher:
-    def __init__(self, iot_url=IOT_SERVER_URL):
-        self.iot_url = iot_url
+    """Polls many IoT gateways concurrently over one pooled aiohttp session.
+    
+    A semaphore bounds in-flight requests, each gateway gets its own timeout,
+    and failing gateways back off exponentially so a dead node never delays
+    the others.
+    """
+    def __init__(self, iot_url=IOT_SERVER_URL, gateways: list = None, max_concurrency: int = 32,
+                 limit_per_host: int = 4, timeout: float = 5, backoff_base: float = 2,
+                 max_backoff: float = 300):
+        self.gateways = gateways or parse_gateways(iot_url)
+        self.iot_url = self.gateways[0].url
+        self.max_concurrency = max_concurrency
+        self.limit_per_host = limit_per_host
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.max_backoff = max_backoff
         self.session = None
+        self.semaphore = None
         self.last_fetch_time = None
     
     async def create_session(self):
-        """Create aiohttp session"""
+        """Create the shared aiohttp session with a keep-alive connection pool"""
         if self.session is None or self.session.closed:
-            self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=5))
+            connector = aiohttp.TCPConnector(
+                limit=self.max_concurrency,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=30,
+                ttl_dns_cache=300
+            )
+            self.session = aiohttp.ClientSession(
+                connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout))
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
     
-    async def fetch_sensor_data(self):
-        """Fetch real-time data from IoT server"""
-        try:
-            await self.create_session()
-            self.last_fetch_time = datetime.now()
-            
-            async with self.session.get(f"{self.iot_url}/api/data") as response:
-                if response.status == 200:
-                    data = await response.json()
-                    print(f"Fetched sensor data from IoT server: {data}")
-                    
-                    # Check if data is in the expected format
-                    if isinstance(data, dict) and 'data' in data:
-                        return data['data']  # Extract the nested sensor data
-                    else:
-                        return data  # Return as-is if format is different
-                else:
-                    print(f"Failed to fetch data: HTTP {response.status}")
-                    return None
-                    
-        except Exception as e:
-            print(f"Error fetching sensor data: {e}")
+    def _mark_failure(self, gateway: GatewayState, error: str):
+        gateway.failures += 1
+        gateway.last_error = error
+        delay = min(self.max_backoff, self.backoff_base * (2 ** (gateway.failures - 1)))
+        gateway.next_attempt = time.monotonic() + delay * random.uniform(0.8, 1.2)
+    
+    async def _fetch_gateway(self, gateway: GatewayState):
+        """Fetch one gateway's /api/data, honouring its backoff window"""
+        if gateway.next_attempt > time.monotonic():
             return None
+        
+        async with self.semaphore:
+            try:
+                async with self.session.get(f"{gateway.url}/api/data") as response:
+                    if response.status != 200:
+                        self._mark_failure(gateway, f"HTTP {response.status}")
+                        return None
+                    data = await response.json()
+            except Exception as e:
+                self._mark_failure(gateway, str(e) or type(e).__name__)
+                return None
+        
+        gateway.failures = 0
+        gateway.next_attempt = 0.0
+        gateway.last_success = datetime.now().isoformat()
+        gateway.last_error = None
+        
+        # Check if data is in the expected format
+        if isinstance(data, dict) and 'data' in data:
+            return data['data']  # Extract the nested sensor data
+        return data  # Return as-is if format is different
     
-    async def check_connection(self):
-        """Check if IoT server is accessible"""
-        try:
-            await self.create_session()
-            async with self.session.get(f"{self.iot_url}/api/health") as response:
-                if response.status == 200:
-                    return {"status": "connected", "message": "IoT server is accessible"}
-                else:
+    async def fetch_all(self) -> list:
+        """Fetch every gateway concurrently; returns [(gateway, data)] for successes"""
+        await self.create_session()
+        self.last_fetch_time = datetime.now()
+        results = await asyncio.gather(*(self._fetch_gateway(g) for g in self.gateways))
+        fetched = [(g, data) for g, data in zip(self.gateways, results) if data]
+        print(f"Fetched sensor data from {len(fetched)}/{len(self.gateways)} gateways")
+        return fetched
+    
+    async def fetch_sensor_data(self):
+        """Fetch real-time data from the first gateway"""
+        await self.create_session()
+        self.last_fetch_time = datetime.now()
+        return await self._fetch_gateway(self.gateways[0])
+    
+    async def _check_gateway(self, gateway: GatewayState) -> dict:
+        async with self.semaphore:
+            try:
+                async with self.session.get(f"{gateway.url}/api/health") as response:
+                    if response.status == 200:
+                        return {"status": "connected", "message": "IoT server is accessible"}
                     return {"status": "disconnected", "message": f"HTTP {response.status}"}
-        except Exception as e:
-            return {"status": "error", "message": str(e)}
+            except Exception as e:
+                return {"status": "error", "message": str(e)}
+    
+    async def check_connection(self):
+        """Check which IoT gateways are accessible"""
+        await self.create_session()
+        results = await asyncio.gather(*(self._check_gateway(g) for g in self.gateways))
+        connected = sum(1 for r in results if r["status"] == "connected")
+        status = results[0] if len(results) == 1 else {
+            "status": "connected" if connected == len(results) else
+                      "degraded" if connected else "disconnected",
+            "message": f"{connected}/{len(results)} gateways accessible"
+        }
+        return {
+            **status,
+            "gateways": [{**g.to_dict(), **r} for g, r in zip(self.gateways, results)]
+        }
     
     async def close(self):
         """Close the session"""
@@ -117,66 +251,52 @@ class IoTDataFetcher:
             await self.session.close()
 
 # Initialize IoT fetcher
-iot_fetcher = IoTDataFetcher()
+iot_fetcher = IoTDataFetcher(gateways=parse_gateways(os.environ.get('IOT_GATEWAY_URLS', IOT_SERVER_URL)))
+
+NUMERIC_SENSOR_FIELDS = ['ph_value', 'temperature', 'humidity', 'soil_percent',
+                         'mq137_raw', 'ph_voltage', 'soil_raw', 'rain_analog']
+
+def clean_sensor_payload(sensor_data: dict) -> dict:
+    """Remove placeholder values and convert numeric strings"""
+    cleaned_data = {}
+    for key, value in sensor_data.items():
+        if value == "---" or value is None:
+            continue
+        if isinstance(value, str) and key in NUMERIC_SENSOR_FIELDS:
+            try:
+                cleaned_data[key] = float(value)
+            except ValueError:
+                # If conversion fails, try to extract numbers from string
+                numbers = re.findall(r"[-+]?\d*\.\d+|\d+", value)
+                cleaned_data[key] = float(numbers[0]) if numbers else value
+        else:
+            cleaned_data[key] = value
+    return cleaned_data
 
 async def fetch_and_process_iot_data():
-    """Fetch data from IoT server and process it"""
+    """Fetch data from every IoT gateway and process it as one batch"""
     try:
-        # Fetch from IoT server
-        sensor_data = await iot_fetcher.fetch_sensor_data()
-        
-        if sensor_data:
-            print(f"Processing sensor data: {sensor_data}")
-            
-            # Clean the data - remove placeholder values and handle string conversions
-            cleaned_data = {}
-            for key, value in sensor_data.items():
-                if value != "---" and value is not None:
-                    # Try to convert to appropriate type
-                    try:
-                        if isinstance(value, str):
-                            # Remove any non-numeric characters except decimal point and minus sign
-                            if key in ['ph_value', 'temperature', 'humidity', 'soil_percent', 
-                                      'mq137_raw', 'ph_voltage', 'soil_raw', 'rain_analog']:
-                                # Try to convert numeric strings
-                                try:
-                                    cleaned_data[key] = float(value)
-                                except ValueError:
-                                    # If conversion fails, try to extract numbers from string
-                                    import re
-                                    numbers = re.findall(r"[-+]?\d*\.\d+|\d+", value)
-                                    if numbers:
-                                        cleaned_data[key] = float(numbers[0])
-                                    else:
-                                        cleaned_data[key] = value
-                            else:
-                                # Keep non-numeric fields as strings
-                                cleaned_data[key] = value
-                        else:
-                            # Already numeric or other type
-                            cleaned_data[key] = value
-                    except Exception as conv_error:
-                        print(f"Error converting {key}={value}: {conv_error}")
-                        cleaned_data[key] = value
-            
-            print(f"Cleaned data: {cleaned_data}")
-            
-            # Only process if we have real data
-            if cleaned_data:
-                # Create SensorData object
-                try:
-                    sensor_obj = SensorData(**cleaned_data)
-                    
-                    # Update through our API
-                    result = await update_sensor_data_internal(sensor_obj)
-                    return True
-                except Exception as model_error:
-                    print(f"Error creating SensorData object: {model_error}")
+        fetched = await iot_fetcher.fetch_all()
+        
+        readings = []
+        for gateway, sensor_data in fetched:
+            cleaned_data = clean_sensor_payload(sensor_data)
+            if not cleaned_data:
+                continue
+            cleaned_data['device_id'] = gateway.device_id
+            try:
+                readings.append(SensorData(**cleaned_data))
+            except Exception as model_error:
+                print(f"Error creating SensorData object for {gateway.url}: {model_error}")
+                if gateway.device_id == DEFAULT_DEVICE_ID:
                     # Try to update with raw data
+                    cleaned_data.pop('device_id')
                     await update_sensor_data_internal_raw(cleaned_data)
-                    return True
         
-        return False
+        if readings:
+            await update_sensor_data_batch_internal(readings)
+        
+        return bool(readings) or bool(fetched)
         
     except Exception as e:
         print(f"Error in fetch_and_process_iot_data: {e}")
@@ -200,11 +320,11 @@ async def update_sensor_data_internal_raw(sensor_dict: Dict):
         processed_data = data_processor.process_sensor_data(current_sensor_data)
         
         # Make AI predictions
-        predictions = predictor.predict(current_sensor_data)
+        predictions = await predict_async(current_sensor_data)
         
         # Store historical data
         combined_data = {**processed_data, **predictions}
-        data_processor.store_historical_data(combined_data)
+        await worker_pools.run_io(data_processor.store_historical_data, combined_data)
         
         # Store prediction for analytics
         historical_predictions.append({
@@ -217,6 +337,8 @@ async def update_sensor_data_internal_raw(sensor_dict: Dict):
         if len(historical_predictions) > 100:
             historical_predictions.pop(0)
         
+        record_device_update(DEFAULT_DEVICE_ID, current_sensor_data, processed_data, predictions)
+        
         print(f"Updated sensor data and generated predictions")
         
         return {
@@ -224,6 +346,8 @@ async def update_sensor_data_internal_raw(sensor_dict: Dict):
             "predictions": predictions
         }
         
+    except Overloaded:
+        raise
     except Exception as e:
         print(f"Error updating sensor data: {e}")
         import traceback
@@ -235,8 +359,12 @@ async def update_sensor_data_internal(sensor_data: SensorData):
     global current_sensor_data
     
     try:
-        # Update current data
         sensor_dict = sensor_data.model_dump(exclude_none=True)
+        device_id = sensor_dict.pop('device_id', None) or DEFAULT_DEVICE_ID
+        if device_id != DEFAULT_DEVICE_ID:
+            return await update_device_data_internal(device_id, sensor_dict)
+        
+        # Update current data
         current_sensor_data.update(sensor_dict)
         
         # Add timestamp if not present
@@ -249,11 +377,11 @@ async def update_sensor_data_internal(sensor_data: SensorData):
         processed_data = data_processor.process_sensor_data(current_sensor_data)
         
         # Make AI predictions
-        predictions = predictor.predict(current_sensor_data)
+        predictions = await predict_async(current_sensor_data)
         
         # Store historical data
         combined_data = {**processed_data, **predictions}
-        data_processor.store_historical_data(combined_data)
+        await worker_pools.run_io(data_processor.store_historical_data, combined_data)
         
         # Store prediction for analytics
         historical_predictions.append({
@@ -266,6 +394,8 @@ async def update_sensor_data_internal(sensor_data: SensorData):
         if len(historical_predictions) > 100:
             historical_predictions.pop(0)
         
+        record_device_update(DEFAULT_DEVICE_ID, current_sensor_data, processed_data, predictions)
+        
         print(f"Updated sensor data and generated predictions")
         
         return {
@@ -273,12 +403,151 @@ async def update_sensor_data_internal(sensor_data: SensorData):
             "predictions": predictions
         }
         
+    except Overloaded:
+        raise
     except Exception as e:
         print(f"Error updating sensor data: {e}")
         import traceback
         traceback.print_exc()
         raise
 
+async def predict_many(states: list) -> list:
+    """Cached predictions for many sensor states; misses run on the inference pool"""
+    return await prediction_cache.predict_many_async(states, worker_pools.predict_many)
+
+async def predict_async(sensor_data: dict) -> dict:
+    """Cached prediction for one sensor state, computed off the event loop"""
+    return (await predict_many([sensor_data]))[0]
+
+async def update_device_data_internal(device_id: str, sensor_dict: dict):
+    """Update one non-default device; its history lives in the registry"""
+    device = device_registry.get_or_create(device_id)
+    device.sensor_data.update(sensor_dict)
+    
+    processed_data = data_processor.process_sensor_data(device.sensor_data)
+    predictions = await predict_async(device.sensor_data)
+    record_device_update(device_id, device.sensor_data, processed_data, predictions)
+    
+    return {
+        "device_id": device_id,
+        "processed_data": processed_data,
+        "predictions": predictions
+    }
+
+async def update_sensor_data_batch_internal(readings: list):
+    """Internal function to process, score and store many readings at once.
+    
+    Only default-device readings are written to the time-series store;
+    other devices keep theirs in the registry's bounded history. The
+    returned "stored" list says, per reading, whether it was persisted.
+    """
+    # Replay each device's readings over its current state, as single
+    # updates would. Buffered readings older than the device's last update
+    # only go to history: they must not roll the live state back.
+    now = datetime.now().isoformat()
+    device_ids = []
+    states = []
+    fresh = []
+    latest = {}
+    newest_ts = {}
+    for reading in readings:
+        sensor_dict = reading.model_dump(exclude_none=True)
+        device_id = sensor_dict.pop('device_id', None) or DEFAULT_DEVICE_ID
+        if device_id not in latest:
+            device = device_registry.get_or_create(device_id)
+            latest[device_id] = dict(device.sensor_data)
+            newest_ts[device_id] = device.last_seen
+        ts = data_processor.store.timestamp_of({'timestamp': sensor_dict.get('timestamp', now)})
+        is_fresh = newest_ts[device_id] is None or ts > newest_ts[device_id]
+        if is_fresh:
+            latest[device_id].update(sensor_dict)
+            newest_ts[device_id] = ts
+            state = latest[device_id]
+        else:
+            state = {**latest[device_id], **sensor_dict}
+        device_ids.append(device_id)
+        states.append({**state, 'timestamp': sensor_dict.get('timestamp', now)})
+        fresh.append(is_fresh)
+    
+    # One vectorized processing pass, one predictor call, one storage write
+    processed = data_processor.process_sensor_batch(states)
+    predictions = await predict_many(states)
+    combined = [{**p, **pred} for device_id, p, pred in zip(device_ids, processed, predictions)
+                if device_id == DEFAULT_DEVICE_ID]
+    persisted = bool(combined) and await worker_pools.run_io(data_processor.store_historical_batch,
+                                                             combined)
+    stored = [persisted and device_id == DEFAULT_DEVICE_ID for device_id in device_ids]
+    
+    updated = {device_id for device_id, is_fresh in zip(device_ids, fresh) if is_fresh}
+    for device_id in updated:
+        device_registry.get_or_create(device_id).sensor_data.update(latest[device_id])
+    last_prediction = {}
+    late = {}
+    for device_id, state, p, pred, is_fresh in zip(device_ids, states, processed, predictions, fresh):
+        ts = data_processor.store.timestamp_of(p)
+        if is_fresh:
+            device_registry.get(device_id).record(p, pred, build_alerts(state), ts=ts)
+            last_prediction[device_id] = pred
+        else:
+            late.setdefault(device_id, []).append((ts, p))
+    # Backfilled readings still belong in each device's history
+    for device_id, rows in late.items():
+        device_registry.get_or_create(device_id).backfill(rows)
+    
+    # Subscribers only need each device's newest state
+    for device_id in updated:
+        broadcast_hub.publish(device_id, device_registry.get(device_id).sensor_data,
+                              last_prediction[device_id])
+    
+    default_rows = [(s, pred) for device_id, s, pred in zip(device_ids, states, predictions)
+                    if device_id == DEFAULT_DEVICE_ID]
+    historical_predictions.extend(
+        {'timestamp': s['timestamp'], 'sensor_data': s, 'predictions': pred}
+        for s, pred in default_rows[-100:]
+    )
+    del historical_predictions[:-100]
+    
+    print(f"Processed batch of {len(readings)} readings from {len(latest)} devices "
+          f"({len(readings) - sum(fresh)} late, history only)")
+    
+    return {
+        "stored": stored,
+        "store_failed": bool(combined) and not persisted,
+        "processed_data": processed,
+        "predictions": predictions
+    }
+
+class InvalidLine:
+    """Placeholder for an NDJSON line that is not valid JSON"""
+    def __init__(self, line: int, error: str):
+        self.line = line
+        self.error = error
+
+def parse_batch_body(body: bytes, content_type: str) -> list:
+    """Decode a JSON array or NDJSON request body into a list of objects.
+    
+    NDJSON lines are parsed one by one; a malformed line becomes an
+    InvalidLine so the rest of the batch still goes through.
+    """
+    text = body.decode('utf-8')
+    if 'ndjson' in content_type or 'jsonlines' in content_type:
+        rows = []
+        for number, line in enumerate(text.splitlines()):
+            if not line.strip():
+                continue
+            try:
+                rows.append(json.loads(line))
+            except ValueError as e:
+                rows.append(InvalidLine(number, str(e)))
+        return rows
+    
+    payload = json.loads(text)
+    if isinstance(payload, dict) and isinstance(payload.get('readings'), list):
+        payload = payload['readings']
+    if not isinstance(payload, list):
+        raise ValueError("Expected a JSON array of readings")
+    return payload
+
 # API Endpoints
 @app.get("/", response_class=HTMLResponse)
 async def get_dashboard():
@@ -327,9 +596,65 @@ async def update_sensor_data(data: SensorData):
             **result
         }
         
+    except Overloaded:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/update/batch")
+async def update_sensor_data_batch(request: Request):
+    """Ingest many readings (JSON array or NDJSON) as a single batch"""
+    try:
+        rows = parse_batch_body(await request.body(), request.headers.get('content-type', ''))
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid batch body: {e}")
+    
+    if len(rows) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {MAX_BATCH_SIZE} readings")
+    
+    # Validate every row up front; invalid rows are reported, not fatal
+    results = []
+    readings = []
+    for index, row in enumerate(rows):
+        if isinstance(row, InvalidLine):
+            results.append({"index": index, "line": row.line, "status": "rejected",
+                            "error": f"invalid JSON: {row.error}"})
+            continue
+        try:
+            if not isinstance(row, dict):
+                raise ValueError("reading must be a JSON object")
+            readings.append(SensorData(**row))
+            results.append({"index": index, "status": "accepted"})
+        except (ValidationError, ValueError, TypeError) as e:
+            results.append({"index": index, "status": "rejected", "error": str(e)})
+    
+    if not readings:
+        return {"status": "error", "accepted": 0, "rejected": len(rows), "results": results}
+    
+    try:
+        batch = await update_sensor_data_batch_internal(readings)
+    except Overloaded:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    accepted = [r for r in results if r["status"] == "accepted"]
+    # "processed" rows were scored and kept in memory but not persisted
+    for result, processed, stored in zip(accepted, batch["processed_data"], batch["stored"]):
+        result["status"] = "stored" if stored else "processed"
+        result["timestamp"] = processed["timestamp"]
+        result["plant_health_score"] = processed["plant_health_score"]
+        result["fertility_index"] = processed["fertility_index"]
+    
+    return {
+        "status": "partial" if batch["store_failed"] else "success",
+        "accepted": len(accepted),
+        "stored": sum(batch["stored"]),
+        "rejected": len(rows) - len(accepted),
+        "results": results,
+        "latest_predictions": batch["predictions"][-1]
+    }
+
 # IoT Integration Endpoints
 @app.get("/api/iot/status")
 async def get_iot_status():
@@ -433,8 +758,10 @@ async def get_predictions():
         }
     
     try:
-        predictions = predictor.predict(current_sensor_data)
+        predictions = await predict_async(current_sensor_data)
         return predictions
+    except Overloaded:
+        raise
     except Exception as e:
         print(f"Error getting predictions: {e}")
         # Return mock data if predictor fails
@@ -480,8 +807,11 @@ async def get_predictions():
 async def get_trends(days: int = 7):
     """Get trend analysis for specified period"""
     try:
-        trends = data_processor.get_trend_analysis(days)
+        # Reads take the store lock, so they wait for batch writes off the event loop
+        trends = await worker_pools.run_io(data_processor.get_trend_analysis, days)
         return trends
+    except Overloaded:
+        raise
     except Exception as e:
         print(f"Error getting trends: {e}")
         # Return mock trends
@@ -498,11 +828,8 @@ async def get_trends(days: int = 7):
 async def get_historical_data(limit: int = 100):
     """Get historical data"""
     try:
-        if not data_processor.historical_data.empty:
-            df = data_processor.historical_data
-            if len(df) > limit:
-                df = df.tail(limit)
-            return df.to_dict(orient='records')
+        if not data_processor.store.empty:
+            return await worker_pools.run_io(data_processor.get_historical_records, limit)
         else:
             # Return mock historical data
             mock_data = []
@@ -516,18 +843,19 @@ async def get_historical_data(limit: int = 100):
                     "crop_yield": 0.75 + (i * 0.01)
                 })
             return mock_data
+    except Overloaded:
+        raise
     except Exception as e:
         print(f"Error getting historical data: {e}")
         return []
 
-@app.get("/api/alerts")
-async def get_alerts():
-    """Get current alerts and warnings"""
+def build_alerts(sensor_data: dict) -> list:
+    """Threshold alerts for one device's current readings"""
     alerts = []
     
-    if current_sensor_data:
+    if sensor_data:
         # Temperature alerts
-        temp = current_sensor_data.get('temperature')
+        temp = sensor_data.get('temperature')
         if temp is not None:
             try:
                 temp_val = float(temp) if isinstance(temp, str) else temp
@@ -551,7 +879,7 @@ async def get_alerts():
                 pass
         
         # Humidity alerts
-        humidity = current_sensor_data.get('humidity')
+        humidity = sensor_data.get('humidity')
         if humidity is not None:
             try:
                 humidity_val = float(humidity) if isinstance(humidity, str) else humidity
@@ -575,7 +903,7 @@ async def get_alerts():
                 pass
         
         # pH alerts
-        ph = current_sensor_data.get('ph_value')
+        ph = sensor_data.get('ph_value')
         if ph is not None:
             try:
                 ph_val = float(ph) if isinstance(ph, str) else ph
@@ -599,7 +927,7 @@ async def get_alerts():
                 pass
         
         # Ammonia gas alert
-        ammonia = current_sensor_data.get('mq137_raw')
+        ammonia = sensor_data.get('mq137_raw')
         if ammonia is not None:
             try:
                 ammonia_val = float(ammonia) if isinstance(ammonia, str) else ammonia
@@ -615,7 +943,7 @@ async def get_alerts():
                 pass
         
         # Soil moisture alerts
-        soil = current_sensor_data.get('soil_percent')
+        soil = sensor_data.get('soil_percent')
         if soil is not None:
             try:
                 soil_val = float(soil) if isinstance(soil, str) else soil
@@ -640,11 +968,30 @@ async def get_alerts():
     
     return alerts
 
+@app.get("/api/alerts")
+async def get_alerts():
+    """Get current alerts and warnings"""
+    alerts = build_alerts(current_sensor_data)
+    
+    # Anomalies flagged at ingest time during the last hour
+    one_hour_ago = (datetime.now() - timedelta(hours=1)).timestamp()
+    anomalies = await worker_pools.run_io(data_processor.get_anomalies, since=one_hour_ago, limit=10)
+    for anomaly in anomalies:
+        alerts.append({
+            "type": "anomaly",
+            "title": f"Unusual {anomaly['sensor'].replace('_', ' ')} reading",
+            "message": f"Value {anomaly['value']:.2f} outside expected {anomaly['expected_range']}",
+            "severity": anomaly['severity'],
+            "timestamp": anomaly['timestamp']
+        })
+    
+    return alerts
+
 @app.get("/api/analytics/summary")
 async def get_analytics_summary():
     """Get analytics summary"""
     try:
-        if data_processor.historical_data.empty:
+        if data_processor.store.empty:
             # Return mock summary
             return {
                 "total_records": 20,
@@ -665,26 +1012,8 @@ async def get_analytics_summary():
                 ]
             }
         
-        df = data_processor.historical_data
-        
-        summary = {
-            "total_records": len(df),
-            "time_range": {
-                "start": df['timestamp'].min() if 'timestamp' in df.columns else None,
-                "end": df['timestamp'].max() if 'timestamp' in df.columns else None
-            },
-            "averages": {},
-            "recommendations": []
-        }
-        
-        # Calculate averages
-        numeric_columns = ['ph_value', 'temperature', 'humidity', 'soil_percent']
-        for col in numeric_columns:
-            if col in df.columns:
-                try:
-                    summary['averages'][col] = float(df[col].mean())
-                except:
-                    pass
+        summary = await worker_pools.run_io(data_processor.get_summary_stats)
+        summary["recommendations"] = []
         
         # Generate recommendations based on averages
         avg_ph = summary['averages'].get('ph_value', 7.0)
@@ -711,47 +1040,110 @@ async def get_analytics_summary():
         
         return summary
         
+    except Overloaded:
+        raise
     except Exception as e:
         print(f"Error getting analytics summary: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Device-scoped endpoints
+def get_device_or_404(device_id: str):
+    device = device_registry.get(device_id)
+    if device is None:
+        raise HTTPException(status_code=404, detail=f"Unknown device: {device_id}")
+    return device
+
+@app.get("/api/devices")
+async def list_devices(limit: int = 100, offset: int = 0):
+    """List registered devices, most recently seen first"""
+    return {
+        "total": len(device_registry),
+        "devices": device_registry.summaries(limit=limit, offset=offset)
+    }
+
+@app.get("/api/devices/{device_id}/data")
+async def get_device_data(device_id: str):
+    """Get current sensor data for one device"""
+    device = get_device_or_404(device_id)
+    response_data = device.sensor_data.copy()
+    response_data["device_id"] = device_id
+    response_data["last_seen"] = device.last_seen
+    return response_data
+
+@app.get("/api/devices/{device_id}/predictions")
+async def get_device_predictions(device_id: str):
+    """Get the latest AI predictions for one device"""
+    device = get_device_or_404(device_id)
+    if device.predictions is None:
+        device.predictions = await predict_async(device.sensor_data)
+    return device.predictions
+
+@app.get("/api/devices/{device_id}/alerts")
+async def get_device_alerts(device_id: str):
+    """Get alerts raised by one device's latest reading"""
+    device = get_device_or_404(device_id)
+    return device.alerts
+
+@app.get("/api/devices/{device_id}/history")
+async def get_device_history(device_id: str, limit: int = 100):
+    """Get the recent in-memory history kept for one device"""
+    device = get_device_or_404(device_id)
+    return device.history_records(limit)
+
 # WebSocket for real-time updates
 from fastapi import WebSocket
 
-@app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
+async def watch_disconnect(websocket: WebSocket, subscriber):
+    """Release the subscriber as soon as the client goes away"""
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+    except Exception:
+        pass
+    finally:
+        broadcast_hub.close(subscriber)
+
+async def stream_sensor_updates(websocket: WebSocket, topic: str, sensor_data: dict):
+    """Relay a device's broadcast updates to one WebSocket client"""
     await websocket.accept()
+    
+    # Seed the hub once if nothing has been published for this device yet
+    if broadcast_hub.snapshot(topic) is None and sensor_data:
+        broadcast_hub.publish(topic, sensor_data, await predict_async(sensor_data))
+    initial_data = broadcast_hub.snapshot_message(topic)
+    subscriber = broadcast_hub.subscribe(topic)
+    watcher = asyncio.create_task(watch_disconnect(websocket, subscriber))
     try:
         # Send initial data
-        if current_sensor_data:
-            predictions = predictor.predict(current_sensor_data)
-            initial_data = {
-                "type": "initial",
-                "timestamp": datetime.now().isoformat(),
-                "sensor_data": current_sensor_data,
-                "predictions": predictions
-            }
-            await websocket.send_json(initial_data)
+        if initial_data:
+            await websocket.send_text(initial_data)
         
         while True:
-            # Send updates every 2 seconds if data exists
-            await asyncio.sleep(2)
-            
-            if current_sensor_data:
-                # Get latest predictions
-                predictions = predictor.predict(current_sensor_data)
-                
-                # Prepare update
-                update = {
-                    "type": "update",
-                    "timestamp": datetime.now().isoformat(),
-                    "sensor_data": current_sensor_data,
-                    "predictions": predictions
-                }
-                
-                await websocket.send_json(update)
+            message = await subscriber.queue.get()
+            if message is None:
+                if subscriber.dropped:
+                    await websocket.close(code=1013)  # too slow, reconnect for a snapshot
+                break
+            await websocket.send_text(message)
     except Exception as e:
         print(f"WebSocket error: {e}")
+    finally:
+        watcher.cancel()
+        broadcast_hub.unsubscribe(subscriber)
+
+@app.websocket("/ws")
+async def websocket_endpoint(websocket: WebSocket):
+    await stream_sensor_updates(websocket, DEFAULT_DEVICE_ID, current_sensor_data)
+
+@app.websocket("/ws/{device_id}")
+async def device_websocket_endpoint(websocket: WebSocket, device_id: str):
+    device = device_registry.get(device_id)
+    if device is None:
+        await websocket.close(code=4404)
+        return
+    await stream_sensor_updates(websocket, device_id, device.sensor_data)
 
 # Health check endpoint
 @app.get("/health")
@@ -761,12 +1153,32 @@ async def health_check():
         "timestamp": datetime.now().isoformat(),
         "components": {
             "predictor": "loaded" if predictor.models else "not loaded",
+            "prediction_cache": prediction_cache.info(),
+            "worker_pools": worker_pools.metrics(),
             "data_processor": "ready",
             "current_data": "available" if current_sensor_data else "unavailable",
+            "devices": len(device_registry),
+            "websocket_clients": broadcast_hub.subscriber_count(),
+            "broadcast": broadcast_hub.stats,
             "iot_connection": await iot_fetcher.check_connection()
         }
     }
 
+def load_models():
+    """(Re)load the AI models and drop predictions made by the old ones"""
+    predictor.load_models()
+    prediction_cache.invalidate()
+    worker_pools.restart_inference()
+
+@app.post("/api/models/reload")
+async def reload_models():
+    """Reload AI models from disk"""
+    try:
+        load_models()
+        return {"status": "reloaded", "prediction_cache": prediction_cache.info()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 # Background task for auto-fetching
 async def auto_fetch_task(interval_seconds: int = 10):
     """Background task to automatically fetch data from IoT server"""
@@ -793,7 +1205,7 @@ async def startup_event():
     """Initialize with data from IoT server"""
     try:
         # Load AI models
-        predictor.load_models()
+        load_models()
         
         # Initialize IoT fetcher
         await iot_fetcher.create_session()
@@ -845,6 +1257,8 @@ async def shutdown_event():
         # Close IoT fetcher session
         await iot_fetcher.close()
         
+        worker_pools.shutdown()
+        
     except Exception as e:
         print(f"Shutdown error: {e}")
 
@@ -854,7 +1268,7 @@ if __name__ == "__main__":
     print("=" * 60)
     print("Smart Farming AI Analytics Server")
     print("=" * 60)
-    print(f"IoT Server: {IOT_SERVER_URL}")
+    print(f"IoT Gateways: {', '.join(g.url for g in iot_fetcher.gateways)}")
     print(f"Local Dashboard: http://127.0.0.1:8000")
     print("=" * 60)
     
@@ -0,0 +1,22 @@
+import os
+
+from utils.anomaly_detector import StreamingAnomalyDetector
+
+
+def anomaly(n):
+    return {'sensor': 'temperature', 'ts': float(n), 'value': float(n)}
+
+
+def test_log_rotates_and_reloads_newest_entries(tmp_path):
+    path = str(tmp_path / 'anomalies.jsonl')
+    detector = StreamingAnomalyDetector(log_path=path, log_size=50, log_max_bytes=4000)
+    for n in range(500):
+        detector._record([anomaly(n)])
+
+    sizes = [os.path.getsize(p) for p in (path, path + '.1') if os.path.exists(p)]
+    assert max(sizes) <= 4000 + 100
+    assert not os.path.exists(path + '.2')
+
+    reloaded = StreamingAnomalyDetector(log_path=path, log_size=50, log_max_bytes=4000)
+    assert reloaded.has_log
+    assert [entry['ts'] for entry in reloaded.recent()] == [float(n) for n in range(450, 500)]
@@ -0,0 +1,29 @@
+import asyncio
+import json
+
+from utils.broadcaster import BroadcastHub
+
+
+def drain(subscriber):
+    messages = []
+    while not subscriber.queue.empty():
+        messages.append(json.loads(subscriber.queue.get_nowait()))
+    return messages
+
+
+def test_seq_has_no_gaps_and_removed_keys_send_full_update():
+    async def run():
+        hub = BroadcastHub()
+        hub.publish('farm', {'ph': 6.5, 'temperature': 24.0, 'humidity': 60.0}, {'crop': 'rice'})
+        subscriber = hub.subscribe('farm')
+        initial_seq = json.loads(hub.snapshot_message('farm'))['seq']
+
+        hub.publish('farm', {'ph': 6.5, 'temperature': 24.0, 'humidity': 60.0}, {'crop': 'rice'})
+        hub.publish('farm', {'ph': 6.6, 'temperature': 24.0, 'humidity': 60.0}, {'crop': 'rice'})
+        hub.publish('farm', {'ph': 6.6, 'temperature': 24.0}, {'crop': 'rice'})
+        return initial_seq, drain(subscriber)
+
+    initial_seq, messages = asyncio.run(run())
+    assert [m['seq'] for m in messages] == [initial_seq + 1, initial_seq + 2]
+    assert messages[0]['type'] == 'delta' and messages[0]['sensor_data'] == {'ph': 6.6}
+    assert messages[1]['type'] == 'update' and messages[1]['sensor_data'] == {'ph': 6.6, 'temperature': 24.0}
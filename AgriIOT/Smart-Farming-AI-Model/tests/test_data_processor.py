@@ -0,0 +1,19 @@
+from datetime import datetime
+
+from utils.data_processor import DataProcessor
+
+HOUR = 3600
+
+
+def test_trend_within_one_hourly_bucket(tmp_path):
+    processor = DataProcessor(data_dir=str(tmp_path))
+    # Twenty rising readings, all inside the previous whole hour
+    hour_start = (datetime.now().timestamp() // HOUR - 1) * HOUR
+    processor.store_historical_batch([
+        {'timestamp': hour_start + i * 60, 'temperature': 20.0 + i, 'humidity': 60.0}
+        for i in range(20)
+    ])
+
+    stats = processor.get_trend_analysis(days=7)['sensor_stats']
+    assert stats['temperature']['trend'] == 'increasing'
+    assert stats['humidity']['trend'] == 'stable'
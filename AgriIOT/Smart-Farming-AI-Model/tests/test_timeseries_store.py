@@ -0,0 +1,38 @@
+import numpy as np
+
+from utils.timeseries_store import TimeSeriesStore, TIMESTAMP_COLUMN
+
+DAY = 86400.0
+NOW = 1_700_000_000.0
+
+
+def test_limit_returns_newest_rows_across_out_of_order_segments(tmp_path):
+    store = TimeSeriesStore(str(tmp_path), segment_rows=4, retention_days=0)
+    # Live readings, then a back-dated batch lands in later segments
+    store.append_many([{'temperature': 24.0 + i} for i in range(6)], [NOW + i for i in range(6)])
+    store.append_many([{'temperature': 100.0 + i} for i in range(6)], [NOW - DAY + i for i in range(6)])
+
+    data = store.read(limit=3)
+    assert data[TIMESTAMP_COLUMN].tolist() == [NOW + 3, NOW + 4, NOW + 5]
+    assert data['temperature'].tolist() == [27.0, 28.0, 29.0]
+
+    records = store.to_records(limit=8)
+    temperatures = [record['temperature'] for record in records]
+    assert temperatures == [104.0, 105.0, 24.0, 25.0, 26.0, 27.0, 28.0, 29.0]
+
+
+def test_limit_within_one_unsorted_segment(tmp_path):
+    store = TimeSeriesStore(str(tmp_path), segment_rows=16, retention_days=0)
+    timestamps = [NOW + 5, NOW + 1, NOW + 9, NOW + 3, NOW + 7]
+    store.append_many([{'value': t - NOW} for t in timestamps], timestamps)
+
+    data = store.read(limit=2)
+    assert data['value'].tolist() == [7.0, 9.0]
+    assert np.all(np.diff(store.read()[TIMESTAMP_COLUMN]) >= 0)
+
+
+def test_limit_zero_and_range(tmp_path):
+    store = TimeSeriesStore(str(tmp_path), segment_rows=4, retention_days=0)
+    store.append_many([{'value': float(i)} for i in range(10)], [NOW + i for i in range(10)])
+    assert store.read(limit=0)['value'].size == 0
+    assert store.read(start=NOW + 2, end=NOW + 6, limit=2)['value'].tolist() == [5.0, 6.0]
@@ -0,0 +1,198 @@
+import os
+import json
+import math
+import numpy as np
+from collections import deque
+from datetime import datetime
+
+# Spreads below this fraction of the mean are treated as "no variation" so
+# float round-off on constant signals is never scored as an anomaly
+RELATIVE_STD_FLOOR = 1e-6
+
+
+def _linear_recurrence(u: np.ndarray, c: float, b: float, y0: float) -> np.ndarray:
+    """Evaluate y[t] = c * y[t-1] + b * u[t] for every t with NumPy.
+
+    Uses the closed form y[t] = c^t * (y0 + b * sum(u[i] * c^-i)) in chunks
+    short enough that c^-i stays well inside float64 range.
+    """
+    out = np.empty(u.size, dtype=np.float64)
+    if u.size == 0:
+        return out
+    chunk = max(1, int(12 * math.log(10) / -math.log(c))) if 0 < c < 1 else u.size
+    y = y0
+    for lo in range(0, u.size, chunk):
+        part = u[lo:lo + chunk]
+        powers = c ** np.arange(1, part.size + 1)
+        out[lo:lo + part.size] = powers * (y + b * np.cumsum(part / powers))
+        y = out[lo + part.size - 1]
+    return out
+
+
+class StreamingAnomalyDetector:
+    """Online EWMA z-score detector with a persistent anomaly log.
+
+    Each sensor keeps an exponentially weighted mean and variance; a reading
+    is scored against the state *before* it is folded in, so ingest costs
+    O(sensors). `score_batch` reproduces exactly the same recurrence over a
+    whole history array for backfills.
+
+    The log file is rotated to `<log_path>.1` once it grows past
+    `log_max_bytes`, so disk use stays under about twice that.
+    """
+
+    def __init__(self, sensors: list = None, alpha: float = 0.1, threshold: float = 2.0,
+                 high_threshold: float = 3.0, warmup: int = 10,
+                 log_path: str = None, log_size: int = 1000, log_max_bytes: int = 10 * 2**20):
+        self.sensors = list(sensors or ['temperature', 'humidity', 'ph_value'])
+        self.alpha = alpha
+        self.threshold = threshold
+        self.high_threshold = high_threshold
+        self.warmup = warmup
+        self.log_path = log_path
+        self.log_max_bytes = log_max_bytes
+
+        self.state = {}  # sensor -> [count, mean, variance]
+        self.log = deque(maxlen=log_size)
+        self._load_log()
+
+    # ------------------------------------------------------------------
+    # Log
+    # ------------------------------------------------------------------
+    def _log_files(self) -> list:
+        """Existing log files, oldest first"""
+        if not self.log_path:
+            return []
+        return [path for path in (self.log_path + '.1', self.log_path) if os.path.exists(path)]
+
+    def _load_log(self):
+        """Load the newest entries of the on-disk anomaly log"""
+        try:
+            for path in self._log_files():
+                with open(path, 'r') as f:
+                    for line in deque(f, maxlen=self.log.maxlen):
+                        self.log.append(json.loads(line))
+        except Exception as e:
+            print(f"Error loading anomaly log: {e}")
+
+    @property
+    def has_log(self) -> bool:
+        return bool(self._log_files())
+
+    def _record(self, anomalies: list):
+        if not anomalies:
+            return
+        self.log.extend(anomalies)
+        if self.log_path:
+            os.makedirs(os.path.dirname(self.log_path) or '.', exist_ok=True)
+            with open(self.log_path, 'a') as f:
+                f.writelines(json.dumps(anomaly) + '\n' for anomaly in anomalies)
+                size = f.tell()
+            if self.log_max_bytes and size > self.log_max_bytes:
+                os.replace(self.log_path, self.log_path + '.1')
+
+    def recent(self, since: float = None, limit: int = None) -> list:
+        """Logged anomalies newer than `since` (epoch seconds), oldest first"""
+        entries = [a for a in self.log if since is None or a['ts'] >= since]
+        if limit is not None:
+            entries = entries[-limit:]
+        return entries
+
+    # ------------------------------------------------------------------
+    # Scoring
+    # ------------------------------------------------------------------
+    def _anomaly(self, sensor: str, ts: float, value: float, mean: float,
+                 std: float, z: float) -> dict:
+        return {
+            'sensor': sensor,
+            'ts': ts,
+            'timestamp': datetime.fromtimestamp(ts).isoformat(),
+            'value': float(value),
+            'z_score': round(float(z), 2),
+            'expected_range': f"{mean:.1f} ± {std:.1f}",
+            'severity': 'high' if abs(z) > self.high_threshold else 'medium'
+        }
+
+    def observe(self, record: dict, ts: float) -> list:
+        """Score one reading, fold it into the state and log any anomalies"""
+        anomalies = []
+        for sensor in self.sensors:
+            value = record.get(sensor)
+            if not isinstance(value, (int, float)) or value != value:
+                continue
+            value = float(value)
+
+            state = self.state.get(sensor)
+            if state is None:
+                self.state[sensor] = [1, value, 0.0]
+                continue
+
+            count, mean, variance = state
+            diff = value - mean
+            std = math.sqrt(variance)
+            if count >= self.warmup and std > RELATIVE_STD_FLOOR * max(1.0, abs(mean)):
+                z = diff / std
+                if abs(z) > self.threshold:
+                    anomalies.append(self._anomaly(sensor, ts, value, mean, std, z))
+
+            state[0] = count + 1
+            state[1] = mean + self.alpha * diff
+            state[2] = (1 - self.alpha) * (variance + self.alpha * diff * diff)
+
+        self._record(anomalies)
+        return anomalies
+
+    def score_batch(self, ts: np.ndarray, columns: dict, log: bool = True) -> list:
+        """Score whole time-sorted column arrays in one vectorized pass.
+
+        Continues from (and updates) the current per-sensor state, so a
+        backfill followed by `observe` behaves like streaming all along.
+        """
+        ts = np.asarray(ts, dtype=np.float64)
+        a, c = self.alpha, 1 - self.alpha
+        anomalies = []
+
+        for sensor in self.sensors:
+            if sensor not in columns:
+                continue
+            values = np.asarray(columns[sensor], dtype=np.float64)
+            valid = np.flatnonzero(~np.isnan(values))
+            if valid.size == 0:
+                continue
+            x = values[valid]
+
+            state = self.state.get(sensor)
+            if state is None:
+                state = [1, float(x[0]), 0.0]
+                x, valid = x[1:], valid[1:]
+                self.state[sensor] = state
+            if x.size == 0:
+                continue
+            count0, mean0, var0 = state
+
+            # Means and variances *after* each reading, then shift by one to
+            # score every reading against the state that preceded it
+            means = _linear_recurrence(x, c, a, mean0)
+            prev_means = np.concatenate(([mean0], means[:-1]))
+            diffs = x - prev_means
+            variances = _linear_recurrence(a * diffs * diffs, c, c, var0)
+            prev_std = np.sqrt(np.concatenate(([var0], variances[:-1])))
+
+            counts = count0 + np.arange(x.size)
+            floor = RELATIVE_STD_FLOOR * np.maximum(1.0, np.abs(prev_means))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                z = np.where(prev_std > floor, diffs / prev_std, 0.0)
+            flagged = np.flatnonzero((counts >= self.warmup) & (np.abs(z) > self.threshold))
+
+            anomalies.extend(
+                self._anomaly(sensor, float(ts[valid[i]]), x[i], prev_means[i], prev_std[i], z[i])
+                for i in flagged.tolist()
+            )
+            state[0] = count0 + x.size
+            state[1] = float(means[-1])
+            state[2] = float(variances[-1])
+
+        anomalies.sort(key=lambda anomaly: anomaly['ts'])
+        if log:
+            self._record(anomalies)
+        return anomalies
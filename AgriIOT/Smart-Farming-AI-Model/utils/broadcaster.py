@@ -0,0 +1,121 @@
+import json
+import asyncio
+from datetime import datetime
+
+
+class Subscriber:
+    """One WebSocket client's bounded outbound queue"""
+
+    __slots__ = ('topic', 'queue', 'dropped')
+
+    def __init__(self, topic: str, queue_size: int):
+        self.topic = topic
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = False
+
+
+class BroadcastHub:
+    """Fan-out of sensor updates to WebSocket subscribers, keyed by topic.
+
+    Each published reading is diffed against the topic's last snapshot and
+    serialized once; subscribers receive the same encoded message through
+    their own bounded queue. A subscriber whose queue is full is dropped
+    rather than allowed to hold up the publisher.
+    """
+
+    def __init__(self, queue_size: int = 32, full_update_ratio: float = 0.5):
+        self.queue_size = queue_size
+        self.full_update_ratio = full_update_ratio
+        self.subscribers = {}   # topic -> set of Subscriber
+        self.snapshots = {}     # topic -> {'sensor_data', 'predictions', 'seq'}
+        self.stats = {'published': 0, 'delivered': 0, 'dropped_clients': 0}
+
+    def subscribe(self, topic: str) -> Subscriber:
+        subscriber = Subscriber(topic, self.queue_size)
+        self.subscribers.setdefault(topic, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        subscribers = self.subscribers.get(subscriber.topic)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self.subscribers[subscriber.topic]
+
+    def close(self, subscriber: Subscriber):
+        """Unsubscribe and wake the sender with a None sentinel"""
+        self.unsubscribe(subscriber)
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(None)
+
+    def subscriber_count(self) -> int:
+        return sum(len(s) for s in self.subscribers.values())
+
+    def snapshot(self, topic: str):
+        return self.snapshots.get(topic)
+
+    def snapshot_message(self, topic: str) -> str:
+        """Full-state "initial" message for a newly connected client"""
+        snapshot = self.snapshots.get(topic)
+        if snapshot is None:
+            return None
+        return json.dumps({
+            "type": "initial",
+            "seq": snapshot['seq'],
+            "timestamp": datetime.now().isoformat(),
+            "sensor_data": snapshot['sensor_data'],
+            "predictions": snapshot['predictions']
+        }, default=str)
+
+    @staticmethod
+    def _changed(old: dict, new: dict) -> dict:
+        return {k: v for k, v in new.items() if old.get(k) != v}
+
+    def _message(self, previous: dict, sensor_data: dict, predictions: dict) -> dict:
+        """Delta or full update against the previous snapshot, None if nothing changed"""
+        if previous is None:
+            return {"type": "update", "sensor_data": sensor_data, "predictions": predictions}
+        old_predictions = previous['predictions'] or {}
+        changed_sensors = self._changed(previous['sensor_data'], sensor_data)
+        changed_predictions = self._changed(old_predictions, predictions or {})
+        # A delta cannot express a removed key, so that takes a full update
+        removed = (previous['sensor_data'].keys() - sensor_data.keys()
+                   or old_predictions.keys() - (predictions or {}).keys())
+        if removed or len(changed_sensors) > self.full_update_ratio * max(1, len(sensor_data)):
+            return {"type": "update", "sensor_data": sensor_data, "predictions": predictions}
+        if not changed_sensors and not changed_predictions:
+            return None
+        return {"type": "delta", "sensor_data": changed_sensors, "predictions": changed_predictions}
+
+    def publish(self, topic: str, sensor_data: dict, predictions: dict):
+        """Record a new reading for a topic and push it to its subscribers.
+
+        `seq` advances only when a message is queued, so subscribers can
+        treat a gap as a missed message and resync from a snapshot.
+        """
+        sensor_data = dict(sensor_data)
+        previous = self.snapshots.get(topic)
+        seq = previous['seq'] if previous else 0
+        self.stats['published'] += 1
+
+        subscribers = self.subscribers.get(topic)
+        message = self._message(previous, sensor_data, predictions) if subscribers else None
+        if message is not None:
+            seq += 1
+        self.snapshots[topic] = {'sensor_data': sensor_data, 'predictions': predictions, 'seq': seq}
+        if message is None:
+            return
+
+        message.update(seq=seq, timestamp=datetime.now().isoformat())
+        encoded = json.dumps(message, default=str)
+
+        for subscriber in list(subscribers):
+            try:
+                subscriber.queue.put_nowait(encoded)
+                self.stats['delivered'] += 1
+            except asyncio.QueueFull:
+                # Slow consumer: cut it loose, it can reconnect for a snapshot
+                subscriber.dropped = True
+                self.stats['dropped_clients'] += 1
+                self.close(subscriber)
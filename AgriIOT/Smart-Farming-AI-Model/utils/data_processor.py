@@ -1,11 +1,97 @@
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
-import json
+from datetime import datetime
+import os
+import threading
+
+from utils.timeseries_store import TimeSeriesStore, TIMESTAMP_COLUMN
+from utils.rolling_stats import RollingStats
+from utils.anomaly_detector import StreamingAnomalyDetector
+
+# Sensors with incrementally maintained aggregates
+TREND_SENSORS = ['ph_value', 'temperature', 'humidity', 'soil_moisture_percent']
+SUMMARY_SENSORS = ['ph_value', 'temperature', 'humidity', 'soil_percent']
 
 class DataProcessor:
-    def __init__(self):
-        self.historical_data = pd.DataFrame()
+    def __init__(self, data_dir: str = 'static/data', retention_days: int = 180):
+        self.data_dir = data_dir
+        self.retention_days = retention_days
+        self.stores = {}
+        # Writes may run on worker threads; readers take the same lock
+        self._lock = threading.RLock()
+        self.store = self._get_store('historical_data.csv')
+        
+        # Rollups are rebuilt once from the store, then updated per reading
+        sensors = list(dict.fromkeys(TREND_SENSORS + SUMMARY_SENSORS))
+        self.stats = RollingStats(sensors, daily_retention_days=retention_days)
+        history = self.store.read(columns=sensors)
+        ts = history.pop(TIMESTAMP_COLUMN)
+        self.stats.backfill(ts, history)
+        
+        # Anomalies are scored at ingest; a missing log is backfilled in one pass
+        self.anomalies = StreamingAnomalyDetector(
+            log_path=os.path.join(data_dir, 'anomalies.jsonl'))
+        self.anomalies.score_batch(ts, history, log=not self.anomalies.has_log)
+    
+    def _get_store(self, filename: str) -> TimeSeriesStore:
+        """Open (once) the columnar store that replaces a legacy CSV file"""
+        name = os.path.splitext(filename)[0]
+        if name not in self.stores:
+            store = TimeSeriesStore(os.path.join(self.data_dir, name),
+                                    retention_days=self.retention_days)
+            if store.empty:
+                self._import_legacy_csv(store, os.path.join(self.data_dir, filename))
+            self.stores[name] = store
+        return self.stores[name]
+    
+    def _import_legacy_csv(self, store: TimeSeriesStore, path: str):
+        """One-off migration of rows written by the old CSV-based storage"""
+        if not os.path.exists(path):
+            return
+        try:
+            legacy = pd.read_csv(path)
+            for record in legacy.to_dict(orient='records'):
+                store.append({k: v for k, v in record.items() if not pd.isna(v)})
+            print(f"Imported {len(legacy)} rows from {path}")
+        except Exception as e:
+            print(f"Error importing legacy history {path}: {e}")
+    
+    @property
+    def historical_data(self) -> pd.DataFrame:
+        """Most recent 1000 rows as a DataFrame (kept for older callers)"""
+        with self._lock:
+            if self.store.empty:
+                return pd.DataFrame()
+            return self.store.to_frame(limit=1000)
+    
+    def get_historical_records(self, limit: int = 100) -> list:
+        """Newest `limit` rows as dicts, read straight from the memory-mapped store"""
+        with self._lock:
+            return self.store.to_records(limit=limit)
+    
+    def get_anomalies(self, since: float = None, limit: int = None) -> list:
+        """Entries from the anomaly log, oldest first"""
+        with self._lock:
+            return self.anomalies.recent(since=since, limit=limit)
+    
+    def get_summary_stats(self) -> dict:
+        """Record count, time range and per-sensor averages from the rollups"""
+        with self._lock:
+            summary = {
+                "total_records": len(self.store),
+                "time_range": {"start": None, "end": None},
+                "averages": {}
+            }
+            if self.store.segments:
+                summary["time_range"] = {
+                    "start": datetime.fromtimestamp(self.store.segments[0]['start']).isoformat(),
+                    "end": datetime.fromtimestamp(self.store.segments[-1]['end']).isoformat()
+                }
+            for sensor in SUMMARY_SENSORS:
+                totals = self.stats.totals(sensor)
+                if totals and totals['average'] is not None:
+                    summary["averages"][sensor] = totals['average']
+        return summary
     
     def process_sensor_data(self, sensor_data: dict) -> dict:
         """Process raw sensor data for analysis"""
@@ -96,46 +182,110 @@ class DataProcessor:
         
         return max(0, min(100, health))
     
+    def _column(self, records: list, key: str, default: float) -> np.ndarray:
+        """Gather one numeric field across records, substituting a default"""
+        values = [r.get(key) for r in records]
+        return np.array([v if isinstance(v, (int, float)) else default for v in values],
+                        dtype=np.float64)
+    
+    def process_sensor_batch(self, records: list, keep_timestamps: bool = True) -> list:
+        """Vectorized process_sensor_data over many readings.
+        
+        Applies the same scoring rules with NumPy instead of per-row Python.
+        Readings that carry their own timestamp keep it when keep_timestamps
+        is set, so buffered gateway data lands at the time it was measured.
+        """
+        if not records:
+            return []
+        
+        # Soil raw ADC -> percentage, where present and in range
+        soil_raw = self._column(records, 'soil_raw', np.nan)
+        has_raw = np.array(['soil_raw' in r for r in records]) & (soil_raw >= 0) & (soil_raw <= 1023)
+        moisture = np.where(has_raw, (1023 - soil_raw) / 1023 * 100,
+                            self._column(records, 'soil_moisture_percent', 50))
+        
+        ph = self._column(records, 'ph_value', 7.0)
+        temp = self._column(records, 'temperature', 25)
+        humidity = self._column(records, 'humidity', 60)
+        
+        # Soil fertility index (see _calculate_fertility_index)
+        fertility = 50 + np.select(
+            [(ph >= 6.0) & (ph <= 7.0), (ph >= 5.5) & (ph <= 7.5)], [20, 10], -20)
+        fertility += np.select(
+            [(moisture >= 40) & (moisture <= 70), (moisture >= 30) & (moisture <= 80)], [15, 5], -15)
+        fertility += np.select(
+            [(temp >= 20) & (temp <= 30), (temp >= 15) & (temp <= 35)], [15, 5], -10)
+        fertility += np.where((humidity >= 50) & (humidity <= 70), 10, -5)
+        fertility = np.clip(fertility, 0, 100)
+        
+        # Plant health score (see _calculate_plant_health)
+        health = (70 - self._column(records, 'disease_risk', 0.3) * 30
+                  - self._column(records, 'pest_risk', 0.3) * 20)
+        health -= np.select([(temp > 35) | (temp < 10), (temp > 30) | (temp < 15)], [15, 5], 0)
+        health -= np.select([(moisture < 30) | (moisture > 80), (moisture < 40) | (moisture > 70)], [20, 10], 0)
+        health = np.clip(health, 0, 100)
+        
+        now = datetime.now().isoformat()
+        processed = []
+        for i, record in enumerate(records):
+            row = record.copy()
+            if has_raw[i]:
+                row['soil_moisture_percent'] = float(moisture[i])
+            row['fertility_index'] = float(fertility[i])
+            row['plant_health_score'] = float(health[i])
+            if not (keep_timestamps and isinstance(record.get('timestamp'), str)):
+                row['timestamp'] = now
+            processed.append(row)
+        return processed
+    
     def store_historical_data(self, data: dict, filename: str = 'historical_data.csv'):
-        """Store processed data for historical analysis"""
+        """Store processed data for historical analysis (O(1) append)"""
         try:
-            df = pd.DataFrame([data])
-            
-            # Load existing data if available
-            try:
-                existing_df = pd.read_csv(f'static/data/{filename}')
-                df = pd.concat([existing_df, df], ignore_index=True)
-            except FileNotFoundError:
-                pass
-            
-            # Keep only last 1000 records
-            if len(df) > 1000:
-                df = df.tail(1000)
+            with self._lock:
+                ts = self._get_store(filename).append(data)
+                if filename == 'historical_data.csv':
+                    self.stats.update(data, ts)
+                    self.anomalies.observe(data, ts)
+            return True
+        except Exception as e:
+            print(f"Error storing historical data: {e}")
+            return False
+    
+    def store_historical_batch(self, records: list) -> bool:
+        """Store many processed readings with one write per column"""
+        if not records:
+            return True
+        try:
+            # Order by time so rollups and anomaly scoring see a clean sequence
+            timestamps = [self.store.timestamp_of(record) for record in records]
+            order = sorted(range(len(records)), key=timestamps.__getitem__)
+            records = [records[i] for i in order]
+            timestamps = [timestamps[i] for i in order]
             
-            # Save to file
-            df.to_csv(f'static/data/{filename}', index=False)
-            self.historical_data = df
+            sensors = list(dict.fromkeys(self.stats.sensors + self.anomalies.sensors))
+            ts = np.asarray(timestamps)
+            columns = {sensor: self._column(records, sensor, np.nan) for sensor in sensors}
             
+            with self._lock:
+                self.store.append_many(records, timestamps)
+                self.stats.backfill(ts, columns)
+                self.anomalies.score_batch(ts, columns)
             return True
         except Exception as e:
-            print(f"Error storing historical data: {e}")
+            print(f"Error storing historical batch: {e}")
             return False
     
     def get_trend_analysis(self, days: int = 7) -> dict:
         """Analyze trends from historical data"""
-        if self.historical_data.empty:
+        with self._lock:
+            return self._trend_analysis(days)
+    
+    def _trend_analysis(self, days: int) -> dict:
+        if self.store.empty:
             return {}
         
-        # Convert timestamp to datetime
-        df = self.historical_data.copy()
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        
-        # Get data for specified days
-        cutoff = datetime.now() - timedelta(days=days)
-        recent_data = df[df['timestamp'] >= cutoff]
-        
-        if recent_data.empty:
-            return {}
+        now = datetime.now().timestamp()
+        cutoff = now - days * 86400
         
         trend_analysis = {
             'period_days': days,
@@ -144,38 +294,56 @@ class DataProcessor:
             'anomalies': []
         }
         
-        # Calculate statistics for each sensor
-        sensors = ['ph_value', 'temperature', 'humidity', 'soil_moisture_percent']
-        for sensor in sensors:
-            if sensor in recent_data.columns:
-                values = recent_data[sensor].dropna()
-                if len(values) > 0:
-                    trend_analysis['sensor_stats'][sensor] = {
-                        'current': float(values.iloc[-1]) if len(values) > 0 else None,
-                        'average': float(values.mean()),
-                        'min': float(values.min()),
-                        'max': float(values.max()),
-                        'trend': self._calculate_trend(values)
-                    }
-        
-        # Detect anomalies
-        trend_analysis['anomalies'] = self._detect_anomalies(recent_data)
+        # Statistics come from the hourly/daily rollups, not the raw rows
+        for sensor in TREND_SENSORS:
+            window = self.stats.window(sensor, cutoff, now)
+            if window:
+                if window['buckets'] < 2:
+                    # A single rollup bucket cannot be split; use its raw readings
+                    trend = self._calculate_trend(self._raw_series(sensor, cutoff, now))
+                else:
+                    trend = self._trend_from_halves(window['first_half_mean'],
+                                                    window['second_half_mean'])
+                trend_analysis['sensor_stats'][sensor] = {
+                    'current': self.stats.current(sensor, since=cutoff),
+                    'average': window['average'],
+                    'min': window['min'],
+                    'max': window['max'],
+                    'trend': trend
+                }
+        
+        if not trend_analysis['sensor_stats']:
+            return {}
+        
+        # Anomalies were scored at ingest time
+        trend_analysis['anomalies'] = self.get_anomalies(since=cutoff)
         
         return trend_analysis
     
+    def _raw_series(self, sensor: str, start: float, end: float) -> pd.Series:
+        """Stored readings of one sensor in [start, end], oldest first"""
+        values = self.store.read(start=start, end=end, columns=[sensor]).get(sensor)
+        if values is None:
+            return pd.Series(dtype=float)
+        return pd.Series(values[~np.isnan(values)])
+    
     def _calculate_trend(self, series: pd.Series) -> str:
         """Calculate trend direction"""
         if len(series) < 2:
             return "stable"
         
-        # Use linear regression for trend
-        x = np.arange(len(series))
-        y = series.values
-        
         # Simple trend calculation
+        y = series.values
         first_half = np.mean(y[:len(y)//2])
         second_half = np.mean(y[len(y)//2:])
         
+        return self._trend_from_halves(first_half, second_half)
+    
+    def _trend_from_halves(self, first_half, second_half) -> str:
+        """Classify the change between the two half-window means"""
+        if first_half is None or second_half is None:
+            return "stable"
+        
         change = ((second_half - first_half) / first_half * 100) if first_half != 0 else 0
         
         if change > 5:
@@ -184,34 +352,3 @@ class DataProcessor:
             return "decreasing"
         else:
             return "stable"
-    
-    def _detect_anomalies(self, df: pd.DataFrame) -> list:
-        """Detect anomalies in sensor data"""
-        anomalies = []
-        
-        # Check for sudden changes
-        for column in ['temperature', 'humidity', 'ph_value']:
-            if column in df.columns:
-                values = df[column].dropna()
-                if len(values) > 10:
-                    # Calculate moving average and standard deviation
-                    window = min(5, len(values))
-                    rolling_mean = values.rolling(window=window, center=True).mean()
-                    rolling_std = values.rolling(window=window, center=True).std()
-                    
-                    # Find values outside 2 standard deviations
-                    z_scores = (values - rolling_mean) / rolling_std
-                    anomaly_indices = np.where(np.abs(z_scores) > 2)[0]
-                    
-                    for idx in anomaly_indices:
-                        if idx < len(df):
-                            timestamp = df.iloc[idx]['timestamp']
-                            anomalies.append({
-                                'sensor': column,
-                                'timestamp': str(timestamp),
-                                'value': float(values.iloc[idx]),
-                                'expected_range': f"{rolling_mean.iloc[idx]:.1f} ± {rolling_std.iloc[idx]:.1f}",
-                                'severity': 'high' if abs(z_scores.iloc[idx]) > 3 else 'medium'
-                            })
-        
-        return anomalies
\ No newline at end of file
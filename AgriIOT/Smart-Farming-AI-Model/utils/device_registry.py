@@ -0,0 +1,109 @@
+import time
+from itertools import chain, islice
+from collections import OrderedDict, deque
+
+DEFAULT_DEVICE_ID = 'default'
+
+# Fields kept in each device's compact history tuples
+HISTORY_FIELDS = ('ph_value', 'temperature', 'humidity', 'soil_percent', 'mq137_raw')
+
+
+class DeviceState:
+    """Bounded in-memory state for one field device"""
+
+    __slots__ = ('device_id', 'sensor_data', 'predictions', 'alerts',
+                 'history', 'last_seen', 'readings')
+
+    def __init__(self, device_id: str, history_size: int, sensor_data: dict = None):
+        self.device_id = device_id
+        self.sensor_data = sensor_data if sensor_data is not None else {}
+        self.predictions = None
+        self.alerts = []
+        # (epoch seconds, *HISTORY_FIELDS, plant_health_score) per reading
+        self.history = deque(maxlen=history_size)
+        self.last_seen = None
+        self.readings = 0
+
+    def record(self, processed: dict, predictions: dict, alerts: list, ts: float = None):
+        """Remember the outcome of one processed reading"""
+        ts = ts if ts is not None else time.time()
+        self.predictions = predictions
+        self.alerts = alerts
+        self.history.append(self._history_row(ts, processed))
+        self.last_seen = ts
+        self.readings += 1
+
+    def backfill(self, readings: list):
+        """Merge late (ts, processed) readings into the history in time order.
+
+        Live state is left alone; only the newest `history_size` rows of the
+        merged history are kept.
+        """
+        rows = [self._history_row(ts, processed) for ts, processed in readings]
+        merged = sorted(chain(self.history, rows), key=lambda row: row[0])
+        self.history = deque(merged[-self.history.maxlen:], maxlen=self.history.maxlen)
+        self.readings += len(rows)
+
+    @staticmethod
+    def _history_row(ts: float, processed: dict) -> tuple:
+        return (ts, *(processed.get(f) for f in HISTORY_FIELDS), processed.get('plant_health_score'))
+
+    def history_records(self, limit: int = None) -> list:
+        """History as dicts, oldest first"""
+        rows = list(self.history)
+        if limit is not None:
+            rows = rows[-limit:]
+        keys = ('ts',) + HISTORY_FIELDS + ('plant_health_score',)
+        return [{k: v for k, v in zip(keys, row) if v is not None} for row in rows]
+
+    def summary(self) -> dict:
+        return {
+            'device_id': self.device_id,
+            'last_seen': self.last_seen,
+            'readings': self.readings,
+            'active_alerts': len(self.alerts)
+        }
+
+
+class DeviceRegistry:
+    """Devices keyed by id, evicting the least recently seen beyond a cap.
+
+    The default device is pinned so the single-farm endpoints keep working
+    no matter how many other devices report in.
+    """
+
+    def __init__(self, max_devices: int = 50000, history_size: int = 100):
+        self.max_devices = max_devices
+        self.history_size = history_size
+        self.devices = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.devices)
+
+    def __contains__(self, device_id: str) -> bool:
+        return device_id in self.devices
+
+    def get(self, device_id: str):
+        return self.devices.get(device_id)
+
+    def get_or_create(self, device_id: str, sensor_data: dict = None) -> DeviceState:
+        """Fetch a device, registering it (and evicting if needed) on first sight"""
+        device = self.devices.get(device_id)
+        if device is not None:
+            self.devices.move_to_end(device_id)
+            return device
+
+        device = DeviceState(device_id, self.history_size, sensor_data)
+        self.devices[device_id] = device
+        while len(self.devices) > self.max_devices:
+            oldest = next(iter(self.devices))
+            if oldest == DEFAULT_DEVICE_ID:
+                self.devices.move_to_end(oldest)
+                oldest = next(iter(self.devices))
+            del self.devices[oldest]
+        return device
+
+    def summaries(self, limit: int = 100, offset: int = 0) -> list:
+        """Device summaries, most recently seen first"""
+        ids = islice(reversed(self.devices), offset, offset + limit)
+        return [self.devices[device_id].summary() for device_id in ids]
@@ -0,0 +1,139 @@
+import time
+from collections import OrderedDict
+
+# Readings closer than these steps share a cache entry
+DEFAULT_RESOLUTION = {
+    'ph_value': 0.05,
+    'ph_voltage': 0.01,
+    'temperature': 0.2,
+    'humidity': 0.5,
+    'soil_percent': 0.5,
+    'soil_raw': 5,
+    'mq137_raw': 5,
+    'rain_analog': 5,
+}
+
+# Fields that never influence a prediction
+IGNORED_FIELDS = ('timestamp', 'device_id')
+
+
+class PredictionCache:
+    """LRU + TTL memo in front of FarmPredictor.predict.
+
+    Keys are the sensor readings quantized to a per-field resolution, so a
+    field that only jitters within its resolution keeps hitting the same
+    entry. Call `invalidate` whenever the models are reloaded.
+    """
+
+    def __init__(self, predictor, resolution: dict = None, default_resolution: float = 0.01,
+                 max_entries: int = 2048, ttl: float = 300):
+        self.predictor = predictor
+        self.resolution = dict(DEFAULT_RESOLUTION, **(resolution or {}))
+        self.default_resolution = default_resolution
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self.entries = OrderedDict()  # key -> (expires_at, predictions)
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0, 'invalidations': 0}
+
+    def key(self, sensor_data: dict) -> tuple:
+        """Quantized, order-independent key for a sensor reading"""
+        parts = []
+        for field in sorted(sensor_data):
+            if field in IGNORED_FIELDS:
+                continue
+            value = sensor_data[field]
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                step = self.resolution.get(field, self.default_resolution)
+                parts.append((field, round(value / step)))
+            elif isinstance(value, (str, bool)) or value is None:
+                parts.append((field, value))
+        return tuple(parts)
+
+    def _lookup(self, key: tuple, now: float):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < now:
+            del self.entries[key]
+            self.stats['expired'] += 1
+            return None
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def _store(self, key: tuple, predictions, now: float):
+        self.entries[key] = (now + self.ttl, predictions)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def predict(self, sensor_data: dict):
+        """Cached equivalent of predictor.predict"""
+        now = time.monotonic()
+        key = self.key(sensor_data)
+        predictions = self._lookup(key, now)
+        if predictions is not None:
+            self.stats['hits'] += 1
+            return predictions
+
+        self.stats['misses'] += 1
+        predictions = self.predictor.predict(sensor_data)
+        self._store(key, predictions, now)
+        return predictions
+
+    def _partition(self, states: list):
+        """Look up every state; returns (results, {key: [indices]} of misses)"""
+        now = time.monotonic()
+        keys = [self.key(state) for state in states]
+        results = [self._lookup(key, now) for key in keys]
+
+        # Identical keys inside one batch are only predicted once
+        pending = OrderedDict()
+        for index, (key, result) in enumerate(zip(keys, results)):
+            if result is None:
+                pending.setdefault(key, []).append(index)
+        self.stats['hits'] += len(states) - sum(len(v) for v in pending.values())
+        self.stats['misses'] += len(pending)
+        return results, pending
+
+    def _fill(self, results: list, pending: OrderedDict, computed: list) -> list:
+        now = time.monotonic()
+        for (key, indices), predictions in zip(pending.items(), computed):
+            self._store(key, predictions, now)
+            for index in indices:
+                results[index] = predictions
+        return results
+
+    def predict_many(self, states: list) -> list:
+        """Cached batch prediction; misses go to the predictor in one call"""
+        results, pending = self._partition(states)
+        if not pending:
+            return results
+        misses = [states[indices[0]] for indices in pending.values()]
+        if hasattr(self.predictor, 'predict_batch'):
+            computed = self.predictor.predict_batch(misses)
+        else:
+            computed = [self.predictor.predict(state) for state in misses]
+        return self._fill(results, pending, computed)
+
+    async def predict_many_async(self, states: list, compute) -> list:
+        """Like predict_many, but misses are handed to `await compute(misses)`"""
+        results, pending = self._partition(states)
+        if not pending:
+            return results
+        computed = await compute([states[indices[0]] for indices in pending.values()])
+        return self._fill(results, pending, computed)
+
+    def invalidate(self):
+        """Drop every entry, e.g. after the models were reloaded"""
+        self.entries.clear()
+        self.stats['invalidations'] += 1
+
+    def info(self) -> dict:
+        lookups = self.stats['hits'] + self.stats['misses']
+        return {
+            **self.stats,
+            'entries': len(self.entries),
+            'hit_rate': round(self.stats['hits'] / lookups, 3) if lookups else None
+        }
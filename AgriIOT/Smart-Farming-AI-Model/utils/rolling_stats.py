@@ -0,0 +1,182 @@
+import numpy as np
+from datetime import datetime
+
+HOUR = 3600
+DAY = 86400
+
+# Bucket layout: [count, sum, min, max]
+COUNT, TOTAL, MIN, MAX = range(4)
+
+
+class RollingStats:
+    """Incremental per-sensor aggregates with hourly and daily rollups.
+
+    Each stored reading updates one hourly and one daily bucket per sensor,
+    so window queries touch at most a few hundred buckets regardless of how
+    many readings the history holds.
+    """
+
+    def __init__(self, sensors: list, hourly_retention_hours: int = 24 * 31,
+                 daily_retention_days: int = 366):
+        self.sensors = list(sensors)
+        self.hourly_retention_hours = hourly_retention_hours
+        self.daily_retention_days = daily_retention_days
+
+        self.hourly = {sensor: {} for sensor in self.sensors}
+        self.daily = {sensor: {} for sensor in self.sensors}
+        self.latest = {}  # sensor -> (ts, value)
+        self._trimmed_hour = -1
+
+    # ------------------------------------------------------------------
+    # Updates
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _merge(buckets: dict, key: int, count: int, total: float,
+               minimum: float, maximum: float):
+        bucket = buckets.get(key)
+        if bucket is None:
+            buckets[key] = [count, total, minimum, maximum]
+        else:
+            bucket[COUNT] += count
+            bucket[TOTAL] += total
+            bucket[MIN] = min(bucket[MIN], minimum)
+            bucket[MAX] = max(bucket[MAX], maximum)
+
+    def _trim(self, now_ts: float):
+        """Drop buckets that fell out of the retention windows"""
+        oldest_hour = int(now_ts // HOUR) - self.hourly_retention_hours
+        oldest_day = int(now_ts // DAY) - self.daily_retention_days
+        for sensor in self.sensors:
+            for buckets, oldest in ((self.hourly[sensor], oldest_hour), (self.daily[sensor], oldest_day)):
+                for key in [k for k in buckets if k < oldest]:
+                    del buckets[key]
+
+    def update(self, record: dict, ts: float):
+        """Fold one reading into the running aggregates (O(sensors))"""
+        hour, day = int(ts // HOUR), int(ts // DAY)
+        for sensor in self.sensors:
+            value = record.get(sensor)
+            if not isinstance(value, (int, float)) or value != value:
+                continue
+            value = float(value)
+            self._merge(self.hourly[sensor], hour, 1, value, value, value)
+            self._merge(self.daily[sensor], day, 1, value, value, value)
+            if sensor not in self.latest or ts >= self.latest[sensor][0]:
+                self.latest[sensor] = (ts, value)
+
+        if hour > self._trimmed_hour:
+            self._trimmed_hour = hour
+            self._trim(ts)
+
+    def backfill(self, ts: np.ndarray, columns: dict):
+        """Rebuild rollups from time-sorted column arrays in one vectorized pass"""
+        ts = np.asarray(ts, dtype=np.float64)
+        if ts.size == 0:
+            return
+
+        for width, rollup in ((HOUR, self.hourly), (DAY, self.daily)):
+            keys = (ts // width).astype(np.int64)
+            for sensor in self.sensors:
+                if sensor not in columns:
+                    continue
+                values = np.asarray(columns[sensor], dtype=np.float64)
+                valid = ~np.isnan(values)
+                if not valid.any():
+                    continue
+                sensor_keys, sensor_values = keys[valid], values[valid]
+                unique, starts = np.unique(sensor_keys, return_index=True)
+                counts = np.diff(np.append(starts, sensor_values.size))
+                totals = np.add.reduceat(sensor_values, starts)
+                mins = np.minimum.reduceat(sensor_values, starts)
+                maxs = np.maximum.reduceat(sensor_values, starts)
+                for key, count, total, low, high in zip(unique.tolist(), counts.tolist(),
+                                                        totals.tolist(), mins.tolist(), maxs.tolist()):
+                    self._merge(rollup[sensor], key, count, total, low, high)
+
+        for sensor in self.sensors:
+            if sensor not in columns:
+                continue
+            values = np.asarray(columns[sensor], dtype=np.float64)
+            valid = np.flatnonzero(~np.isnan(values))
+            if valid.size:
+                last = valid[-1]
+                if sensor not in self.latest or ts[last] >= self.latest[sensor][0]:
+                    self.latest[sensor] = (float(ts[last]), float(values[last]))
+
+        newest_hour = int(ts[-1] // HOUR)
+        if newest_hour > self._trimmed_hour:
+            self._trimmed_hour = newest_hour
+            self._trim(float(ts[-1]))
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+    def window(self, sensor: str, start: float, end: float = None) -> dict:
+        """Aggregate a sensor over [start, end] from whole rollup buckets.
+
+        Uses hourly buckets when the window fits in hourly retention and daily
+        buckets otherwise; edge buckets are included whole. Also returns the
+        means of the older and newer half of the populated window, which feed
+        the trend classification. A window of one bucket has no halves
+        (second_half_mean is None); check 'buckets' and fall back to the raw
+        readings in that case.
+        """
+        if sensor not in self.hourly:
+            return None
+        if end is None:
+            end = datetime.now().timestamp()
+
+        if end - start <= self.hourly_retention_hours * HOUR:
+            width, buckets = HOUR, self.hourly[sensor]
+        else:
+            width, buckets = DAY, self.daily[sensor]
+
+        first_key = int(start // width)
+        last_key = int(end // width)
+        keys = [key for key in buckets if first_key <= key <= last_key]
+        if not keys:
+            return None
+
+        # Split the populated part of the window in two for trend detection;
+        # late readings may arrive out of order, so keys are filtered not sliced
+        middle_key = (min(keys) + max(keys) + 1) / 2
+
+        count, total, low, high = 0, 0.0, float('inf'), float('-inf')
+        halves = [[0, 0.0], [0, 0.0]]
+        for key in keys:
+            bucket = buckets[key]
+            count += bucket[COUNT]
+            total += bucket[TOTAL]
+            low = min(low, bucket[MIN])
+            high = max(high, bucket[MAX])
+            half = halves[0] if key < middle_key else halves[1]
+            half[0] += bucket[COUNT]
+            half[1] += bucket[TOTAL]
+
+        if count == 0:
+            return None
+        return {
+            'count': count,
+            'buckets': len(keys),
+            'average': total / count,
+            'min': low,
+            'max': high,
+            'first_half_mean': halves[0][1] / halves[0][0] if halves[0][0] else None,
+            'second_half_mean': halves[1][1] / halves[1][0] if halves[1][0] else None,
+        }
+
+    def totals(self, sensor: str) -> dict:
+        """Count and mean over everything still held in the daily rollups"""
+        buckets = self.daily.get(sensor)
+        if not buckets:
+            return None
+        count = sum(bucket[COUNT] for bucket in buckets.values())
+        total = sum(bucket[TOTAL] for bucket in buckets.values())
+        return {'count': count, 'average': total / count if count else None}
+
+    def current(self, sensor: str, since: float = None):
+        """Latest value seen for a sensor (optionally no older than `since`)"""
+        latest = self.latest.get(sensor)
+        if latest is None or (since is not None and latest[0] < since):
+            return None
+        return latest[1]
@@ -0,0 +1,468 @@
+import os
+import re
+import json
+import shutil
+import numpy as np
+from datetime import datetime, timedelta
+
+TIMESTAMP_COLUMN = '_ts'
+MISSING_CODE = -1
+COLUMN_NAME = re.compile(r'^[A-Za-z][A-Za-z0-9_.-]{0,63}$')
+
+
+class TimeSeriesStore:
+    """Append-only, segmented columnar store for sensor history.
+
+    Layout on disk::
+
+        <root>/index.json             column types, string dictionaries, segment list
+        <root>/seg_000000/_ts.bin     float64 epoch seconds
+        <root>/seg_000000/<col>.bin   float64 values (NaN = missing) or
+                                      int32 dictionary codes (-1 = missing)
+
+    Every row writes one fixed-width value to each column file of the active
+    segment, so appends cost the same no matter how much history exists.
+    Reads memory-map the column files and never parse text.
+    """
+
+    def __init__(self, root: str, segment_rows: int = 4096,
+                 retention_days: int = 180, max_categories: int = 1024):
+        self.root = root
+        self.segment_rows = segment_rows
+        self.retention_days = retention_days
+        self.max_categories = max_categories
+
+        self.columns = {}        # name -> 'f8' | 'cat'
+        self.categories = {}     # name -> list of strings (code = position)
+        self._category_codes = {}
+        self.segments = []       # [{'id', 'start', 'end', 'rows', 'sorted'}]
+
+        self._handles = {}
+        self._schema_dirty = False
+        self._maps = {}          # sealed segment memmaps, keyed by (id, column)
+
+        os.makedirs(self.root, exist_ok=True)
+        self._load_index()
+        self._recover_active_segment()
+
+    # ------------------------------------------------------------------
+    # Index
+    # ------------------------------------------------------------------
+    def _index_path(self) -> str:
+        return os.path.join(self.root, 'index.json')
+
+    def _segment_dir(self, segment_id: int) -> str:
+        return os.path.join(self.root, f'seg_{segment_id:06d}')
+
+    def _column_path(self, segment_id: int, column: str) -> str:
+        return os.path.join(self._segment_dir(segment_id), f'{column}.bin')
+
+    def _load_index(self):
+        """Load column schema and segment list from index.json"""
+        try:
+            with open(self._index_path(), 'r') as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            return
+
+        self.columns = index.get('columns', {})
+        self.categories = index.get('categories', {})
+        self._category_codes = {
+            name: {value: code for code, value in enumerate(values)}
+            for name, values in self.categories.items()
+        }
+        self.segments = index.get('segments', [])
+
+    def _save_index(self):
+        """Persist the index atomically; only called on schema/segment changes"""
+        index = {
+            'columns': self.columns,
+            'categories': self.categories,
+            'segments': [
+                {'id': s['id'], 'start': s['start'], 'end': s['end'], 'rows': s['rows'],
+                 'sorted': s.get('sorted', True)}
+                for s in self.segments
+            ]
+        }
+        tmp_path = self._index_path() + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self._index_path())
+
+    def _recover_active_segment(self):
+        """Trim a torn trailing row and refresh row counts of the open segment"""
+        if not self.segments:
+            return
+
+        active = self.segments[-1]
+        ts_path = self._column_path(active['id'], TIMESTAMP_COLUMN)
+        if not os.path.exists(ts_path):
+            active['rows'] = 0
+            return
+
+        rows = os.path.getsize(ts_path) // 8
+        for column, kind in self.columns.items():
+            path = self._column_path(active['id'], column)
+            if os.path.exists(path):
+                rows = min(rows, os.path.getsize(path) // self._itemsize(kind))
+
+        for column, kind in [(TIMESTAMP_COLUMN, 'f8'), *self.columns.items()]:
+            path = self._column_path(active['id'], column)
+            if os.path.exists(path) and os.path.getsize(path) > rows * self._itemsize(kind):
+                with open(path, 'r+b') as f:
+                    f.truncate(rows * self._itemsize(kind))
+
+        active['rows'] = rows
+        if rows:
+            ts = np.memmap(ts_path, dtype='<f8', mode='r', shape=(rows,))
+            active['end'] = float(ts.max())
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _itemsize(kind: str) -> int:
+        return 8 if kind == 'f8' else 4
+
+    @staticmethod
+    def _missing_bytes(kind: str, rows: int) -> bytes:
+        if kind == 'f8':
+            return np.full(rows, np.nan, dtype='<f8').tobytes()
+        return np.full(rows, MISSING_CODE, dtype='<i4').tobytes()
+
+    def _handle(self, segment: dict, column: str, kind: str):
+        """Return an unbuffered append handle, back-filling new columns"""
+        handle = self._handles.get(column)
+        if handle is None:
+            path = self._column_path(segment['id'], column)
+            existing = os.path.getsize(path) // self._itemsize(kind) if os.path.exists(path) else 0
+            handle = open(path, 'ab', buffering=0)
+            if existing < segment['rows']:
+                handle.write(self._missing_bytes(kind, segment['rows'] - existing))
+            self._handles[column] = handle
+        return handle
+
+    def _close_handles(self):
+        for handle in self._handles.values():
+            handle.close()
+        self._handles = {}
+
+    def _open_segment(self, ts: float) -> dict:
+        """Seal the active segment (if any) and start a new one"""
+        self._close_handles()
+        next_id = self.segments[-1]['id'] + 1 if self.segments else 0
+        os.makedirs(self._segment_dir(next_id), exist_ok=True)
+        segment = {'id': next_id, 'start': ts, 'end': ts, 'rows': 0, 'sorted': True}
+        self.segments.append(segment)
+        self._apply_retention(ts)
+        self._save_index()
+        return segment
+
+    def _apply_retention(self, now_ts: float):
+        """Drop whole sealed segments that ended before the retention window"""
+        if not self.retention_days:
+            return
+        cutoff = now_ts - self.retention_days * 86400
+        while len(self.segments) > 1 and self.segments[0]['end'] < cutoff:
+            expired = self.segments.pop(0)
+            self._maps = {k: v for k, v in self._maps.items() if k[0] != expired['id']}
+            shutil.rmtree(self._segment_dir(expired['id']), ignore_errors=True)
+
+    def _encode(self, column: str, value):
+        """Map a value to (kind, fixed-width scalar), registering new columns"""
+        if not COLUMN_NAME.match(column):
+            return None, None
+        if isinstance(value, (bool, int, float, np.integer, np.floating)):
+            kind = 'f8'
+        elif isinstance(value, str):
+            kind = 'cat'
+        else:
+            return None, None
+
+        known = self.columns.get(column)
+        if known is None:
+            self.columns[column] = kind
+            if kind == 'cat':
+                self.categories[column] = []
+                self._category_codes[column] = {}
+            self._schema_dirty = True
+        elif known != kind:
+            return known, None
+
+        if kind == 'f8':
+            return kind, float(value)
+
+        codes = self._category_codes[column]
+        code = codes.get(value)
+        if code is None:
+            if len(codes) >= self.max_categories:
+                return kind, None
+            code = len(codes)
+            codes[value] = code
+            self.categories[column].append(value)
+            self._schema_dirty = True
+        return kind, code
+
+    def _encode_row(self, record: dict) -> dict:
+        """Encode one record into {column: fixed-width scalar}"""
+        row = {}
+        for column, value in self._flatten(record).items():
+            if column == 'timestamp':
+                continue
+            kind, encoded = self._encode(column, value)
+            if kind is not None and encoded is not None:
+                row[column] = encoded
+        return row
+
+    def _write_rows(self, segment: dict, timestamps: list, rows: list):
+        """Write encoded rows to the segment with one write per column"""
+        self._handle(segment, TIMESTAMP_COLUMN, 'f8').write(np.asarray(timestamps, dtype='<f8').tobytes())
+        for column, kind in self.columns.items():
+            if kind == 'f8':
+                values = np.array([row.get(column, np.nan) for row in rows], dtype='<f8')
+            else:
+                values = np.array([row.get(column, MISSING_CODE) for row in rows], dtype='<i4')
+            self._handle(segment, column, kind).write(values.tobytes())
+
+        in_order = all(a <= b for a, b in zip(timestamps, timestamps[1:]))
+        if segment['rows'] and timestamps[0] < segment['end']:
+            in_order = False
+        if not in_order and segment.get('sorted', True):
+            segment['sorted'] = False
+            self._schema_dirty = True
+
+        segment['rows'] += len(rows)
+        segment['start'] = min(segment['start'], min(timestamps))
+        segment['end'] = max(segment['end'], max(timestamps))
+
+    def append(self, record: dict, ts: float = None):
+        """Append one row and return its timestamp; nested dicts are flattened"""
+        if ts is None:
+            ts = self.timestamp_of(record)
+        return self.append_many([record], [ts])[0]
+
+    def append_many(self, records: list, timestamps: list = None) -> list:
+        """Append rows in bulk and return their timestamps.
+
+        Rows are split only at segment boundaries, so a batch costs one write
+        per column per segment touched rather than one per row.
+        """
+        if timestamps is None:
+            timestamps = [self.timestamp_of(record) for record in records]
+        timestamps = [float(ts) for ts in timestamps]
+
+        self._schema_dirty = False
+        rows = [self._encode_row(record) for record in records]
+
+        written = 0
+        while written < len(rows):
+            segment = self.segments[-1] if self.segments else None
+            if segment is None or segment['rows'] >= self.segment_rows:
+                segment = self._open_segment(timestamps[written])
+            take = min(self.segment_rows - segment['rows'], len(rows) - written)
+            self._write_rows(segment, timestamps[written:written + take],
+                             rows[written:written + take])
+            written += take
+
+        if self._schema_dirty:
+            self._save_index()
+        return timestamps
+
+    @staticmethod
+    def _flatten(record: dict) -> dict:
+        """Promote scalar leaves of nested dicts; top-level keys win on clashes"""
+        flat = {}
+        nested = []
+        for key, value in record.items():
+            if isinstance(value, dict):
+                nested.append(value)
+            else:
+                flat[key] = value
+        while nested:
+            for key, value in nested.pop(0).items():
+                if isinstance(value, dict):
+                    nested.append(value)
+                elif key not in flat:
+                    flat[key] = value
+        return flat
+
+    @staticmethod
+    def timestamp_of(record: dict) -> float:
+        value = record.get('timestamp')
+        if isinstance(value, (int, float)):
+            return float(value)
+        if isinstance(value, str):
+            try:
+                return datetime.fromisoformat(value).timestamp()
+            except ValueError:
+                pass
+        return datetime.now().timestamp()
+
+    def close(self):
+        """Close open column handles"""
+        self._close_handles()
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+    def __len__(self) -> int:
+        return sum(s['rows'] for s in self.segments)
+
+    @property
+    def empty(self) -> bool:
+        return len(self) == 0
+
+    def _map(self, segment: dict, column: str, kind: str):
+        """Memory-map one column of a segment (cached once the segment is sealed)"""
+        sealed = segment is not self.segments[-1]
+        key = (segment['id'], column)
+        if sealed and key in self._maps:
+            return self._maps[key]
+
+        rows = segment['rows']
+        dtype = '<f8' if kind == 'f8' else '<i4'
+        path = self._column_path(segment['id'], column)
+        available = os.path.getsize(path) // self._itemsize(kind) if os.path.exists(path) else 0
+        if rows == 0:
+            array = np.empty(0, dtype=dtype)
+        elif available < rows:
+            # Column first appeared after this segment was written
+            array = np.full(rows, np.nan if kind == 'f8' else MISSING_CODE, dtype=dtype)
+            if available:
+                array[:available] = np.memmap(path, dtype=dtype, mode='r', shape=(available,))
+        else:
+            array = np.memmap(path, dtype=dtype, mode='r', shape=(rows,))
+
+        if sealed:
+            self._maps[key] = array
+        return array
+
+    def read(self, start: float = None, end: float = None,
+             columns: list = None, limit: int = None) -> dict:
+        """Return {column: array} for rows in [start, end], newest `limit` rows.
+
+        Rows come back in time order. Numeric columns are zero-copy memmap
+        slices when the range falls in a single sorted segment; categorical
+        columns are returned as int32 codes (see `decode`).
+        """
+        if columns is None:
+            columns = list(self.columns)
+        columns = [c for c in columns if c in self.columns]
+
+        if limit is not None and limit <= 0:
+            return {column: np.empty(0, dtype='<f8' if kind == 'f8' else '<i4')
+                    for column, kind in [(TIMESTAMP_COLUMN, 'f8')] + [(c, self.columns[c]) for c in columns]}
+
+        # Late rows can make segments overlap in time, so `limit` is applied
+        # by timestamp: each segment contributes at most its newest `limit`
+        # rows, and segments ending before the limit-th newest row seen so
+        # far are skipped without reading them.
+        selected = []
+        collected = []
+        cutoff = None
+        for segment in reversed(self.segments):
+            if segment['rows'] == 0:
+                continue
+            if start is not None and segment['end'] < start:
+                continue
+            if end is not None and segment['start'] > end:
+                continue
+            if cutoff is not None and segment['end'] < cutoff:
+                continue
+
+            ts = self._map(segment, TIMESTAMP_COLUMN, 'f8')
+            if segment.get('sorted', True):
+                lo = int(np.searchsorted(ts, start, side='left')) if start is not None else 0
+                hi = int(np.searchsorted(ts, end, side='right')) if end is not None else len(ts)
+                if limit is not None:
+                    lo = max(lo, hi - limit)
+                if hi <= lo:
+                    continue
+                rows = slice(lo, hi)
+            else:
+                mask = np.ones(len(ts), dtype=bool)
+                if start is not None:
+                    mask &= ts >= start
+                if end is not None:
+                    mask &= ts <= end
+                rows = np.flatnonzero(mask)
+                if limit is not None and rows.size > limit:
+                    newest = np.argpartition(ts[rows], rows.size - limit)[rows.size - limit:]
+                    rows = np.sort(rows[newest])
+                if rows.size == 0:
+                    continue
+
+            selected.append((segment, rows))
+            if limit is not None:
+                collected.append(ts[rows])
+                seen = sum(part.size for part in collected)
+                if seen >= limit:
+                    merged = np.concatenate(collected)
+                    cutoff = float(np.partition(merged, seen - limit)[seen - limit])
+        selected.reverse()
+
+        result = {}
+        for column, kind in [(TIMESTAMP_COLUMN, 'f8')] + [(c, self.columns[c]) for c in columns]:
+            parts = [self._map(seg, column, kind)[rows] for seg, rows in selected]
+            if len(parts) == 1:
+                result[column] = parts[0]
+            elif parts:
+                result[column] = np.concatenate(parts)
+            else:
+                result[column] = np.empty(0, dtype='<f8' if kind == 'f8' else '<i4')
+
+        total = result[TIMESTAMP_COLUMN].size
+        if limit is not None and total > limit:
+            newest = np.argpartition(result[TIMESTAMP_COLUMN], total - limit)[total - limit:]
+            result = {column: values[newest] for column, values in result.items()}
+
+        if not all(seg.get('sorted', True) for seg, _ in selected) or len(selected) > 1:
+            order = np.argsort(result[TIMESTAMP_COLUMN], kind='stable')
+            if np.any(order != np.arange(order.size)):
+                result = {column: values[order] for column, values in result.items()}
+        return result
+
+    def decode(self, column: str, codes: np.ndarray) -> list:
+        """Turn categorical codes back into strings (None for missing)"""
+        values = self.categories.get(column, [])
+        return [values[c] if c != MISSING_CODE else None for c in codes.tolist()]
+
+    def read_since(self, days: int, columns: list = None) -> dict:
+        """Convenience wrapper for the last `days` days of data"""
+        cutoff = (datetime.now() - timedelta(days=days)).timestamp()
+        return self.read(start=cutoff, columns=columns)
+
+    def to_records(self, limit: int = None, start: float = None) -> list:
+        """Materialize rows as JSON-friendly dicts, oldest first"""
+        data = self.read(start=start, limit=limit)
+        ts = data.pop(TIMESTAMP_COLUMN)
+        decoded = {}
+        for column, values in data.items():
+            if self.columns[column] == 'cat':
+                decoded[column] = self.decode(column, values)
+            else:
+                decoded[column] = [None if v != v else v for v in values.tolist()]
+
+        records = []
+        for i, t in enumerate(ts.tolist()):
+            record = {'timestamp': datetime.fromtimestamp(t).isoformat()}
+            for column, values in decoded.items():
+                if values[i] is not None:
+                    record[column] = values[i]
+            records.append(record)
+        return records
+
+    def to_frame(self, start: float = None, limit: int = None, columns: list = None):
+        """Build a pandas DataFrame with a datetime `timestamp` column"""
+        import pandas as pd
+
+        data = self.read(start=start, limit=limit, columns=columns)
+        local_tz = datetime.now().astimezone().tzinfo
+        timestamps = pd.to_datetime(np.asarray(data.pop(TIMESTAMP_COLUMN)), unit='s', utc=True)
+        frame = {'timestamp': timestamps.tz_convert(local_tz).tz_localize(None)}
+        for column, values in data.items():
+            if self.columns[column] == 'cat':
+                frame[column] = self.decode(column, values)
+            else:
+                frame[column] = np.asarray(values)
+        return pd.DataFrame(frame)
@@ -0,0 +1,134 @@
+import time
+import asyncio
+from collections import deque
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# Predictor instance owned by each inference worker process
+_worker_predictor = None
+
+
+def init_inference_worker():
+    """Load the models once per worker process"""
+    global _worker_predictor
+    from models.predict import FarmPredictor
+
+    _worker_predictor = FarmPredictor()
+    _worker_predictor.load_models()
+
+
+def predict_with(predictor, states: list) -> list:
+    """Run a predictor over many states, batched when it supports it"""
+    if hasattr(predictor, 'predict_batch'):
+        return predictor.predict_batch(states)
+    return [predictor.predict(state) for state in states]
+
+
+def predict_in_worker(states: list) -> list:
+    return predict_with(_worker_predictor, states)
+
+
+class Overloaded(Exception):
+    """Raised when a pool already holds its maximum number of pending jobs"""
+
+
+class LatencyStats:
+    """Counts and recent latency percentiles for one kind of job"""
+
+    def __init__(self, window: int = 1000):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.errors = 0
+        self.rejected = 0
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+        self.count += 1
+
+    def summary(self) -> dict:
+        samples = sorted(self.samples)
+
+        def percentile(p):
+            return round(samples[min(len(samples) - 1, int(p * len(samples)))] * 1000, 2)
+
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'rejected': self.rejected,
+            'avg_ms': round(sum(samples) / len(samples) * 1000, 2) if samples else None,
+            'p50_ms': percentile(0.5) if samples else None,
+            'p95_ms': percentile(0.95) if samples else None,
+            'max_ms': round(samples[-1] * 1000, 2) if samples else None,
+        }
+
+
+class WorkerPools:
+    """Keeps model inference and blocking I/O off the event loop.
+
+    Inference runs in a process pool whose workers each load their own
+    models (or in a single thread next to `predictor` when
+    inference_processes is 0); file I/O runs in a thread pool. Each pool
+    admits at most `max_pending` jobs and raises Overloaded beyond that.
+    """
+
+    def __init__(self, predictor=None, inference_processes: int = 2, io_threads: int = 4,
+                 max_pending: int = 64):
+        self.predictor = predictor
+        self.inference_processes = inference_processes
+        self.max_pending = max_pending
+        self.pending = {'inference': 0, 'io': 0}
+        self.latency = {'inference': LatencyStats(), 'io': LatencyStats()}
+
+        self._inference_pool = self._make_inference_pool()
+        self._io_pool = ThreadPoolExecutor(io_threads, thread_name_prefix='io')
+
+    def _make_inference_pool(self):
+        if self.inference_processes > 0:
+            return ProcessPoolExecutor(self.inference_processes, initializer=init_inference_worker)
+        return ThreadPoolExecutor(1, thread_name_prefix='inference')
+
+    async def _submit(self, kind: str, pool, fn):
+        stats = self.latency[kind]
+        if self.pending[kind] >= self.max_pending:
+            stats.rejected += 1
+            raise Overloaded(f"{kind} queue is full ({self.max_pending} pending jobs)")
+
+        self.pending[kind] += 1
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, fn)
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            self.pending[kind] -= 1
+            stats.record(time.perf_counter() - started)
+
+    async def predict_many(self, states: list) -> list:
+        """Run inference for many states on the inference pool"""
+        if self.inference_processes > 0:
+            fn = partial(predict_in_worker, states)
+        else:
+            fn = partial(predict_with, self.predictor, states)
+        return await self._submit('inference', self._inference_pool, fn)
+
+    async def run_io(self, fn, *args, **kwargs):
+        """Run a blocking I/O call on the thread pool"""
+        return await self._submit('io', self._io_pool, partial(fn, *args, **kwargs))
+
+    def restart_inference(self):
+        """Replace the inference workers so they load fresh models"""
+        old_pool = self._inference_pool
+        self._inference_pool = self._make_inference_pool()
+        old_pool.shutdown(wait=False)
+
+    def shutdown(self):
+        self._inference_pool.shutdown(wait=False, cancel_futures=True)
+        self._io_pool.shutdown(wait=False, cancel_futures=True)
+
+    def metrics(self) -> dict:
+        return {
+            kind: {**self.latency[kind].summary(), 'pending': self.pending[kind],
+                   'max_pending': self.max_pending}
+            for kind in self.pending
+        }
@@ -1,37 +1,135 @@
+import hashlib
+import io
 import os
-from flask import Flask, redirect, render_template, request
-from PIL import Image
-import torchvision.transforms.functional as TF
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, jsonify, make_response, redirect, render_template, request
+from werkzeug.utils import secure_filename
 import CNN
+from inference import IMAGE_SIZE, BatchingEngine, load_image_tensor, top_k
+from prediction_cache import PredictionCache, content_key, perceptual_key
+from disease_table import build_disease_table, build_market_listing, read_info
 import numpy as np
 import torch
-import pandas as pd
+from PIL import Image, UnidentifiedImageError
 
-# Load Disease & Supplement Info CSV
-disease_info = pd.read_csv('disease_info.csv', encoding='cp1252')
-supplement_info = pd.read_csv('supplement_info.csv', encoding='cp1252')
+# Load Disease & Supplement Info CSV once into per-class records and the
+# /market listing, so requests never touch pandas
+disease_info, supplement_info = read_info('disease_info.csv', 'supplement_info.csv')
+DISEASES = build_disease_table(disease_info, supplement_info)
+MARKET_LISTING = build_market_listing(disease_info, supplement_info)
+del disease_info, supplement_info
 
-# Load trained model
-model = CNN.CNN(39)
-model.load_state_dict(torch.load("plant_disease_model_1_latest.pt", map_location=torch.device('cpu')))
+# Load trained model; MODEL_VARIANT=traced|int8 serves a TorchScript
+# artifact written by export_model.py instead of the eager state_dict
+MODEL_VARIANT = os.environ.get('MODEL_VARIANT', 'eager')
+if MODEL_VARIANT == 'eager':
+    MODEL_PATH = "plant_disease_model_1_latest.pt"
+    model = CNN.CNN(39)
+    model.load_state_dict(torch.load(MODEL_PATH, map_location=torch.device('cpu')))
+else:
+    MODEL_PATH = f"plant_disease_model_1_latest.{MODEL_VARIANT}.pt"
+    model = torch.jit.load(MODEL_PATH, map_location=torch.device('cpu'))
 model.eval()
 
-# Prediction function
+# Concurrent requests share batched forward passes
+BATCH_SIZE = int(os.environ.get('BATCH_SIZE', 16))
+BATCH_WAIT_MS = float(os.environ.get('BATCH_WAIT_MS', 5))
+engine = BatchingEngine(
+    model,
+    max_batch_size=BATCH_SIZE,
+    max_wait_ms=BATCH_WAIT_MS,
+    num_threads=int(os.environ.get('TORCH_THREADS', 0)) or None
+)
+
+# Softmax temperature fitted by `export_model.py --calibrate`
+SOFTMAX_TEMPERATURE = float(os.environ.get('SOFTMAX_TEMPERATURE', 1.0))
+
+# Optional cascade: a cheap TorchScript classifier (CASCADE_MODEL, fed
+# CASCADE_SIZE px images, e.g. the int8 export) answers on its own when its
+# top probability reaches CASCADE_THRESHOLD; the rest go to the full model
+CASCADE_MODEL = os.environ.get('CASCADE_MODEL')
+CASCADE_SIZE = int(os.environ.get('CASCADE_SIZE', IMAGE_SIZE))
+CASCADE_THRESHOLD = float(os.environ.get('CASCADE_THRESHOLD', 0.9))
+fast_engine = None
+if CASCADE_MODEL:
+    fast_model = torch.jit.load(CASCADE_MODEL, map_location=torch.device('cpu')).eval()
+    fast_engine = BatchingEngine(fast_model, max_batch_size=BATCH_SIZE, max_wait_ms=BATCH_WAIT_MS)
+cascade_stats = {'fast': 0, 'full': 0}
+
+# Prediction function (image path or file-like object)
 def prediction(image_path):
-    image = Image.open(image_path).convert("RGB")
-    image = image.resize((224, 224))
-    input_data = TF.to_tensor(image)
-    input_data = input_data.view((-1, 3, 224, 224))
-    output = model(input_data)
-    output = output.detach().numpy()
+    input_data = load_image_tensor(image_path)
+    output = engine.predict(input_data)
     index = np.argmax(output)
     return index
 
+# Results for previously seen images, keyed by content hash. Set
+# PREDICTION_CACHE_PATH to persist them, PERCEPTUAL_CACHE=1 to also match
+# re-encoded copies of a photo
+model_stat = os.stat(MODEL_PATH)
+cache = PredictionCache(
+    max_entries=int(os.environ.get('PREDICTION_CACHE_SIZE', 4096)),
+    path=os.environ.get('PREDICTION_CACHE_PATH'),
+    version=(f"{MODEL_VARIANT}-{model_stat.st_size:x}-{int(model_stat.st_mtime):x}-t{SOFTMAX_TEMPERATURE}"
+             + (f"-{os.path.basename(CASCADE_MODEL)}@{CASCADE_THRESHOLD}" if CASCADE_MODEL else ""))
+)
+PERCEPTUAL_CACHE = os.environ.get('PERCEPTUAL_CACHE', '0') == '1'
+
+def classify(data, input_data):
+    """Top-k result for one image, through the cascade when one is configured"""
+    stage = 'full'
+    if fast_engine is not None:
+        scores = top_k(fast_engine.predict(input_data), temperature=SOFTMAX_TEMPERATURE)
+        if scores[0][1] >= CASCADE_THRESHOLD:
+            stage = 'fast'
+        elif CASCADE_SIZE != IMAGE_SIZE:
+            input_data = load_image_tensor(io.BytesIO(data))
+    if stage == 'full':
+        scores = top_k(engine.predict(input_data), temperature=SOFTMAX_TEMPERATURE)
+    cascade_stats[stage] += 1
+    return {'index': scores[0][0], 'confidence': scores[0][1], 'top_k': scores, 'stage': stage}
+
+def predict_image(data):
+    """Class index, confidence and top-k probabilities for raw image bytes"""
+    key = content_key(data)
+    # With PERCEPTUAL_CACHE an exact miss is followed by a perceptual lookup,
+    # which records the hit or miss for this request
+    result = cache.get(key, count_miss=not PERCEPTUAL_CACHE)
+    if result is not None:
+        return result
+
+    # The first model to look at the image decides the size to decode at
+    size = CASCADE_SIZE if fast_engine is not None else IMAGE_SIZE
+    input_data = load_image_tensor(io.BytesIO(data), size=size)
+    similar_key = perceptual_key(input_data) if PERCEPTUAL_CACHE else None
+    result = cache.get(similar_key) if similar_key else None
+    if result is None:
+        result = classify(data, input_data)
+        if similar_key:
+            cache.put(similar_key, result)
+    cache.put(key, result)
+    return result
+
+# Raised by predict_image for uploads PIL cannot decode (not an image,
+# truncated, or too large)
+IMAGE_ERRORS = (UnidentifiedImageError, OSError, Image.DecompressionBombError)
+
 # Flask App
 app = Flask(__name__)
 UPLOAD_FOLDER = 'static/uploads'
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# Originals are archived in the background; set ARCHIVE_UPLOADS=0 to skip
+ARCHIVE_UPLOADS = os.environ.get('ARCHIVE_UPLOADS', '1') != '0'
+archiver = ThreadPoolExecutor(max_workers=1, thread_name_prefix='upload-archiver')
+
+def archive_upload(data, filename):
+    # Unique prefix so identical filenames from different uploads never collide
+    name = f"{uuid.uuid4().hex}_{secure_filename(filename) or 'upload'}"
+    with open(os.path.join(UPLOAD_FOLDER, name), 'wb') as f:
+        f.write(data)
+
 @app.route('/')
 def home_page():
     return render_template('home.html')
@@ -60,44 +158,78 @@ def submit():
         if image.filename == "":
             return "No image selected!", 400
         
-        filename = image.filename
-        file_path = os.path.join(UPLOAD_FOLDER, filename)
-        image.save(file_path)
-        
-        print(f"Uploaded File Saved at: {file_path}")  # Debugging print
+        # Decode straight from the request body, no disk round trip
+        data = image.read()
+        if ARCHIVE_UPLOADS:
+            archiver.submit(archive_upload, data, image.filename)
 
-        pred = prediction(file_path)
+        try:
+            result = predict_image(data)
+        except IMAGE_ERRORS:
+            return "Could not read the uploaded file as an image. Please upload a JPG or PNG photo.", 400
+        pred = result['index']
 
-        title = disease_info['disease_name'][pred]
-        description = disease_info['description'][pred]
-        prevent = disease_info['Possible Steps'][pred]
-        image_url = disease_info['image_url'][pred]
-        supplement_name = supplement_info['supplement name'][pred]
-        supplement_image_url = supplement_info['supplement image'][pred]
-        supplement_buy_link = supplement_info['buy link'][pred]
+        info = DISEASES[pred]
 
         return render_template('submit.html',
-                               title=title,
-                               desc=description,
-                               prevent=prevent,
-                               image_url=image_url,
+                               title=info.title,
+                               desc=info.description,
+                               prevent=info.prevent,
+                               image_url=info.image_url,
                                pred=pred,
-                               sname=supplement_name,
-                               simage=supplement_image_url,
-                               buy_link=supplement_buy_link)
+                               sname=info.supplement_name,
+                               simage=info.supplement_image,
+                               buy_link=info.buy_link,
+                               confidence=result['confidence'])
 
     # If GET request → Redirect user to upload page
     return redirect('/index')
 
+# The market page never changes while the app runs: render it on first
+# request, then serve the same bytes with an ETag
+market_page = None
+
 @app.route('/market', methods=['GET', 'POST'])
 def market():
-    return render_template(
-        'market.html',
-        supplement_image=list(supplement_info['supplement image']),
-        supplement_name=list(supplement_info['supplement name']),
-        disease=list(disease_info['disease_name']),
-        buy=list(supplement_info['buy link'])
+    global market_page
+    if market_page is None:
+        html = render_template('market.html', **MARKET_LISTING)
+        market_page = (html, hashlib.sha1(html.encode('utf-8')).hexdigest())
+
+    html, etag = market_page
+    response = make_response(html)
+    response.set_etag(etag)
+    return response.make_conditional(request)
+
+@app.route('/api/predict', methods=['POST'])
+def api_predict():
+    image = request.files.get('image')
+    if image is None or image.filename == "":
+        return jsonify(error="No image selected!"), 400
+
+    data = image.read()
+    if ARCHIVE_UPLOADS:
+        archiver.submit(archive_upload, data, image.filename)
+
+    try:
+        result = predict_image(data)
+    except IMAGE_ERRORS as e:
+        return jsonify(error=f"Could not decode image: {e}"), 400
+    return jsonify(
+        index=result['index'],
+        disease=CNN.idx_to_classes[result['index']],
+        confidence=result['confidence'],
+        stage=result['stage'],
+        top_k=[{'index': index, 'class': CNN.idx_to_classes[index], 'probability': probability}
+               for index, probability in result['top_k']]
     )
 
+@app.route('/cache-stats')
+def cache_stats():
+    stats = {'prediction_cache': cache.info(), 'inference': engine.info()}
+    if fast_engine is not None:
+        stats['cascade'] = dict(cascade_stats, threshold=CASCADE_THRESHOLD, fast_inference=fast_engine.info())
+    return jsonify(stats)
+
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,139 @@
+"""Classify every image under a folder tree in batches.
+
+    python classify_folder.py survey/ results.csv
+    python classify_folder.py survey/ results.parquet --workers 8 --variant int8
+
+Images are decoded by a multi-worker DataLoader and classified a batch at
+a time. Rows (path, class, confidence and the disease_info / supplement_info
+fields) are appended to a CSV checkpoint after every batch; re-running the
+same command skips images already in it, so an interrupted run resumes
+where it stopped. For a .parquet output the checkpoint is
+<output>.partial.csv and is converted once everything is done.
+"""
+import argparse
+import csv
+import os
+import time
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader, Dataset
+
+import CNN
+from disease_table import build_disease_table, read_info
+from export_model import IMAGE_EXTENSIONS, load_float_model, variant_path
+from inference import load_image_tensor, softmax
+
+FIELDS = ['path', 'class_index', 'class_name', 'confidence', 'title', 'description',
+          'prevent', 'image_url', 'supplement_name', 'supplement_image', 'buy_link']
+
+
+class ImageFolder(Dataset):
+    """Decodes images to (3, 224, 224) tensors; unreadable files yield None"""
+
+    def __init__(self, paths):
+        self.paths = paths
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, index):
+        path = self.paths[index]
+        try:
+            return load_image_tensor(path, reuse_buffer=False), path
+        except Exception as e:
+            print(f"Skipping {path}: {e}")
+            return None, path
+
+
+def collate(items):
+    images = [image for image, _ in items if image is not None]
+    paths = [path for image, path in items if image is not None]
+    return (torch.stack(images) if images else None), paths
+
+
+def find_images(root):
+    paths = []
+    for folder, _, files in os.walk(root):
+        paths.extend(os.path.join(folder, name) for name in sorted(files)
+                     if name.lower().endswith(IMAGE_EXTENSIONS))
+    return sorted(paths)
+
+
+def load_model(model_path, variant):
+    if variant == 'eager':
+        return load_float_model(model_path)
+    return torch.jit.load(variant_path(model_path, variant), map_location=torch.device('cpu')).eval()
+
+
+def completed_paths(checkpoint):
+    """Paths already classified by an earlier, interrupted run"""
+    if not os.path.exists(checkpoint):
+        return set()
+    with open(checkpoint, newline='', encoding='utf-8') as f:
+        return {row['path'] for row in csv.DictReader(f)}
+
+
+def classify(input_dir, output, model_path='plant_disease_model_1_latest.pt', variant='eager',
+             batch_size=32, workers=4, temperature=1.0):
+    parquet = output.endswith('.parquet')
+    checkpoint = output + '.partial.csv' if parquet else output
+
+    done = completed_paths(checkpoint)
+    paths = [path for path in find_images(input_dir) if path not in done]
+    print(f"{len(paths)} images to classify ({len(done)} already done)")
+
+    diseases = build_disease_table(*read_info())
+    model = load_model(model_path, variant)
+    loader = DataLoader(ImageFolder(paths), batch_size=batch_size, num_workers=workers,
+                        collate_fn=collate)
+
+    new_file = not os.path.exists(checkpoint)
+    processed = 0
+    started = time.perf_counter()
+    with open(checkpoint, 'a', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        if new_file:
+            writer.writerow(FIELDS)
+        for images, batch_paths in loader:
+            if images is None:
+                continue
+            with torch.inference_mode():
+                probs = softmax(model(images).numpy(), temperature)
+            for path, row in zip(batch_paths, probs):
+                index = int(np.argmax(row))
+                writer.writerow([path, index, CNN.idx_to_classes[index], round(float(row[index]), 6),
+                                 *diseases[index]])
+            f.flush()
+
+            processed += len(batch_paths)
+            rate = processed / (time.perf_counter() - started)
+            print(f"{processed}/{len(paths)} images, {rate:.1f} images/s")
+
+    if parquet:
+        import pandas as pd
+        pd.read_csv(checkpoint).to_parquet(output, index=False)
+        os.remove(checkpoint)
+    print(f"Results written to {output}")
+    return processed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('input_dir')
+    parser.add_argument('output', help='.csv or .parquet')
+    parser.add_argument('--model', default='plant_disease_model_1_latest.pt')
+    parser.add_argument('--variant', default='eager', choices=['eager', 'traced', 'int8'],
+                        help='serve an artifact written by export_model.py')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--workers', type=int, default=4, help='image decode processes')
+    parser.add_argument('--temperature', type=float, default=1.0,
+                        help='softmax temperature from export_model.py --calibrate')
+    args = parser.parse_args()
+
+    classify(args.input_dir, args.output, args.model, args.variant, args.batch_size,
+             args.workers, args.temperature)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+from collections import namedtuple
+
+import pandas as pd
+
+# Everything shown for one predicted class
+DiseaseRecord = namedtuple('DiseaseRecord', [
+    'title', 'description', 'prevent', 'image_url',
+    'supplement_name', 'supplement_image', 'buy_link',
+])
+
+
+def read_info(disease_csv='disease_info.csv', supplement_csv='supplement_info.csv'):
+    disease_info = pd.read_csv(disease_csv, encoding='cp1252')
+    supplement_info = pd.read_csv(supplement_csv, encoding='cp1252')
+    return disease_info, supplement_info
+
+
+def build_disease_table(disease_info, supplement_info):
+    """Immutable records indexed by class id (row order, as CNN.idx_to_classes)"""
+    columns = zip(
+        disease_info['disease_name'], disease_info['description'],
+        disease_info['Possible Steps'], disease_info['image_url'],
+        supplement_info['supplement name'], supplement_info['supplement image'],
+        supplement_info['buy link'],
+    )
+    return tuple(DiseaseRecord(*row) for row in columns)
+
+
+def build_market_listing(disease_info, supplement_info):
+    """Template context for the /market page"""
+    return {
+        'supplement_image': tuple(supplement_info['supplement image']),
+        'supplement_name': tuple(supplement_info['supplement name']),
+        'disease': tuple(disease_info['disease_name']),
+        'buy': tuple(supplement_info['buy link']),
+    }
@@ -0,0 +1,241 @@
+"""Export optimized variants of the disease CNN for CPU serving.
+
+    python export_model.py                       # write the .traced.pt / .int8.pt artifacts
+    python export_model.py --eval-dir ../test_images
+
+Both variants have BatchNorm folded and are saved as TorchScript, so they
+load with torch.jit.load and no CNN.py; ".int8" additionally stores the
+Linear layers (the 50176x1024 one is ~95% of the weights) as dynamically
+quantized int8. Select one in app.py with MODEL_VARIANT=traced|int8.
+
+`--eval-dir` compares every variant with the float model on a folder of
+images: top-1 agreement, accuracy when sub-folder names are class names
+from CNN.idx_to_classes, max logit difference and per-image latency.
+With labelled images, `--calibrate` also fits the SOFTMAX_TEMPERATURE for
+app.py, and `--cascade-model` reports how a cascade with that first stage
+(CASCADE_MODEL / CASCADE_SIZE / CASCADE_THRESHOLD) would trade compute
+for accuracy.
+"""
+import argparse
+import copy
+import os
+import time
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+import CNN
+from inference import IMAGE_SIZE, load_image_tensor, softmax
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+
+class ChannelBias(nn.Module):
+    """Per-channel shift left over from a BatchNorm whose scale was folded away"""
+
+    def __init__(self, bias):
+        super().__init__()
+        self.register_buffer('bias', bias.view(1, -1, 1, 1))
+
+    def forward(self, x):
+        return x + self.bias
+
+
+def variant_path(model_path, variant):
+    """plant_disease_model_1_latest.pt -> plant_disease_model_1_latest.<variant>.pt"""
+    stem, ext = os.path.splitext(model_path)
+    return f"{stem}.{variant}{ext}"
+
+
+def load_float_model(model_path, num_classes=39):
+    model = CNN.CNN(num_classes)
+    model.load_state_dict(torch.load(model_path, map_location=torch.device('cpu')))
+    return model.eval()
+
+
+@torch.no_grad()
+def fold_batchnorm(model):
+    """Copy of `model` with every Conv -> ReLU -> BatchNorm block folded.
+
+    The network normalizes *after* the ReLU, so BN(relu(conv(x))) is
+    rewritten as relu(conv'(x)) + t, with conv' = conv scaled by the BN
+    scale s (exact because relu(s*z) = s*relu(z) for s > 0). The shift t is
+    kept as a ChannelBias, except after the last block, where it passes
+    through MaxPool unchanged and is folded into the first Linear layer.
+    Blocks with a non-positive scale are left as they are.
+    """
+    model = copy.deepcopy(model).eval()
+    layers = model.conv_layers
+
+    for i in range(2, len(layers)):
+        bn, relu, conv = layers[i], layers[i - 1], layers[i - 2]
+        if not (isinstance(bn, nn.BatchNorm2d) and isinstance(relu, nn.ReLU)
+                and isinstance(conv, nn.Conv2d)):
+            continue
+        scale = bn.weight / torch.sqrt(bn.running_var + bn.eps)
+        if not bool((scale > 0).all()):
+            continue
+        shift = bn.bias - bn.running_mean * scale
+        conv.weight.mul_(scale.view(-1, 1, 1, 1))
+        if conv.bias is not None:
+            conv.bias.mul_(scale)
+        layers[i] = ChannelBias(shift)
+
+    # A trailing ChannelBias (+ MaxPool) feeds the flatten, so its shift can
+    # move into the first Linear: W (x + t) + b = W x + (b + W t)
+    tail = list(layers)
+    last = len(tail) - 1
+    while last >= 0 and isinstance(tail[last], nn.MaxPool2d):
+        last -= 1
+    if last >= 0 and isinstance(tail[last], ChannelBias):
+        linear = next(m for m in model.dense_layers if isinstance(m, nn.Linear))
+        shift = tail[last].bias.flatten()
+        repeat = linear.in_features // shift.numel()
+        linear.bias.add_(linear.weight @ shift.repeat_interleave(repeat))
+        layers[last] = nn.Identity()
+
+    return model
+
+
+def quantize(model):
+    """Dynamically quantize the Linear layers to int8"""
+    return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+
+def trace(model):
+    """Traced and frozen TorchScript module"""
+    example = torch.rand(1, 3, IMAGE_SIZE, IMAGE_SIZE)
+    with torch.inference_mode():
+        return torch.jit.freeze(torch.jit.trace(model, example).eval())
+
+
+def export(model_path):
+    """Write the traced and int8 variants next to `model_path`"""
+    folded = fold_batchnorm(load_float_model(model_path))
+    paths = {}
+    for variant, module in (('traced', folded), ('int8', quantize(folded))):
+        paths[variant] = variant_path(model_path, variant)
+        torch.jit.save(trace(module), paths[variant])
+        size_mb = os.path.getsize(paths[variant]) / 2**20
+        print(f"{variant:>7}: {paths[variant]} ({size_mb:.1f} MB)")
+    return paths
+
+
+def list_images(folder):
+    """(path, class index or None) for every image under `folder`"""
+    class_ids = {name: index for index, name in CNN.idx_to_classes.items()}
+    images = []
+    for root, _, files in os.walk(folder):
+        label = class_ids.get(os.path.basename(root))
+        for name in sorted(files):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                images.append((os.path.join(root, name), label))
+    return images
+
+
+def run_model(model, inputs, batch_size=16):
+    """Logits for every input, and the mean latency in ms per image"""
+    outputs = []
+    started = time.perf_counter()
+    with torch.inference_mode():
+        for lo in range(0, len(inputs), batch_size):
+            outputs.append(model(inputs[lo:lo + batch_size]))
+    elapsed = time.perf_counter() - started
+    return torch.cat(outputs).numpy(), elapsed / len(inputs) * 1000
+
+
+def fit_temperature(logits, labels):
+    """Softmax temperature minimizing the negative log-likelihood of `labels`"""
+    temperatures = np.geomspace(0.05, 20, 200)
+    rows = np.arange(len(labels))
+    nll = [-np.log(softmax(logits, t)[rows, labels] + 1e-12).mean() for t in temperatures]
+    return float(temperatures[int(np.argmin(nll))])
+
+
+def evaluate(model_path, folder, batch_size=16, calibrate=False, cascade_model=None,
+             cascade_size=IMAGE_SIZE, threshold=0.9, temperature=1.0):
+    """Compare the float model with every exported variant on `folder`"""
+    images = list_images(folder)
+    if not images:
+        print(f"No images found under {folder}")
+        return {}
+
+    models = {'float': load_float_model(model_path)}
+    for variant in ('traced', 'int8'):
+        path = variant_path(model_path, variant)
+        if os.path.exists(path):
+            models[variant] = torch.jit.load(path).eval()
+
+    inputs = torch.stack([load_image_tensor(path, reuse_buffer=False) for path, _ in images])
+    labels = np.array([-1 if label is None else label for _, label in images])
+    labelled = labels >= 0
+
+    def accuracy(predicted):
+        return float((predicted[labelled] == labels[labelled]).mean()) if labelled.any() else None
+
+    logits, latency_ms = {}, {}
+    for name, model in models.items():
+        logits[name], latency_ms[name] = run_model(model, inputs, batch_size)
+
+    reference = logits['float'].argmax(axis=1)
+    report = {}
+    for name in models:
+        predicted = logits[name].argmax(axis=1)
+        report[name] = {
+            'agreement': float((predicted == reference).mean()),
+            'accuracy': accuracy(predicted),
+            'max_logit_diff': float(np.abs(logits[name] - logits['float']).max()),
+            'ms_per_image': round(latency_ms[name], 2),
+        }
+        print(f"{name:>7}: {report[name]}")
+
+    if calibrate:
+        if labelled.any():
+            temperature = fit_temperature(logits['float'][labelled], labels[labelled])
+            report['temperature'] = temperature
+            print(f"SOFTMAX_TEMPERATURE={temperature:.3f}")
+        else:
+            print("Calibration needs class-named sub-folders; keeping temperature 1.0")
+
+    if cascade_model:
+        if cascade_size == IMAGE_SIZE:
+            small = inputs
+        else:
+            small = torch.stack([load_image_tensor(path, size=cascade_size, reuse_buffer=False)
+                                 for path, _ in images])
+        fast_logits, fast_ms = run_model(torch.jit.load(cascade_model).eval(), small, batch_size)
+        probs = softmax(fast_logits, temperature)
+        early = probs.max(axis=1) >= threshold
+        predicted = np.where(early, probs.argmax(axis=1), reference)
+        report['cascade'] = {
+            'threshold': threshold,
+            'early_exit_rate': float(early.mean()),
+            'agreement': float((predicted == reference).mean()),
+            'accuracy': accuracy(predicted),
+            'ms_per_image': round(float(fast_ms + (1 - early.mean()) * latency_ms['float']), 2),
+        }
+        print(f"cascade: {report['cascade']}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--model', default='plant_disease_model_1_latest.pt')
+    parser.add_argument('--eval-dir', help='folder of held-out images to compare variants on')
+    parser.add_argument('--skip-export', action='store_true', help='only run the comparison')
+    parser.add_argument('--calibrate', action='store_true', help='fit the softmax temperature')
+    parser.add_argument('--cascade-model', help='TorchScript first stage to evaluate a cascade with')
+    parser.add_argument('--cascade-size', type=int, default=IMAGE_SIZE)
+    parser.add_argument('--threshold', type=float, default=0.9)
+    args = parser.parse_args()
+
+    if not args.skip_export:
+        export(args.model)
+    if args.eval_dir:
+        evaluate(args.model, args.eval_dir, calibrate=args.calibrate, cascade_model=args.cascade_model,
+                 cascade_size=args.cascade_size, threshold=args.threshold)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+import torch
+from PIL import Image
+
+IMAGE_SIZE = 224
+
+# Preallocated input tensors per request thread, one per image size
+_buffers = threading.local()
+
+
+def load_image_tensor(source, size=IMAGE_SIZE, reuse_buffer=True):
+    """Decode an image (path or file-like) into a (3, size, size) float tensor.
+
+    JPEGs are decoded in draft mode, letting libjpeg downscale by a power of
+    two while decoding. With `reuse_buffer` the result is written into this
+    thread's preallocated tensor, which stays valid until the thread's next
+    call, so it must be consumed (e.g. by BatchingEngine.predict) first.
+    """
+    image = Image.open(source)
+    image.draft('RGB', (size, size))
+    image = image.convert('RGB').resize((size, size))
+    pixels = torch.from_numpy(np.array(image)).permute(2, 0, 1)
+
+    if reuse_buffer:
+        tensors = _buffers.__dict__.setdefault('tensors', {})
+        out = tensors.get(size)
+        if out is None:
+            out = tensors[size] = torch.empty((3, size, size), dtype=torch.float32)
+    else:
+        out = torch.empty((3, size, size), dtype=torch.float32)
+    # uint8 -> float in [0, 1], the same values TF.to_tensor produces
+    return torch.div(pixels, 255, out=out)
+
+
+def softmax(logits, temperature=1.0):
+    """Temperature-scaled softmax over the last axis"""
+    logits = np.asarray(logits, dtype=np.float64) / temperature
+    probs = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    return probs / probs.sum(axis=-1, keepdims=True)
+
+
+def top_k(logits, k=5, temperature=1.0):
+    """The k most likely [class, probability] pairs for one row of logits.
+
+    `temperature` comes from export_model.py --calibrate; 1.0 is the raw
+    softmax.
+    """
+    probs = softmax(logits, temperature)
+    best = np.argsort(probs)[::-1][:k]
+    return [[int(i), round(float(probs[i]), 6)] for i in best]
+
+
+class BatchingEngine:
+    """Dynamic micro-batching in front of the CNN.
+
+    Request threads submit preprocessed (3, H, W) tensors and wait on a
+    future. A single worker thread collects up to `max_batch_size` images,
+    or whatever arrived within `max_wait_ms` of the first one, and runs
+    them through the model in one inference-mode forward pass.
+    """
+
+    def __init__(self, model, max_batch_size=16, max_wait_ms=5, num_threads=None):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        if num_threads:
+            torch.set_num_threads(num_threads)
+
+        self.requests = queue.Queue()
+        self.stats = {'images': 0, 'batches': 0, 'largest_batch': 0}
+        self._worker = threading.Thread(target=self._run, name='cnn-batcher', daemon=True)
+        self._worker.start()
+
+    def submit(self, image_tensor):
+        """Queue one (3, H, W) tensor; the future resolves to its logits"""
+        future = Future()
+        self.requests.put((image_tensor, future))
+        return future
+
+    def predict(self, image_tensor, timeout=None):
+        """Logits (NumPy, one row per class) for a single image"""
+        return self.submit(image_tensor).result(timeout)
+
+    def _collect(self):
+        """Block for the first request, then gather more until full or timed out"""
+        batch = [self.requests.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self.requests.get(timeout=remaining) if remaining > 0 else self.requests.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            futures = [future for _, future in batch]
+            try:
+                inputs = torch.stack([tensor for tensor, _ in batch])
+                with torch.inference_mode():
+                    outputs = self.model(inputs).numpy()
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+
+            for future, output in zip(futures, outputs):
+                future.set_result(output)
+            self.stats['images'] += len(batch)
+            self.stats['batches'] += 1
+            self.stats['largest_batch'] = max(self.stats['largest_batch'], len(batch))
+
+    def info(self):
+        batches = self.stats['batches']
+        return dict(self.stats, mean_batch=round(self.stats['images'] / batches, 2) if batches else None)
@@ -0,0 +1,94 @@
+import hashlib
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import torch.nn.functional as F
+
+
+def content_key(data):
+    """Hash of the uploaded bytes; identical files share an entry"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def perceptual_key(image_tensor):
+    """64-bit difference hash of a (3, H, W) image tensor.
+
+    Re-encoded or slightly recompressed copies of a photo usually share a
+    dHash, so they can reuse its prediction.
+    """
+    gray = image_tensor.mean(dim=0)[None, None]
+    small = F.interpolate(gray, size=(8, 9), mode='area')[0, 0]
+    bits = (small[:, 1:] > small[:, :-1]).flatten().tolist()
+    return 'p' + format(sum(bit << i for i, bit in enumerate(bits)), '016x')
+
+
+class PredictionCache:
+    """Thread-safe LRU of prediction results, optionally backed by SQLite.
+
+    Keys are prefixed with `version` (e.g. a fingerprint of the model file)
+    so results persisted by an older model are never served.
+    """
+
+    def __init__(self, max_entries=4096, path=None, version=''):
+        self.max_entries = max_entries
+        self.version = version
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+
+        self.db = None
+        if path:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute('CREATE TABLE IF NOT EXISTS predictions (key TEXT PRIMARY KEY, result TEXT)')
+            self.db.commit()
+
+    def get(self, key, count_miss=True):
+        """Cached result for `key`, or None.
+
+        Pass count_miss=False for a first probe that another get() will
+        follow on a miss, so each request counts as one lookup.
+        """
+        key = f"{self.version}:{key}"
+        with self.lock:
+            result = self.entries.get(key)
+            if result is not None:
+                self.entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return result
+
+            if self.db is not None:
+                row = self.db.execute('SELECT result FROM predictions WHERE key = ?', (key,)).fetchone()
+                if row is not None:
+                    result = json.loads(row[0])
+                    self._remember(key, result)
+                    self.stats['disk_hits'] += 1
+                    return result
+
+            if count_miss:
+                self.stats['misses'] += 1
+            return None
+
+    def put(self, key, result):
+        key = f"{self.version}:{key}"
+        with self.lock:
+            self._remember(key, result)
+            if self.db is not None:
+                self.db.execute('INSERT OR REPLACE INTO predictions VALUES (?, ?)', (key, json.dumps(result)))
+                self.db.commit()
+
+    def _remember(self, key, result):
+        self.entries[key] = result
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def info(self):
+        with self.lock:
+            lookups = self.stats['hits'] + self.stats['disk_hits'] + self.stats['misses']
+            return dict(self.stats,
+                        entries=len(self.entries),
+                        persistent=self.db is not None,
+                        hit_rate=round((lookups - self.stats['misses']) / lookups, 3) if lookups else None)
@@ -1,9 +1,21 @@
 import os
+import threading
 import streamlit as st
-from rag_pipeline import predict_disease
+from rag_pipeline import predict_disease_stream, warm_up
 
 st.set_page_config(page_title="Plant Disease RAG", page_icon="🌱")
 
+
+@st.cache_resource
+def start_warm_up():
+    """Load the models in the background once per process, while the form renders"""
+    thread = threading.Thread(target=warm_up, daemon=True)
+    thread.start()
+    return thread
+
+
+start_warm_up()
+
 st.title("🌱 Plant Disease Prediction (RAG)")
 
 crop = st.text_input("Enter crop name")
@@ -11,9 +23,8 @@ symptoms = st.text_area("Describe symptoms")
 
 if st.button("Predict Disease"):
     if crop and symptoms:
-        with st.spinner("Analyzing..."):
-            result = predict_disease(crop, symptoms)
         st.success("Prediction Result")
-        st.write(result)
+        # Tokens render as the LLM produces them
+        st.write_stream(predict_disease_stream(crop, symptoms))
     else:
         st.warning("Please enter both crop name and symptoms.")
@@ -0,0 +1,123 @@
+"""Recall / latency / memory of each FAISS index type against the flat index.
+
+    python benchmark_index.py                      # hold out 200 documents as queries
+    python benchmark_index.py --queries queries.txt
+
+Vectors come from ingest.py's embedding cache, so run ingest.py first.
+By default a random sample of documents is held out of the database and
+their embeddings used as queries; with --queries, each line is encoded as
+"<crop> plant with <symptoms>" text. Recall@k is measured against exact
+search over the same database.
+"""
+import argparse
+import time
+
+import faiss
+import numpy as np
+
+from docstore import DocumentStore
+from indexes import DEFAULT_PARAMS, build_index, tune_index
+from ingest import CACHE_PATH, FIELDS, MODEL_NAME, STORE_PATH, EmbeddingCache
+
+SWEEPS = {
+    "flat": [{}],
+    "ivf-flat": [{"nprobe": n} for n in (1, 4, 16, 64)],
+    "ivf-pq": [{"nprobe": n} for n in (1, 4, 16, 64)],
+    "hnsw": [{"ef_search": ef} for ef in (16, 64, 256)],
+}
+
+
+def load_vectors(store_path=STORE_PATH, cache_path=CACHE_PATH):
+    store = DocumentStore(store_path)
+    if store.fields != tuple(FIELDS):
+        raise SystemExit(f"{store_path} predates incremental ingest; run ingest.py first")
+    ids = store.ids.tolist()
+    cache = EmbeddingCache(cache_path)
+    cached = cache.get_many(ids)
+    cache.close()
+    ids = [i for i in ids if i in cached]
+    return np.array(ids, dtype="int64"), np.stack([cached[i] for i in ids])
+
+
+def search_timed(index, queries, k):
+    """Results and per-query latencies (ms), one query at a time like the app"""
+    results = np.empty((len(queries), k), dtype="int64")
+    latencies = np.empty(len(queries))
+    for n, query in enumerate(queries):
+        started = time.perf_counter()
+        _, found = index.search(query[None], k)
+        latencies[n] = (time.perf_counter() - started) * 1000
+        results[n] = found[0]
+    return results, latencies
+
+
+def recall(found, truth):
+    return float(np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)]))
+
+
+def benchmark(ids, vectors, queries, k=3, params=None):
+    truth_index = build_index("flat", vectors)
+    truth_index.add_with_ids(vectors, ids)
+    _, truth = truth_index.search(queries, k)
+
+    rows = []
+    for kind, sweep in SWEEPS.items():
+        started = time.perf_counter()
+        index = build_index(kind, vectors, params)
+        index.add_with_ids(vectors, ids)
+        build_s = time.perf_counter() - started
+        size_mb = len(faiss.serialize_index(index)) / 2**20
+
+        for settings in sweep:
+            tune_index(index, **settings)
+            found, latencies = search_timed(index, queries, k)
+            rows.append({
+                "index": kind,
+                "settings": " ".join(f"{key}={value}" for key, value in settings.items()) or "-",
+                f"recall@{k}": round(recall(found, truth), 4),
+                "mean_ms": round(float(latencies.mean()), 4),
+                "p95_ms": round(float(np.percentile(latencies, 95)), 4),
+                "build_s": round(build_s, 2),
+                "size_mb": round(size_mb, 2),
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", help="file with one '<crop>|<symptoms>' query per line")
+    parser.add_argument("--num-queries", type=int, default=200, help="documents to hold out")
+    parser.add_argument("-k", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    for name, default in DEFAULT_PARAMS.items():
+        parser.add_argument("--" + name.replace("_", "-"), type=int, default=default)
+    args = parser.parse_args()
+    params = {name: getattr(args, name) for name in DEFAULT_PARAMS}
+
+    ids, vectors = load_vectors()
+    if args.queries:
+        from sentence_transformers import SentenceTransformer
+        texts = []
+        with open(args.queries, encoding="utf-8") as f:
+            for line in f:
+                crop, _, symptoms = line.strip().partition("|")
+                if crop:
+                    texts.append(f"{crop} plant with {symptoms}" if symptoms else crop)
+        queries = SentenceTransformer(MODEL_NAME).encode(texts).astype("float32")
+    else:
+        held_out = np.random.default_rng(args.seed).permutation(len(ids))[:min(args.num_queries, len(ids) // 5)]
+        keep = np.ones(len(ids), dtype=bool)
+        keep[held_out] = False
+        queries, ids, vectors = vectors[held_out], ids[keep], vectors[keep]
+
+    print(f"{len(vectors)} database vectors, {len(queries)} queries, k={args.k}")
+    rows = benchmark(ids, vectors, np.ascontiguousarray(queries), args.k, params)
+    columns = list(rows[0])
+    widths = [max(len(column), *(len(str(row[column])) for row in rows)) for column in columns]
+    print("  ".join(column.ljust(width) for column, width in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(str(row[column]).ljust(width) for column, width in zip(columns, widths)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+from lexical import tokenize
+
+CONTEXT_TOKENS = 1024
+# Near-duplicate chunks share at least this fraction of their terms
+DUPLICATE_OVERLAP = 0.9
+
+
+def estimate_tokens(text):
+    """Rough LLM token count (~4 characters per token for English)"""
+    return max(1, len(text) // 4)
+
+
+def trim(text, tokens):
+    """Cut `text` to about `tokens` tokens at a word boundary"""
+    limit = tokens * 4
+    if len(text) <= limit:
+        return text
+    cut = text[:limit].rsplit(" ", 1)[0]
+    return cut.rstrip(" ,;:") + " …"
+
+
+def deduplicate(chunks):
+    """Drop repeated and near-duplicate chunks, keeping the first (best ranked)"""
+    kept, seen = [], []
+    for chunk in chunks:
+        terms = set(tokenize(chunk))
+        if not terms:
+            continue
+        if any(len(terms & other) / len(terms | other) >= DUPLICATE_OVERLAP for other in seen):
+            continue
+        kept.append(chunk)
+        seen.append(terms)
+    return kept
+
+
+def assemble_context(chunks, budget=CONTEXT_TOKENS):
+    """Numbered context lines from ranked chunks, within `budget` tokens.
+
+    Chunks keep retrieval order so the most relevant come first; once the
+    budget runs low the next chunk is trimmed and the rest are dropped.
+    """
+    lines, used = [], 0
+    for n, chunk in enumerate(deduplicate(chunks), 1):
+        prefix = f"[{n}] "
+        remaining = budget - used - estimate_tokens(prefix)
+        if remaining < 8:
+            break
+        line = prefix + trim(" ".join(chunk.split()), remaining)
+        lines.append(line)
+        used += estimate_tokens(line)
+    return "\n".join(lines)
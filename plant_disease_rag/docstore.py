@@ -0,0 +1,186 @@
+"""Memory-mapped document store keyed by FAISS id.
+
+One file holds a small JSON header, a sorted int64 id array, an
+(n, fields + 1) int64 offset table and the concatenated UTF-8 field
+values. Opening it maps the file instead of reading it, so load time does
+not grow with the corpus and worker processes share the same pages.
+
+    python docstore.py metadata.pkl documents.store   # convert an old pickle
+"""
+import json
+import os
+import pickle
+import shutil
+import struct
+import sys
+from array import array
+
+import numpy as np
+
+MAGIC = b"PDDOCS1\0"
+ALIGN = 8
+
+
+def _pad(f):
+    f.write(b"\0" * (-f.tell() % ALIGN))
+
+
+class DocumentStore:
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a document store")
+            (header_size,) = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(header_size))
+
+        self.fields = tuple(header["fields"])
+        count = header["count"]
+        self.ids = np.memmap(path, dtype="<i8", mode="r", offset=header["ids_offset"], shape=(count,)) \
+            if count else np.empty(0, dtype="<i8")
+        self.offsets = np.memmap(path, dtype="<i8", mode="r", offset=header["offsets_offset"],
+                                 shape=(count, len(self.fields) + 1)) \
+            if count else np.zeros((0, len(self.fields) + 1), dtype="<i8")
+        blob_size = header["blob_size"]
+        self.blob = np.memmap(path, dtype="u1", mode="r", offset=header["blob_offset"], shape=(blob_size,)) \
+            if blob_size else np.empty(0, dtype="u1")
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _row(self, doc_id):
+        row = int(np.searchsorted(self.ids, doc_id))
+        if row < len(self.ids) and self.ids[row] == doc_id:
+            return row
+        return None
+
+    def __contains__(self, doc_id):
+        return self._row(doc_id) is not None
+
+    def values(self, doc_id):
+        """Field values of one document as a tuple, or None if unknown"""
+        row = self._row(doc_id)
+        if row is None:
+            return None
+        return self._values_at(row)
+
+    def _values_at(self, row):
+        bounds = self.offsets[row].tolist()
+        data = self.blob[bounds[0]:bounds[-1]].tobytes()
+        start = bounds[0]
+        return tuple(data[lo - start:hi - start].decode("utf-8") for lo, hi in zip(bounds, bounds[1:]))
+
+    def get(self, doc_id):
+        """One document as {field: value}, or None if unknown"""
+        values = self.values(doc_id)
+        return dict(zip(self.fields, values)) if values is not None else None
+
+    def text(self, doc_id):
+        """All fields joined by spaces, the form that was embedded"""
+        values = self.values(doc_id)
+        return " ".join(values) if values is not None else None
+
+    def items(self, start=0, stop=None):
+        """(id, values) pairs of rows start:stop, in id order"""
+        for row in range(start, len(self.ids) if stop is None else min(stop, len(self.ids))):
+            yield int(self.ids[row]), self._values_at(row)
+
+    @staticmethod
+    def write(path, fields, items):
+        """Write {id: values tuple} (or (id, values) pairs) to `path` atomically"""
+        writer = DocumentWriter(path, fields)
+        for doc_id, values in (items.items() if isinstance(items, dict) else items):
+            writer.add(doc_id, values)
+        os.replace(writer.finish().path, path)
+
+
+class DocumentWriter:
+    """Builds a store incrementally without holding the documents in memory.
+
+    Field values are appended to a scratch file in batches as documents are
+    added; only ids and offsets stay in memory. finish() sorts those by id,
+    writes `path` + ".tmp" and returns it opened, ready to os.replace.
+    """
+
+    def __init__(self, path, fields, buffer_bytes=1 << 20):
+        self.path = path
+        self.fields = tuple(fields)
+        self.buffer_bytes = buffer_bytes
+        self.blob_path = path + ".blob.tmp"
+        self.blob = open(self.blob_path, "wb")
+        self.ids = array("q")
+        self.offsets = array("q")
+        self.buffer = []
+        self.buffered = 0
+        self.position = 0
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, doc_id, values):
+        start = self.position
+        self.ids.append(doc_id)
+        self.offsets.append(start)
+        for value in values:
+            encoded = str(value).encode("utf-8")
+            self.buffer.append(encoded)
+            self.position += len(encoded)
+            self.offsets.append(self.position)
+        self.buffered += self.position - start
+        if self.buffered >= self.buffer_bytes:
+            self._flush()
+
+    def _flush(self):
+        self.blob.write(b"".join(self.buffer))
+        self.buffer.clear()
+        self.buffered = 0
+
+    def finish(self):
+        self._flush()
+        self.blob.close()
+        ids = np.frombuffer(self.ids, dtype="<i8") if self.ids else np.empty(0, dtype="<i8")
+        offsets = np.frombuffer(self.offsets, dtype="<i8").reshape(len(ids), len(self.fields) + 1) \
+            if self.ids else np.zeros((0, len(self.fields) + 1), dtype="<i8")
+        # Rows are looked up by binary search over ids; values stay in arrival order
+        order = np.argsort(ids, kind="stable")
+
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            header_size = 256
+            f.write(MAGIC + struct.pack("<Q", header_size) + b" " * header_size)
+            _pad(f)
+            ids_offset = f.tell()
+            f.write(ids[order].tobytes())
+            _pad(f)
+            offsets_offset = f.tell()
+            f.write(offsets[order].tobytes())
+            _pad(f)
+            blob_offset = f.tell()
+            with open(self.blob_path, "rb") as blob:
+                shutil.copyfileobj(blob, f)
+
+            header = json.dumps({
+                "fields": list(self.fields), "count": len(ids), "ids_offset": ids_offset,
+                "offsets_offset": offsets_offset, "blob_offset": blob_offset, "blob_size": self.position,
+            }).encode("utf-8")
+            if len(header) > header_size:
+                raise ValueError("document store header overflow")
+            f.seek(len(MAGIC) + 8)
+            f.write(header.ljust(header_size))
+        os.remove(self.blob_path)
+        return DocumentStore(tmp_path)
+
+
+def convert_pickle(pickle_path, store_path):
+    """Convert an old metadata.pkl (list by position, or {id: text}) to a store"""
+    with open(pickle_path, "rb") as f:
+        documents = pickle.load(f)
+    if isinstance(documents, list):
+        documents = dict(enumerate(documents))
+    DocumentStore.write(store_path, ["text"], {i: (text,) for i, text in documents.items()})
+    return len(documents)
+
+
+if __name__ == "__main__":
+    source, target = (sys.argv[1:3] + ["metadata.pkl", "documents.store"][len(sys.argv[1:3]):])
+    print(f"✅ Converted {convert_pickle(source, target)} documents to {target}")
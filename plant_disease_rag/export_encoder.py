@@ -0,0 +1,154 @@
+"""Export the MiniLM query encoder to ONNX (float and dynamic int8).
+
+    python export_encoder.py               # writes encoder_onnx/
+    RAG_ENCODER=int8 streamlit run app.py
+
+The transformer is exported on its own; tokenization, pooling and
+normalization are redone in NumPy by OnnxEncoder so the app does not need
+torch at query time. The export prints how closely each variant's
+embeddings match sentence-transformers and its single-query latency.
+Keep building the index with ingest.py (float embeddings); the "min
+cosine" column shows how far int8 query vectors drift from them.
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+ONNX_DIR = "encoder_onnx"
+VARIANTS = {"onnx": "model.onnx", "int8": "model.int8.onnx"}
+SAMPLE_QUERIES = [
+    "Tomato plant with yellow leaves and dark concentric spots",
+    "Potato plant with black lesions on stems",
+    "Rice plant with diamond shaped grey spots",
+    "Wheat plant with orange pustules on leaves",
+    "Grape plant with white powder on leaves",
+]
+
+
+def encoder_path(variant, directory=ONNX_DIR):
+    if variant not in VARIANTS:
+        raise ValueError(f"Unknown encoder variant {variant!r}; choose torch, {', '.join(VARIANTS)}")
+    return os.path.join(directory, VARIANTS[variant])
+
+
+class OnnxEncoder:
+    """Drop-in for SentenceTransformer.encode backed by onnxruntime"""
+
+    def __init__(self, path, threads=None):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        directory = os.path.dirname(path)
+        with open(os.path.join(directory, "pooling.json")) as f:
+            self.config = json.load(f)
+        self.tokenizer = AutoTokenizer.from_pretrained(directory)
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+    def get_sentence_embedding_dimension(self):
+        return self.config["dimension"]
+
+    def encode(self, sentences, batch_size=32, convert_to_numpy=True, **kwargs):
+        single = isinstance(sentences, str)
+        sentences = [sentences] if single else list(sentences)
+        batches = [np.empty((0, self.config["dimension"]), dtype="float32")]
+        for lo in range(0, len(sentences), batch_size):
+            tokens = self.tokenizer(sentences[lo:lo + batch_size], padding=True, truncation=True,
+                                    max_length=self.config["max_seq_length"], return_tensors="np")
+            mask = tokens["attention_mask"].astype("int64")
+            hidden = self.session.run(None, {"input_ids": tokens["input_ids"].astype("int64"),
+                                             "attention_mask": mask})[0]
+            if self.config["pooling"] == "cls":
+                pooled = hidden[:, 0]
+            else:
+                pooled = (hidden * mask[..., None]).sum(axis=1) / np.maximum(mask.sum(axis=1, keepdims=True), 1)
+            if self.config["normalize"]:
+                pooled = pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+            batches.append(pooled.astype("float32"))
+        embeddings = np.concatenate(batches)
+        return embeddings[0] if single else embeddings
+
+
+def export(model_name=MODEL_NAME, directory=ONNX_DIR):
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Normalize, Pooling
+
+    model = SentenceTransformer(model_name, device="cpu")
+    transformer = model[0]
+    pooling = next(module for module in model if isinstance(module, Pooling))
+    # sentence-transformers < 6 only has get_pooling_mode_str()
+    mode = pooling.get_pooling_mode_str() if hasattr(pooling, "get_pooling_mode_str") else pooling.pooling_mode
+    if mode not in ("mean", "cls"):
+        raise ValueError(f"Unsupported pooling mode {mode!r}")
+
+    os.makedirs(directory, exist_ok=True)
+    transformer.tokenizer.save_pretrained(directory)
+    with open(os.path.join(directory, "pooling.json"), "w") as f:
+        json.dump({"model": model_name, "pooling": mode,
+                   "normalize": any(isinstance(module, Normalize) for module in model),
+                   "max_seq_length": model.max_seq_length,
+                   "dimension": model.get_sentence_embedding_dimension()}, f, indent=2)
+
+    class HiddenStates(torch.nn.Module):
+        def __init__(self, auto_model):
+            super().__init__()
+            self.auto_model = auto_model
+
+        def forward(self, input_ids, attention_mask):
+            return self.auto_model(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+
+    sample = transformer.tokenizer(SAMPLE_QUERIES[:2], padding=True, return_tensors="pt")
+    dynamic = {0: "batch", 1: "tokens"}
+    torch.onnx.export(HiddenStates(transformer.auto_model.eval()),
+                      (sample["input_ids"], sample["attention_mask"]), encoder_path("onnx", directory),
+                      input_names=["input_ids", "attention_mask"], output_names=["last_hidden_state"],
+                      dynamic_axes={"input_ids": dynamic, "attention_mask": dynamic, "last_hidden_state": dynamic},
+                      opset_version=17, dynamo=False)
+    quantize_dynamic(encoder_path("onnx", directory), encoder_path("int8", directory),
+                     weight_type=QuantType.QInt8)
+    return model
+
+
+def compare(reference, directory=ONNX_DIR, repeats=50):
+    """Cosine agreement with the reference encoder and single-query latency"""
+    encoders = {"torch": reference, **{variant: OnnxEncoder(encoder_path(variant, directory))
+                                       for variant in VARIANTS}}
+    expected = reference.encode(SAMPLE_QUERIES, convert_to_numpy=True)
+    expected = expected / np.linalg.norm(expected, axis=1, keepdims=True)
+    rows = []
+    for variant, encoder in encoders.items():
+        got = encoder.encode(SAMPLE_QUERIES)
+        got = got / np.linalg.norm(got, axis=1, keepdims=True)
+        cosine = (got * expected).sum(axis=1)
+        encoder.encode(SAMPLE_QUERIES[0])
+        started = time.perf_counter()
+        for n in range(repeats):
+            encoder.encode(SAMPLE_QUERIES[n % len(SAMPLE_QUERIES)])
+        size = os.path.getsize(encoder_path(variant, directory)) / 2**20 if variant in VARIANTS else None
+        rows.append((variant, float(cosine.min()), (time.perf_counter() - started) / repeats * 1000, size))
+
+    print(f"{'variant':<8} {'min cosine':>10} {'ms/query':>9} {'size MB':>8}")
+    for variant, cosine, ms, size in rows:
+        print(f"{variant:<8} {cosine:>10.4f} {ms:>9.2f} {'' if size is None else f'{size:.1f}':>8}")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument("--output", default=ONNX_DIR)
+    args = parser.parse_args()
+    reference = export(args.model, args.output)
+    compare(reference, args.output)
+
+
+if __name__ == "__main__":
+    main()
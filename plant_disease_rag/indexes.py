@@ -0,0 +1,101 @@
+import faiss
+import numpy as np
+
+INDEX_TYPES = ("flat", "ivf-flat", "ivf-pq", "hnsw")
+
+# Build-time defaults; nlist and PQ bits are clamped for small corpora
+DEFAULT_PARAMS = {
+    "nlist": 1024,         # IVF cells
+    "pq_m": 48,            # PQ sub-quantizers (must divide the dimension)
+    "pq_nbits": 8,         # bits per sub-quantizer code
+    "hnsw_m": 32,          # HNSW graph degree
+    "ef_construction": 200,
+}
+
+# Query-time defaults
+NPROBE = 16
+EF_SEARCH = 64
+
+
+def build_index(kind, training_vectors, params=None):
+    """Empty index of `kind` keyed by document id, trained on `training_vectors` if needed.
+
+    IVF indexes store the ids in their inverted lists and are returned
+    bare: wrapped in IndexIDMap2, remove_ids would leave the id map out of
+    step with the lists.
+    """
+    params = dict(DEFAULT_PARAMS, **(params or {}))
+    n, d = training_vectors.shape
+
+    if kind == "flat":
+        base = faiss.IndexFlatL2(d)
+    elif kind == "hnsw":
+        base = faiss.IndexHNSWFlat(d, params["hnsw_m"])
+        base.hnsw.efConstruction = params["ef_construction"]
+    elif kind in ("ivf-flat", "ivf-pq"):
+        # k-means wants ~39 training points per centroid
+        nlist = max(1, min(params["nlist"], n // 39))
+        quantizer = faiss.IndexFlatL2(d)
+        if kind == "ivf-flat":
+            base = faiss.IndexIVFFlat(quantizer, d, nlist)
+        else:
+            if d % params["pq_m"]:
+                raise ValueError(f"pq_m={params['pq_m']} must divide the dimension {d}")
+            nbits = params["pq_nbits"]
+            while nbits > 1 and 39 * 2 ** nbits > n:
+                nbits -= 1
+            base = faiss.IndexIVFPQ(quantizer, d, nlist, params["pq_m"], nbits)
+        base.train(np.ascontiguousarray(training_vectors, dtype="float32"))
+        return base
+    else:
+        raise ValueError(f"Unknown index type {kind!r}; choose from {INDEX_TYPES}")
+
+    return faiss.IndexIDMap2(base)
+
+
+def base_index(index):
+    return faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+
+
+def has_document_ids(index):
+    """Whether `index` searches by document id and supports add/remove by id"""
+    if isinstance(index, faiss.IndexIVF):
+        return True
+    return isinstance(index, faiss.IndexIDMap2) and not isinstance(base_index(index), faiss.IndexIVF)
+
+
+def index_kind(index):
+    base = base_index(index)
+    if isinstance(base, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(base, faiss.IndexIVFPQ):
+        return "ivf-pq"
+    if isinstance(base, faiss.IndexIVF):
+        return "ivf-flat"
+    return "flat"
+
+
+def tune_index(index, nprobe=NPROBE, ef_search=EF_SEARCH):
+    """Apply query-time accuracy/latency knobs for whichever index was loaded"""
+    base = base_index(index)
+    if isinstance(base, faiss.IndexIVF):
+        base.nprobe = min(nprobe, base.nlist)
+    elif isinstance(base, faiss.IndexHNSW):
+        base.hnsw.efSearch = ef_search
+    return index
+
+
+def search_subset(index, queries, k, ids=None):
+    """index.search restricted to `ids` (all documents when None)"""
+    if ids is None:
+        return index.search(queries, k)
+    selector = faiss.IDSelectorBatch(np.asarray(ids, dtype="int64"))
+    base = base_index(index)
+    # Index types reject search parameters of another type
+    if isinstance(base, faiss.IndexIVF):
+        params = faiss.SearchParametersIVF(sel=selector, nprobe=base.nprobe)
+    elif isinstance(base, faiss.IndexHNSW):
+        params = faiss.SearchParametersHNSW(sel=selector, efSearch=base.hnsw.efSearch)
+    else:
+        params = faiss.SearchParameters(sel=selector)
+    return index.search(queries, k, params=params)
@@ -1,34 +1,194 @@
-import pandas as pd
+import argparse
+import hashlib
+import os
+import sqlite3
+
 import faiss
 import numpy as np
-from sentence_transformers import SentenceTransformer
-import pickle
+import pandas as pd
+
+from docstore import DocumentStore, DocumentWriter
+from indexes import DEFAULT_PARAMS, INDEX_TYPES, build_index, has_document_ids, index_kind
+from lexical import LEXICAL_PATH, LexicalIndex
+
+CSV_PATH = "data/plant_diseases.csv"
+INDEX_PATH = "faiss_index.bin"
+STORE_PATH = "documents.store"
+CACHE_PATH = "embedding_cache.sqlite"
+MODEL_NAME = "all-MiniLM-L6-v2"
+FIELDS = ["crop", "disease", "symptoms", "treatment"]
+
+
+def document_text(row):
+    """Text that gets embedded for one CSV row"""
+    return " ".join(str(value) for value in row)
+
+
+def document_id(text):
+    """Stable 63-bit FAISS id derived from the document's content"""
+    digest = hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") & (2**63 - 1)
+
+
+def iter_documents(csv_path, chunksize=10000):
+    """Stream (id, field values) pairs from the CSV without loading it whole"""
+    for chunk in pd.read_csv(csv_path, chunksize=chunksize, usecols=FIELDS, dtype=str,
+                             keep_default_na=False):
+        for row in chunk[FIELDS].itertuples(index=False, name=None):
+            yield document_id(document_text(row)), row
+
+
+class EmbeddingCache:
+    """On-disk embeddings keyed by document id, so unchanged rows are never re-encoded"""
+
+    def __init__(self, path, model_name=MODEL_NAME):
+        self.db = sqlite3.connect(path)
+        self.table = "embeddings_" + "".join(c if c.isalnum() else "_" for c in model_name)
+        self.db.execute(f"CREATE TABLE IF NOT EXISTS {self.table} (id INTEGER PRIMARY KEY, vector BLOB)")
+
+    def get_many(self, ids):
+        found = {}
+        for lo in range(0, len(ids), 900):
+            batch = ids[lo:lo + 900]
+            rows = self.db.execute(
+                f"SELECT id, vector FROM {self.table} WHERE id IN ({','.join('?' * len(batch))})", batch)
+            found.update((i, np.frombuffer(vector, dtype="float32")) for i, vector in rows)
+        return found
+
+    def put_many(self, ids, vectors):
+        self.db.executemany(f"INSERT OR REPLACE INTO {self.table} VALUES (?, ?)",
+                            ((i, v.astype("float32").tobytes()) for i, v in zip(ids, vectors)))
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+
+def load_state(index_path, store_path):
+    """Existing ID-mapped index and the set of ids it holds, or (None, set()) to start over"""
+    if not (os.path.exists(index_path) and os.path.exists(store_path)):
+        return None, set()
+    store = DocumentStore(store_path)
+    index = faiss.read_index(index_path)
+    if store.fields != tuple(FIELDS) or not has_document_ids(index):
+        # Written by the old positional ingest (or converted from metadata.pkl),
+        # or an IVF index wrapped in IndexIDMap2 by an earlier version: rebuild
+        return None, set()
+    return index, set(store.ids.tolist())
+
+
+def save_state(index, store, index_path, store_path, lexical_path):
+    """Publish each file atomically so a running app never reads half a file.
+
+    `store` is the finished, not yet published DocumentWriter output.
+    """
+    faiss.write_index(index, index_path + ".tmp")
+    os.replace(store.path, store_path)
+    store.path = store_path
+    # BM25 statistics are corpus-wide, so the inverted index is rebuilt each run
+    LexicalIndex.build(store.items(), crop_field=FIELDS.index("crop")).save(lexical_path)
+    os.replace(index_path + ".tmp", index_path)
+
+
+def embed(model, cache, ids, texts, batch_size):
+    """Vectors for `texts`, encoding only those missing from the cache"""
+    cached = cache.get_many(ids)
+    missing = [n for n, i in enumerate(ids) if i not in cached]
+    if missing:
+        vectors = model.encode([texts[n] for n in missing], batch_size=batch_size,
+                               convert_to_numpy=True).astype("float32")
+        cache.put_many([ids[n] for n in missing], vectors)
+        cached.update((ids[n], vector) for n, vector in zip(missing, vectors))
+    return np.stack([cached[i] for i in ids]), len(missing)
+
+
+def ingest(csv_path=CSV_PATH, index_path=INDEX_PATH, store_path=STORE_PATH,
+           lexical_path=LEXICAL_PATH, cache_path=CACHE_PATH, batch_size=64, chunksize=10000, rebuild=False,
+           index_type=None, index_params=None):
+    """Bring the index in line with the CSV, touching only added/removed rows.
+
+    `index_type` (flat, ivf-flat, ivf-pq, hnsw) defaults to that of the
+    existing index; switching type rebuilds from the embedding cache. IVF
+    indexes are trained on the first chunk of documents. Documents are
+    streamed to the document store as they are read, so memory holds only
+    their ids and one chunk at a time.
+    """
+    from sentence_transformers import SentenceTransformer
+
+    index, old_ids = (None, set()) if rebuild else load_state(index_path, store_path)
+    if index is not None and index_type and index_kind(index) != index_type:
+        index, old_ids = None, set()
+    kind = index_type or (index_kind(index) if index is not None else "flat")
+
+    model = SentenceTransformer(MODEL_NAME)
+    cache = EmbeddingCache(cache_path)
+
+    writer = DocumentWriter(store_path, FIELDS)
+    seen = set()
+    pending = []
+    added = encoded = 0
+
+    def add(target, items):
+        nonlocal encoded
+        ids = [i for i, _ in items]
+        texts = [document_text(values) for _, values in items]
+        vectors, misses = embed(model, cache, ids, texts, batch_size)
+        encoded += misses
+        if target is None:
+            target = build_index(kind, vectors, index_params)
+        target.add_with_ids(vectors, np.array(ids, dtype="int64"))
+        return target
 
-# Load data
-df = pd.read_csv("data/plant_diseases.csv")
+    for doc_id, values in iter_documents(csv_path, chunksize):
+        if doc_id in seen:
+            continue  # duplicate row
+        seen.add(doc_id)
+        writer.add(doc_id, values)
+        if doc_id not in old_ids:
+            pending.append((doc_id, values))
+            if len(pending) >= chunksize:
+                index = add(index, pending)
+                added += len(pending)
+                pending.clear()
+    if pending:
+        index = add(index, pending)
+        added += len(pending)
 
-# Combine text fields
-documents = (
-    df["crop"] + " " +
-    df["disease"] + " " +
-    df["symptoms"] + " " +
-    df["treatment"]
-).tolist()
+    store = writer.finish()
+    removed = [i for i in old_ids if i not in seen]
+    if removed and kind == "hnsw":
+        # HNSW graphs cannot delete; re-add the survivors from the cache
+        index = None
+        for lo in range(0, len(store), chunksize):
+            index = add(index, list(store.items(lo, lo + chunksize)))
+    elif removed:
+        index.remove_ids(np.array(removed, dtype="int64"))
+    if index is None:
+        dimension = model.get_sentence_embedding_dimension()
+        index = build_index("flat", np.zeros((0, dimension), dtype="float32"))
 
-# Load embedding model
-model = SentenceTransformer("all-MiniLM-L6-v2")
+    save_state(index, store, index_path, store_path, lexical_path)
+    cache.close()
+    print(f"✅ Data indexed successfully: {len(store)} documents in a {index_kind(index)} index "
+          f"({added} added, {len(removed)} removed, {encoded} newly encoded)")
+    return index, store
 
-# Create embeddings
-embeddings = model.encode(documents)
 
-# Create FAISS index
-dimension = embeddings.shape[1]
-index = faiss.IndexFlatL2(dimension)
-index.add(np.array(embeddings))
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally (re)build the plant disease FAISS index")
+    parser.add_argument("--csv", default=CSV_PATH)
+    parser.add_argument("--batch-size", type=int, default=64, help="sentences per encode batch")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="CSV rows read per chunk")
+    parser.add_argument("--rebuild", action="store_true", help="ignore the existing index")
+    parser.add_argument("--index-type", choices=INDEX_TYPES,
+                        help="default: keep the existing index's type (flat for a new index)")
+    for name, default in DEFAULT_PARAMS.items():
+        parser.add_argument("--" + name.replace("_", "-"), type=int, default=default)
+    args = parser.parse_args()
+    params = {name: getattr(args, name) for name in DEFAULT_PARAMS}
+    ingest(args.csv, batch_size=args.batch_size, chunksize=args.chunk_size, rebuild=args.rebuild,
+           index_type=args.index_type, index_params=params)
 
-# Save index and metadata
-faiss.write_index(index, "faiss_index.bin")
-with open("metadata.pkl", "wb") as f:
-    pickle.dump(documents, f)
 
-print("✅ Data indexed successfully")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import os
+import re
+from collections import Counter
+
+import numpy as np
+
+LEXICAL_PATH = "lexical.npz"
+STOPWORDS = frozenset("a an and are as at be by for from has have in is it its of on or the to with".split())
+RRF_K = 60
+
+
+def tokenize(text):
+    return [token for token in re.findall(r"[a-z0-9]+", str(text).lower()) if token not in STOPWORDS]
+
+
+def normalize_crop(crop):
+    return re.sub(r"\s+", " ", str(crop)).strip().lower()
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """Merge ranked id lists: each id scores sum(1 / (k + rank)) over the lists"""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class LexicalIndex:
+    """BM25 inverted index over the documents, plus their crop attribute.
+
+    Postings are stored CSR-style (term_offsets into posting_rows /
+    posting_tfs); rows index doc_ids, the FAISS ids. Documents of one crop
+    are crop_rows[crop_offsets[c]:crop_offsets[c + 1]].
+    """
+
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self, arrays):
+        for name, value in arrays.items():
+            setattr(self, name, value)
+        self.vocabulary = {term: n for n, term in enumerate(self.terms.tolist())}
+        self.crops = {crop: n for n, crop in enumerate(self.crop_names.tolist())}
+        self.average_length = float(self.doc_lengths.mean()) if len(self.doc_lengths) else 1.0
+
+    @classmethod
+    def build(cls, documents, crop_field=0):
+        """Index {id: field values} or (id, values) pairs; values[crop_field] is the crop"""
+        vocabulary, crops = {}, {}
+        doc_ids, doc_crops, doc_lengths = [], [], []
+        term_ids, rows, tfs = [], [], []
+        for row, (doc_id, values) in enumerate(documents.items() if isinstance(documents, dict) else documents):
+            doc_ids.append(doc_id)
+            doc_crops.append(crops.setdefault(normalize_crop(values[crop_field]), len(crops)))
+            tokens = tokenize(" ".join(values))
+            doc_lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+                rows.append(row)
+                tfs.append(tf)
+
+        doc_ids = np.array(doc_ids, dtype="int64")
+        doc_crops = np.array(doc_crops, dtype="int32")
+        doc_lengths = np.array(doc_lengths, dtype="int32")
+        term_ids = np.array(term_ids, dtype="int32")
+        order = np.argsort(term_ids, kind="stable")
+        term_offsets = np.zeros(len(vocabulary) + 1, dtype="int64")
+        np.cumsum(np.bincount(term_ids, minlength=len(vocabulary)), out=term_offsets[1:])
+        crop_order = np.argsort(doc_crops, kind="stable")
+        crop_offsets = np.zeros(len(crops) + 1, dtype="int64")
+        np.cumsum(np.bincount(doc_crops, minlength=len(crops)), out=crop_offsets[1:])
+
+        return cls({
+            "terms": np.array(list(vocabulary), dtype=str),
+            "term_offsets": term_offsets,
+            "posting_rows": np.array(rows, dtype="int32")[order],
+            "posting_tfs": np.array(tfs, dtype="float32")[order],
+            "doc_ids": doc_ids,
+            "doc_lengths": doc_lengths,
+            "crop_names": np.array(list(crops), dtype=str),
+            "crop_offsets": crop_offsets,
+            "crop_rows": crop_order.astype("int32"),
+        })
+
+    @classmethod
+    def load(cls, path=LEXICAL_PATH):
+        with np.load(path) as data:
+            return cls({name: data[name] for name in data.files})
+
+    def save(self, path=LEXICAL_PATH):
+        names = ("terms", "term_offsets", "posting_rows", "posting_tfs", "doc_ids", "doc_lengths",
+                 "crop_names", "crop_offsets", "crop_rows")
+        with open(path + ".tmp", "wb") as f:
+            np.savez(f, **{name: getattr(self, name) for name in names})
+        os.replace(path + ".tmp", path)
+
+    def crop_subset(self, crop):
+        """Rows of documents about `crop`, or None if no document mentions it"""
+        n = self.crops.get(normalize_crop(crop))
+        if n is None:
+            return None
+        return self.crop_rows[self.crop_offsets[n]:self.crop_offsets[n + 1]]
+
+    def search(self, query, n, rows=None):
+        """FAISS ids of the `n` best BM25 matches for `query`, within `rows` if given.
+
+        `rows` must be ascending, as crop_subset returns them; each term's
+        postings are intersected with them so only those rows are scored.
+        """
+        scores = np.zeros(len(self.doc_ids) if rows is None else len(rows), dtype="float32")
+        for term in set(tokenize(query)):
+            t = self.vocabulary.get(term)
+            if t is None:
+                continue
+            lo, hi = self.term_offsets[t], self.term_offsets[t + 1]
+            matched, tf = self.posting_rows[lo:hi], self.posting_tfs[lo:hi]
+            idf = np.log1p((len(self.doc_ids) - (hi - lo) + 0.5) / ((hi - lo) + 0.5))
+            if rows is None:
+                slots = matched
+            else:
+                slots = np.searchsorted(rows, matched)
+                inside = slots < len(rows)
+                inside[inside] = rows[slots[inside]] == matched[inside]
+                slots, matched, tf = slots[inside], matched[inside], tf[inside]
+            norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[matched] / self.average_length)
+            scores[slots] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > n:
+            candidates = candidates[np.argpartition(-scores[candidates], n - 1)[:n]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return self.doc_ids[candidates if rows is None else rows[candidates]]
@@ -0,0 +1,76 @@
+"""LLM backends for predict_disease.
+
+RAG_LLM=gemini (default) calls Gemini with st.secrets["GOOGLE_API_KEY"];
+RAG_LLM=stub answers locally from the prompt, for offline runs and tests.
+Both can return the whole answer (generate) or yield it in pieces as it
+is produced (stream).
+"""
+import os
+import re
+import threading
+import time
+
+GEMINI_MODEL = "gemini-2.5-flash"
+
+
+class GeminiLLM:
+    def __init__(self, api_key, model_name=GEMINI_MODEL):
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key)
+        self.name = f"gemini:{model_name}"
+        self.model = genai.GenerativeModel(model_name)
+
+    def generate(self, prompt):
+        return self.model.generate_content(prompt).text
+
+    def stream(self, prompt):
+        for chunk in self.model.generate_content(prompt, stream=True):
+            # The closing chunk may carry only a finish reason
+            if chunk.parts:
+                yield chunk.text
+
+
+class StubLLM:
+    """Deterministic stand-in that echoes the prompt's CONTEXT section"""
+
+    name = "stub"
+
+    def __init__(self, delay=0.0, token_delay=0.0):
+        self.delay = delay
+        self.token_delay = token_delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _answer(self, prompt):
+        with self._lock:
+            self.calls += 1
+        context = prompt.partition("CONTEXT:")[2].partition("TASK:")[0].strip()
+        return f"[stub diagnosis]\n{context or 'Insufficient data to make a reliable diagnosis.'}"
+
+    def generate(self, prompt):
+        answer = self._answer(prompt)
+        if self.delay:
+            time.sleep(self.delay)
+        return answer
+
+    def stream(self, prompt):
+        answer = self._answer(prompt)
+        if self.delay:
+            time.sleep(self.delay)  # time to first token
+        for piece in re.findall(r"\S+\s*|\s+", answer):
+            if self.token_delay:
+                time.sleep(self.token_delay)
+            yield piece
+
+
+def load_llm(backend=None):
+    backend = backend or os.environ.get("RAG_LLM", "gemini")
+    if backend == "stub":
+        return StubLLM(float(os.environ.get("RAG_STUB_DELAY", "0")),
+                       float(os.environ.get("RAG_STUB_TOKEN_DELAY", "0")))
+    if backend == "gemini":
+        import streamlit as st
+
+        return GeminiLLM(st.secrets["GOOGLE_API_KEY"])
+    raise ValueError(f"Unknown RAG_LLM backend {backend!r}; choose gemini or stub")
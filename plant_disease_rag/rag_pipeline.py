@@ -1,32 +1,206 @@
-import faiss
-import pickle
-import numpy as np
-import streamlit as st
-from sentence_transformers import SentenceTransformer
-import google.generativeai as genai
+import functools
+import os
+import threading
+import time
+from collections import defaultdict
 
-# Load API key
-API_KEY = st.secrets["GOOGLE_API_KEY"]
+from context import CONTEXT_TOKENS, assemble_context
+from docstore import DocumentStore
+from indexes import search_subset, tune_index
+from lexical import LEXICAL_PATH, LexicalIndex, normalize_crop, reciprocal_rank_fusion
+from llm import load_llm
+from response_cache import InFlight, ResponseCache
 
-# Configure Gemini
-genai.configure(api_key=API_KEY)
-model = genai.GenerativeModel("gemini-2.5-flash")
+MODEL_NAME = "all-MiniLM-L6-v2"
+INDEX_PATH = "faiss_index.bin"
+STORE_PATH = "documents.store"
+# hybrid: filter by crop, fuse BM25 and vector rankings; vector: vector search only
+RETRIEVAL = os.environ.get("RAG_RETRIEVAL", "hybrid")
+# Ranked candidates taken from each retriever before fusion
+CANDIDATES = 50
+# Documents retrieved per question, and the prompt budget they must fit
+TOP_K = int(os.environ.get("RAG_TOP_K", 3))
+CONTEXT_BUDGET = int(os.environ.get("RAG_CONTEXT_TOKENS", CONTEXT_TOKENS))
 
-# Load embedding model & FAISS index
-embedder = SentenceTransformer("all-MiniLM-L6-v2")
-index = faiss.read_index("faiss_index.bin")
+# Seconds spent in each loader below (excluding loaders it called), for
+# the startup report
+LOAD_TIMES = {}
+_load_lock = threading.RLock()
+_loading = []
+
+
+def lazy(load):
+    """Run `load` on first call and share its result with every caller.
+
+    Nothing heavy happens at import, so Streamlit renders immediately; the
+    first query (or warm_up) pays for the models once per process, and all
+    sessions in that process reuse them.
+    """
+    loaded = []
+
+    @functools.wraps(load)
+    def get():
+        if not loaded:
+            with _load_lock:
+                if not loaded:
+                    _loading.append(0.0)
+                    started = time.perf_counter()
+                    try:
+                        loaded.append(load())
+                    finally:
+                        elapsed = time.perf_counter() - started
+                        LOAD_TIMES[load.__name__] = elapsed - _loading.pop()
+                        if _loading:
+                            _loading[-1] += elapsed
+        return loaded[0]
+    return get
+
+
+@lazy
+def get_llm():
+    # Gemini by default; RAG_LLM=stub answers offline
+    return load_llm()
+
+
+@lazy
+def get_embedder():
+    # RAG_ENCODER=onnx or int8 serves an export_encoder.py artifact instead
+    variant = os.environ.get("RAG_ENCODER", "torch")
+    if variant != "torch":
+        from export_encoder import OnnxEncoder, encoder_path
+        return OnnxEncoder(encoder_path(variant))
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(MODEL_NAME)
+
+
+@lazy
+def get_index():
+    import faiss
+    # Flat, IVF or HNSW: whichever ingest.py built
+    return tune_index(faiss.read_index(INDEX_PATH))
+
+
+@lazy
+def get_documents():
+    # Memory-mapped, so this is instant and shared between worker processes
+    return DocumentStore(STORE_PATH)
+
+
+@lazy
+def get_lexical():
+    # Written by ingest.py; older deployments fall back to vector search
+    return LexicalIndex.load(LEXICAL_PATH) if os.path.exists(LEXICAL_PATH) else None
+
+
+@lazy
+def get_response_cache():
+    # Answers are reused until the LLM or the indexed documents change
+    return ResponseCache(
+        os.environ.get("RESPONSE_CACHE_PATH", "response_cache.sqlite"),
+        ttl=float(os.environ.get("RESPONSE_CACHE_TTL", 7 * 24 * 3600)),
+        threshold=float(os.environ.get("RESPONSE_CACHE_THRESHOLD", 0.95)),
+        version=f"{get_llm().name}:{os.path.getmtime(STORE_PATH)}",
+    )
+
+
+def warm_up():
+    """Load everything now instead of on the first query"""
+    for load in (get_documents, get_index, get_lexical, get_response_cache, get_embedder):
+        load()
+    return dict(LOAD_TIMES)
+
+
+in_flight = InFlight()
+
+
+def lookup(crop, symptoms):
+    """(cache key, cached answer or None, query embedding or None)"""
+    response_cache = get_response_cache()
+    key = response_cache.key(crop, symptoms)
+    response = response_cache.get(key)
+    if response is not None:
+        return key, response, None
+
+    query_embedding = get_embedder().encode([query_text(crop, symptoms)]).astype("float32")
+    return key, response_cache.get_similar(crop, query_embedding[0]), query_embedding
 
-with open("metadata.pkl", "rb") as f:
-    documents = pickle.load(f)
 
 def predict_disease(crop, symptoms):
-    query = f"{crop} plant with {symptoms}"
-    query_embedding = embedder.encode([query]).astype("float32")
+    key, response, query_embedding = lookup(crop, symptoms)
+    if response is not None:
+        return response
+
+    def answer():
+        response = get_llm().generate(question_prompt(query_embedding, crop, symptoms))
+        get_response_cache().put(key, crop, query_embedding[0], response)
+        return response
+
+    # Identical questions asked concurrently share one LLM call
+    return in_flight.run(key, answer)
+
+
+def predict_disease_stream(crop, symptoms):
+    """Yield the answer in pieces as the LLM produces them.
+
+    Cached answers come back as a single piece. A stream is only cached
+    once it has been read to the end.
+    """
+    key, response, query_embedding = lookup(crop, symptoms)
+    if response is not None:
+        yield response
+        return
 
-    distances, indices = index.search(query_embedding, k=3)
-    retrieved_docs = [documents[i] for i in indices[0]]
+    def answer():
+        pieces = []
+        for piece in get_llm().stream(question_prompt(query_embedding, crop, symptoms)):
+            pieces.append(piece)
+            yield piece
+        get_response_cache().put(key, crop, query_embedding[0], "".join(pieces))
 
-    prompt = f"""
+    # Concurrent identical questions wait for this stream and replay its answer
+    yield from in_flight.stream(key, answer)
+
+
+def query_text(crop, symptoms):
+    return f"{crop} plant with {symptoms}"
+
+
+def retrieve(query_embeddings, k=TOP_K, questions=None):
+    """Retrieved document texts for each row of `query_embeddings`.
+
+    With (crop, symptoms) `questions` and a lexical index, each query only
+    considers documents of its crop (when any exist) and the vector and
+    BM25 rankings are merged by reciprocal rank fusion. Queries sharing a
+    crop share one multi-row FAISS search.
+    """
+    index, lexical = get_index(), get_lexical()
+    if questions is None or lexical is None or RETRIEVAL != "hybrid":
+        distances, found = index.search(query_embeddings, k)
+    else:
+        found = [None] * len(query_embeddings)
+        by_crop = defaultdict(list)
+        for n, (crop, _) in enumerate(questions):
+            by_crop[normalize_crop(crop)].append(n)
+        for crop, rows in by_crop.items():
+            subset = lexical.crop_subset(crop)
+            ids = lexical.doc_ids[subset] if subset is not None else None
+            distances, vector_ids = search_subset(index, query_embeddings[rows], CANDIDATES, ids)
+            for n, ranked in zip(rows, vector_ids):
+                crop_name, symptoms = questions[n]
+                # The crop filter already matched the crop name
+                query = symptoms if subset is not None else f"{crop_name} {symptoms}"
+                lexical_ids = lexical.search(query, CANDIDATES, subset)
+                found[n] = reciprocal_rank_fusion([ranked[ranked != -1].tolist(), lexical_ids.tolist()])[:k]
+
+    documents = get_documents()
+    # -1 pads results when k > ntotal
+    texts = ([documents.text(i) for i in row if i != -1] for row in found)
+    return [[doc for doc in row if doc is not None] for row in texts]
+
+
+def build_prompt(retrieved_docs):
+    context = assemble_context(retrieved_docs, CONTEXT_BUDGET)
+    return f"""
 You are an expert agriculture assistant.
 
 RULES:
@@ -35,7 +209,7 @@ RULES:
   "Insufficient data to make a reliable diagnosis."
 
 CONTEXT:
-{retrieved_docs}
+{context}
 
 TASK:
 1. Possible plant diseases
@@ -44,5 +218,6 @@ TASK:
 4. State uncertainty clearly
 """
 
-    response = model.generate_content(prompt)
-    return response.text
+
+def question_prompt(query_embedding, crop, symptoms):
+    return build_prompt(retrieve(query_embedding, questions=[(crop, symptoms)])[0])
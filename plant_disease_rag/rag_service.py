@@ -0,0 +1,191 @@
+"""Async, batched front end to rag_pipeline shared by several clients.
+
+    python rag_service.py                       # HTTP on 127.0.0.1:8502
+
+    curl -X POST localhost:8502/predict -H 'Content-Type: application/json' \\
+         -d '{"crop": "Tomato", "symptoms": "yellow leaves with dark spots"}'
+
+Queries arriving within RAG_BATCH_WAIT_MS of each other (up to
+RAG_BATCH_SIZE) share one embedder.encode call and one multi-row
+index.search. LLM generations then run concurrently, at most
+RAG_LLM_CONCURRENCY at a time. From Python, use RAGService directly:
+
+    service = RAGService()
+    await service.start()
+    answers = await service.predict_many([("Tomato", "leaf curl"), ("Potato", "black spots")])
+"""
+import asyncio
+import os
+import time
+
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel
+
+import rag_pipeline as rp
+
+
+class RAGService:
+    def __init__(self, max_batch_size=32, max_wait_ms=10, max_concurrent_llm=4, k=rp.TOP_K):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_concurrent_llm = max_concurrent_llm
+        self.k = k
+        self.queue = None
+        self.worker = None
+        self.pending = {}
+        self.stats = {"queries": 0, "batches": 0, "cache_hits": 0, "shared": 0, "llm_calls": 0}
+
+    async def start(self):
+        # Load the models now rather than on the first request
+        await asyncio.to_thread(rp.warm_up)
+        self.queue = asyncio.Queue()
+        self.llm_slots = asyncio.Semaphore(self.max_concurrent_llm)
+        self.worker = asyncio.create_task(self._batch_loop())
+
+    async def stop(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            try:
+                await self.worker
+            except asyncio.CancelledError:
+                pass
+            self.worker = None
+        # Questions still queued would otherwise wait forever
+        while self.queue is not None and not self.queue.empty():
+            _, future = self.queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("RAG service stopped"))
+
+    async def predict(self, crop, symptoms):
+        self.stats["queries"] += 1
+        response_cache = rp.get_response_cache()
+        key = response_cache.key(crop, symptoms)
+        # SQLite lookups run off the event loop
+        response = await asyncio.to_thread(response_cache.get, key)
+        if response is not None:
+            self.stats["cache_hits"] += 1
+            return response
+
+        # Identical questions in flight share one answer
+        task = self.pending.get(key)
+        if task is None:
+            task = self.pending[key] = asyncio.create_task(self._answer(key, crop, symptoms))
+            task.add_done_callback(lambda _: self.pending.pop(key, None))
+        else:
+            self.stats["shared"] += 1
+        return await asyncio.shield(task)
+
+    async def predict_many(self, questions):
+        return await asyncio.gather(*(self.predict(crop, symptoms) for crop, symptoms in questions))
+
+    async def _answer(self, key, crop, symptoms):
+        retrieved = asyncio.get_running_loop().create_future()
+        await self.queue.put(((crop, symptoms), retrieved))
+        embedding, docs = await retrieved
+
+        response = await asyncio.to_thread(rp.get_response_cache().get_similar, crop, embedding)
+        if response is not None:
+            self.stats["cache_hits"] += 1
+            return response
+
+        async with self.llm_slots:
+            self.stats["llm_calls"] += 1
+            response = await asyncio.to_thread(rp.get_llm().generate, rp.build_prompt(docs))
+        await asyncio.to_thread(rp.get_response_cache().put, key, crop, embedding, response)
+        return response
+
+    def _embed_and_retrieve(self, questions):
+        texts = [rp.query_text(crop, symptoms) for crop, symptoms in questions]
+        embeddings = rp.get_embedder().encode(texts, batch_size=len(texts)).astype("float32")
+        return embeddings, rp.retrieve(embeddings, self.k, questions)
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            try:
+                while len(batch) < self.max_batch_size:
+                    try:
+                        batch.append(await asyncio.wait_for(self.queue.get(), deadline - loop.time()))
+                    except asyncio.TimeoutError:
+                        break
+                embeddings, docs = await asyncio.to_thread(self._embed_and_retrieve, [question for question, _ in batch])
+            except asyncio.CancelledError:
+                # Stopped mid-batch: release the callers already taken off the queue
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(RuntimeError("RAG service stopped"))
+                raise
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.stats["batches"] += 1
+            for (_, future), embedding, row in zip(batch, embeddings, docs):
+                if not future.done():
+                    future.set_result((embedding, row))
+
+    def info(self):
+        return dict(self.stats, pending=len(self.pending), queued=self.queue.qsize() if self.queue else 0,
+                    max_batch_size=self.max_batch_size, max_concurrent_llm=self.max_concurrent_llm)
+
+
+service = RAGService(
+    max_batch_size=int(os.environ.get("RAG_BATCH_SIZE", 32)),
+    max_wait_ms=float(os.environ.get("RAG_BATCH_WAIT_MS", 10)),
+    max_concurrent_llm=int(os.environ.get("RAG_LLM_CONCURRENCY", 4)),
+)
+
+app = FastAPI(title="Plant Disease RAG", version="1.0")
+
+
+class Question(BaseModel):
+    crop: str
+    symptoms: str
+
+    def is_blank(self):
+        return not self.crop.strip() or not self.symptoms.strip()
+
+
+@app.on_event("startup")
+async def startup_event():
+    await service.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await service.stop()
+
+
+@app.post("/predict")
+async def predict(question: Question):
+    if question.is_blank():
+        raise HTTPException(status_code=400, detail="Both crop and symptoms are required")
+    started = time.perf_counter()
+    result = await service.predict(question.crop, question.symptoms)
+    return {"result": result, "latency_ms": round((time.perf_counter() - started) * 1000, 1)}
+
+
+@app.post("/predict/batch")
+async def predict_batch(questions: list[Question]):
+    blank = [n for n, question in enumerate(questions) if question.is_blank()]
+    if blank:
+        raise HTTPException(status_code=400, detail={"error": "Both crop and symptoms are required",
+                                                     "items": blank})
+    results = await service.predict_many([(q.crop, q.symptoms) for q in questions])
+    return {"results": results}
+
+
+@app.get("/stats")
+async def stats():
+    return {"service": service.info(), "response_cache": rp.get_response_cache().info(),
+            "load_seconds": rp.LOAD_TIMES}
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host=os.environ.get("RAG_HOST", "127.0.0.1"),
+                port=int(os.environ.get("RAG_PORT", 8502)), log_level="info")
@@ -0,0 +1,231 @@
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+CACHE_PATH = "response_cache.sqlite"
+TTL_SECONDS = 7 * 24 * 3600
+SIMILARITY_THRESHOLD = 0.95
+
+
+def normalize(crop, symptoms):
+    """Case, whitespace and trailing punctuation don't change the question"""
+    def clean(text):
+        return re.sub(r"\s+", " ", str(text)).strip().strip(".,;!?").strip().lower()
+    return clean(crop), clean(symptoms)
+
+
+class CropVectors:
+    """Unit-norm query embeddings of one crop's cached answers.
+
+    Rows live in a preallocated matrix that doubles when full, so adding
+    an entry is amortised O(1); `matrix` is a view of the filled rows.
+    """
+
+    def __init__(self, dimension, capacity=64):
+        self.keys = []
+        self.rows = {}      # key -> row
+        self.created = np.empty(capacity, dtype="float64")
+        self.data = np.empty((capacity, dimension), dtype="float32")
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def matrix(self):
+        return self.data[:len(self.keys)]
+
+    def add(self, key, embedding, created):
+        row = self.rows.get(key)
+        if row is None:
+            row = len(self.keys)
+            if row == len(self.data):
+                self.data = np.concatenate([self.data, np.empty_like(self.data)])
+                self.created = np.concatenate([self.created, np.empty_like(self.created)])
+            self.keys.append(key)
+            self.rows[key] = row
+        self.data[row] = embedding
+        self.created[row] = created
+
+    def drop_older(self, cutoff):
+        """Remove entries created before `cutoff`"""
+        keep = np.flatnonzero(self.created[:len(self.keys)] >= cutoff)
+        if len(keep) == len(self.keys):
+            return
+        self.keys = [self.keys[n] for n in keep]
+        self.rows = {key: row for row, key in enumerate(self.keys)}
+        self.data[:len(keep)] = self.data[keep]
+        self.created[:len(keep)] = self.created[keep]
+
+
+class ResponseCache:
+    """Persistent LLM answers, looked up exactly or by query-embedding similarity.
+
+    Exact hits match the normalized (crop, symptoms) pair. Semantic hits
+    need the same crop and a cosine similarity of at least `threshold`
+    between query embeddings. Entries older than `ttl` seconds are ignored
+    and purged on start-up and then at most every `purge_interval` seconds
+    as answers are added; entries written under a different `version`
+    (LLM and document store fingerprint) are never served.
+    """
+
+    def __init__(self, path=CACHE_PATH, ttl=TTL_SECONDS, threshold=SIMILARITY_THRESHOLD, version="",
+                 purge_interval=3600):
+        self.ttl = ttl
+        self.threshold = threshold
+        self.version = version
+        self.purge_interval = purge_interval
+        self.lock = threading.Lock()
+        self.stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0}
+        # crop -> CropVectors for the semantic lookup
+        self.vectors = {}
+
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, version TEXT, "
+                        "crop TEXT, embedding BLOB, response TEXT, created REAL)")
+        self.db.execute("DELETE FROM responses WHERE version != ?", (version,))
+        self._purge()
+        for key, crop, embedding, created in self.db.execute(
+                "SELECT key, crop, embedding, created FROM responses"):
+            self._index(key, crop, np.frombuffer(embedding, dtype="float32"), created)
+
+    @staticmethod
+    def key(crop, symptoms):
+        return "\x1f".join(normalize(crop, symptoms))
+
+    def _index(self, key, crop, embedding, created):
+        vectors = self.vectors.get(crop)
+        if vectors is None:
+            vectors = self.vectors[crop] = CropVectors(len(embedding))
+        vectors.add(key, embedding, created)
+
+    def _purge(self):
+        """Delete expired answers from the database and the similarity index"""
+        self.purged = time.time()
+        cutoff = self.purged - self.ttl
+        self.db.execute("DELETE FROM responses WHERE created < ?", (cutoff,))
+        self.db.commit()
+        for crop, vectors in list(self.vectors.items()):
+            vectors.drop_older(cutoff)
+            if not len(vectors):
+                del self.vectors[crop]
+
+    def _fresh(self, key):
+        row = self.db.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is not None and time.time() - row[1] < self.ttl:
+            return row[0]
+        return None
+
+    def get(self, key):
+        with self.lock:
+            response = self._fresh(key)
+            if response is not None:
+                self.stats["exact_hits"] += 1
+            return response
+
+    def get_similar(self, crop, embedding):
+        """Response of the most similar cached query for `crop`, if close enough"""
+        with self.lock:
+            vectors = self.vectors.get(normalize(crop, "")[0])
+            if vectors is not None:
+                query = embedding / (np.linalg.norm(embedding) or 1)
+                scores = vectors.matrix @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    response = self._fresh(vectors.keys[best])
+                    if response is not None:
+                        self.stats["semantic_hits"] += 1
+                        return response
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, key, crop, embedding, response):
+        crop = normalize(crop, "")[0]
+        embedding = (embedding / (np.linalg.norm(embedding) or 1)).astype("float32")
+        created = time.time()
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                            (key, self.version, crop, embedding.tobytes(), response, created))
+            self.db.commit()
+            self._index(key, crop, embedding, created)
+            if created - self.purged >= self.purge_interval:
+                self._purge()
+
+    def info(self):
+        with self.lock:
+            return dict(self.stats, entries=sum(len(vectors) for vectors in self.vectors.values()))
+
+
+class StreamAbandoned(Exception):
+    """The streaming owner of a key stopped reading before the end"""
+
+
+class InFlight:
+    """Concurrent calls with the same key share one computation"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.shared = 0
+
+    def run(self, key, compute):
+        with self.lock:
+            future = self.pending.get(key)
+            owner = future is None
+            if owner:
+                future = self.pending[key] = Future()
+            else:
+                self.shared += 1
+        if not owner:
+            return future.result()
+
+        try:
+            future.set_result(compute())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self.lock:
+                del self.pending[key]
+        return future.result()
+
+    def stream(self, key, produce):
+        """Generator form of run() for a `produce` that yields text pieces.
+
+        The first caller streams the pieces as they come; concurrent callers
+        wait for the whole text and get it as one piece. If the first caller
+        stops reading early, a waiting caller takes over and streams anew.
+        """
+        with self.lock:
+            future = self.pending.get(key)
+            owner = future is None
+            if owner:
+                future = self.pending[key] = Future()
+            else:
+                self.shared += 1
+        if not owner:
+            try:
+                response = future.result()
+            except StreamAbandoned:
+                yield from self.stream(key, produce)
+                return
+            yield response
+            return
+
+        pieces = []
+        try:
+            for piece in produce():
+                pieces.append(piece)
+                yield piece
+            future.set_result("".join(pieces))
+        except GeneratorExit:
+            future.set_exception(StreamAbandoned())
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                del self.pending[key]
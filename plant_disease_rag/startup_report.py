@@ -0,0 +1,43 @@
+"""Where the RAG app's cold start goes.
+
+    python startup_report.py
+    RAG_ENCODER=int8 RAG_LLM=stub python startup_report.py
+
+Times the imports app.py pays before it can render, each lazily loaded
+component of rag_pipeline, and first / warm query embedding latency.
+"""
+import os
+import time
+
+
+def startup_report(crop="Tomato", symptoms="yellow leaves with dark spots", repeats=20):
+    report = {}
+    started = time.perf_counter()
+    import streamlit  # noqa: F401
+    report["import streamlit"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    import rag_pipeline as rp
+    report["import rag_pipeline"] = time.perf_counter() - started
+
+    rp.warm_up()
+    report.update((f"load {name.replace('get_', '')}", seconds) for name, seconds in rp.LOAD_TIMES.items())
+
+    embedder, text = rp.get_embedder(), rp.query_text(crop, symptoms)
+    started = time.perf_counter()
+    embedding = embedder.encode([text]).astype("float32")
+    report["first embedding"] = time.perf_counter() - started
+    started = time.perf_counter()
+    for _ in range(repeats):
+        embedder.encode([text])
+    report["embedding (warm, mean)"] = (time.perf_counter() - started) / repeats
+    started = time.perf_counter()
+    rp.retrieve(embedding)
+    report["retrieval"] = time.perf_counter() - started
+    return report
+
+
+if __name__ == "__main__":
+    print(f"Encoder: {os.environ.get('RAG_ENCODER', 'torch')}, LLM: {os.environ.get('RAG_LLM', 'gemini')}")
+    for step, seconds in startup_report().items():
+        print(f"{step:<24} {seconds * 1000:10.1f} ms")
@@ -0,0 +1,75 @@
+import hashlib
+import sys
+import types
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import ingest
+from docstore import DocumentStore
+from indexes import index_kind, tune_index
+
+
+class HashingEncoder:
+    """Offline stand-in for SentenceTransformer: bag of hashed words"""
+
+    def __init__(self, name):
+        pass
+
+    def get_sentence_embedding_dimension(self):
+        return 64
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True):
+        vectors = np.zeros((len(texts), 64), dtype="float32")
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                vectors[row, int(hashlib.md5(word.encode()).hexdigest(), 16) % 64] += 1
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+@pytest.fixture(autouse=True)
+def fake_encoder(monkeypatch):
+    monkeypatch.setitem(sys.modules, "sentence_transformers",
+                        types.SimpleNamespace(SentenceTransformer=HashingEncoder))
+
+
+def write_csv(path, rows):
+    pd.DataFrame(rows, columns=ingest.FIELDS).to_csv(path, index=False)
+
+
+def make_rows(n, seed=0):
+    rng = np.random.default_rng(seed)
+    words = [f"w{i}" for i in range(300)]
+    return [[rng.choice(["Tomato", "Potato", "Rice"]), f"disease{i}",
+             " ".join(rng.choice(words, 8)), " ".join(rng.choice(words, 6))] for i in range(n)]
+
+
+@pytest.mark.parametrize("kind", ["flat", "ivf-flat", "ivf-pq", "hnsw"])
+def test_retrieval_survives_removed_documents(tmp_path, kind):
+    paths = {"index_path": str(tmp_path / "index.bin"), "store_path": str(tmp_path / "documents.store"),
+             "lexical_path": str(tmp_path / "lexical.npz"), "cache_path": str(tmp_path / "cache.sqlite")}
+    rows = make_rows(400)
+    write_csv(tmp_path / "all.csv", rows)
+    ingest.ingest(str(tmp_path / "all.csv"), index_type=kind, index_params={"pq_m": 8}, **paths)
+
+    write_csv(tmp_path / "kept.csv", rows[50:])
+    index, documents = ingest.ingest(str(tmp_path / "kept.csv"), **paths)
+    assert index_kind(index) == kind
+    assert index.ntotal == 350
+    assert len(documents) == 350
+    assert not list(tmp_path.glob("*.tmp"))
+
+    store = DocumentStore(paths["store_path"])
+    encoder = HashingEncoder(ingest.MODEL_NAME)
+    tune_index(index, nprobe=64, ef_search=256)
+    samples = rows[50:70]
+    queries = encoder.encode([ingest.document_text(row) for row in samples])
+    _, found = index.search(queries, 1)
+    expected = [ingest.document_id(ingest.document_text(row)) for row in samples]
+    hits = sum(found[n, 0] == doc_id for n, doc_id in enumerate(expected))
+    # PQ codes are lossy; exact indexes must find every document
+    assert hits >= (16 if kind == "ivf-pq" else 20)
+    assert all(store.get(i)["disease"] == row[1] for i, row in zip(expected, samples))
+    removed = ingest.document_id(ingest.document_text(rows[0]))
+    assert removed not in store and removed not in set(found[:, 0].tolist())
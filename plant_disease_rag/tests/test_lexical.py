@@ -0,0 +1,23 @@
+import numpy as np
+
+from lexical import LexicalIndex
+
+CROPS = ["Tomato", "Potato", "Rice", "Wheat"]
+WORDS = "yellow leaves dark spots lesions stems powder rust wilt blight curl mold rot".split()
+
+
+def test_crop_subset_search_matches_filtered_full_search():
+    rng = np.random.default_rng(0)
+    documents = {1000 + n: (CROPS[n % len(CROPS)], " ".join(rng.choice(WORDS, size=rng.integers(3, 12))))
+                 for n in range(500)}
+    lexical = LexicalIndex.build(documents)
+
+    for crop in CROPS:
+        rows = lexical.crop_subset(crop)
+        for query in ("yellow leaves", "dark spots on stems", "blight rot mold"):
+            expected = [doc_id for doc_id in lexical.search(query, len(documents))
+                        if documents[doc_id][0] == crop]
+            assert expected
+            assert lexical.search(query, len(documents), rows).tolist() == expected
+
+    assert lexical.search("unknown words", 5, lexical.crop_subset("Rice")).tolist() == []
@@ -0,0 +1,58 @@
+import threading
+
+import numpy as np
+
+import rag_pipeline as rp
+from llm import StubLLM
+from response_cache import InFlight, ResponseCache
+
+
+def test_concurrent_identical_streams_share_one_llm_call(tmp_path, monkeypatch):
+    llm = StubLLM(delay=0.3)
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"), version="test")
+    monkeypatch.setattr(rp, "get_llm", lambda: llm)
+    monkeypatch.setattr(rp, "get_response_cache", lambda: cache)
+    monkeypatch.setattr(rp, "in_flight", InFlight())
+    monkeypatch.setattr(rp, "lookup", lambda crop, symptoms: (cache.key(crop, symptoms), None,
+                                                             np.ones((1, 8), dtype="float32")))
+    monkeypatch.setattr(rp, "question_prompt", lambda *_: "CONTEXT:\n[1] Early blight\nTASK:")
+
+    answers = [None, None]
+    started = threading.Barrier(2)
+
+    def ask(n):
+        started.wait()
+        answers[n] = "".join(rp.predict_disease_stream("Tomato", "dark spots"))
+
+    threads = [threading.Thread(target=ask, args=(n,)) for n in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert llm.calls == 1
+    assert answers[0] == answers[1] == "[stub diagnosis]\n[1] Early blight"
+    assert rp.in_flight.shared == 1
+
+
+def test_abandoned_stream_hands_over_to_waiting_caller(tmp_path, monkeypatch):
+    llm = StubLLM(token_delay=0.05)
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"), version="test")
+    monkeypatch.setattr(rp, "get_llm", lambda: llm)
+    monkeypatch.setattr(rp, "get_response_cache", lambda: cache)
+    monkeypatch.setattr(rp, "in_flight", InFlight())
+    monkeypatch.setattr(rp, "lookup", lambda crop, symptoms: (cache.key(crop, symptoms), None,
+                                                             np.ones((1, 8), dtype="float32")))
+    monkeypatch.setattr(rp, "question_prompt", lambda *_: "CONTEXT:\n[1] Late blight spreads fast\nTASK:")
+
+    leader = rp.predict_disease_stream("Potato", "black lesions")
+    next(leader)
+    follower = []
+    thread = threading.Thread(target=lambda: follower.append(
+        "".join(rp.predict_disease_stream("Potato", "black lesions"))))
+    thread.start()
+    leader.close()
+    thread.join()
+
+    assert follower == ["[stub diagnosis]\n[1] Late blight spreads fast"]
+    assert llm.calls == 2
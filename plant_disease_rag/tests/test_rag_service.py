@@ -0,0 +1,39 @@
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import rag_service
+
+
+def test_blank_questions_get_400_from_both_endpoints():
+    # No startup: validation must reject before any model is touched
+    client = TestClient(rag_service.app)
+
+    single = client.post("/predict", json={"crop": "Tomato", "symptoms": "  "})
+    assert single.status_code == 400
+
+    batch = client.post("/predict/batch", json=[{"crop": "Tomato", "symptoms": "leaf curl"},
+                                                {"crop": " ", "symptoms": "spots"}])
+    assert batch.status_code == 400
+    assert batch.json()["detail"]["items"] == [1]
+
+
+def test_stop_fails_questions_still_waiting(monkeypatch):
+    service = rag_service.RAGService(max_batch_size=1, max_wait_ms=0)
+    monkeypatch.setattr(service, "_embed_and_retrieve", lambda questions: time.sleep(0.2))
+
+    async def run():
+        service.queue = asyncio.Queue()
+        service.worker = asyncio.create_task(service._batch_loop())
+        futures = [asyncio.get_running_loop().create_future() for _ in range(2)]
+        for n, future in enumerate(futures):
+            await service.queue.put((("Tomato", f"question {n}"), future))
+        await asyncio.sleep(0.05)   # the worker is now embedding the first question
+        await service.stop()
+        return futures
+
+    for future in asyncio.run(run()):
+        with pytest.raises(RuntimeError, match="stopped"):
+            future.result()
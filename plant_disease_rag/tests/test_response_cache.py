@@ -0,0 +1,39 @@
+import numpy as np
+
+import response_cache
+from response_cache import ResponseCache
+
+
+def unit(n, dimension=16):
+    vector = np.zeros(dimension, dtype="float32")
+    vector[n % dimension] = 1
+    vector[(n // dimension + 1) % dimension] += 0.5
+    return vector
+
+
+def test_semantic_lookup_after_growing_past_capacity(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"))
+    for n in range(200):
+        cache.put(cache.key("Tomato", f"symptom {n}"), "Tomato", unit(n), f"answer {n}")
+
+    assert cache.info()["entries"] == 200
+    assert cache.get_similar("tomato", unit(150)) == "answer 150"
+    assert cache.get_similar("Potato", unit(150)) is None
+
+
+def test_expired_entries_leave_the_similarity_index(tmp_path, monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(response_cache.time, "time", lambda: now[0])
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"), ttl=100, purge_interval=10)
+    cache.put(cache.key("Rice", "old"), "Rice", unit(1), "old answer")
+    now[0] += 60
+    cache.put(cache.key("Rice", "new"), "Rice", unit(2), "new answer")
+
+    now[0] += 60    # the first answer is now past its ttl
+    cache.put(cache.key("Wheat", "rust"), "Wheat", unit(3), "rust answer")
+
+    assert cache.vectors["rice"].keys == [cache.key("Rice", "new")]
+    assert cache.get_similar("Rice", unit(2)) == "new answer"
+    assert cache.info()["entries"] == 2
+    reopened = ResponseCache(str(tmp_path / "responses.sqlite"), ttl=100)
+    assert reopened.info()["entries"] == 2